@@ -1,8 +1,8 @@
 from .ads import get_connection, Plc, Symbol
 from .util import parse_address, make_address
-from .signal import AdsSignal
+from .signal import AdsSignal, BatchedReadMixin, read_signals
 
 
 __all__ = ['get_connection', 'Plc', 'Symbol',
            'parse_address', 'make_address',
-           'AdsSignal']
+           'AdsSignal', 'BatchedReadMixin', 'read_signals']
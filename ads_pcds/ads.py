@@ -1,7 +1,14 @@
+import concurrent.futures
 import ctypes
 import enum
+import functools
+import heapq
+import itertools
 import logging
+import math
+import os
 import queue
+import re
 import struct
 import threading
 import time
@@ -9,9 +16,68 @@ import time
 import pyads
 from pyads import structs, constants
 
+from . import metrics as _metrics
+from . import upload
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 
 logger = logging.getLogger(__name__)
 
+# Limits for a single ADS sum command; larger requests are split into chunks
+MAX_SUM_COMMANDS = 500
+MAX_SUM_BYTES = 63 * 1024
+
+# ADS errors after which handles have to be released and re-acquired
+ONLINE_CHANGE_ERRORS = {
+    1809,  # symbol version invalid
+    1812,  # notification handle is invalid
+    1826,  # symbol not active
+}
+
+# Not exported by pyads
+ADSIGRP_SUMUP_READWRITE = 0xF082
+
+# Connection supervision [sec]: the state of open connections is checked
+# every HEARTBEAT_PERIOD.  Once lost, reconnection is attempted with delays
+# doubling from RECONNECT_DELAY up to MAX_RECONNECT_DELAY.
+HEARTBEAT_PERIOD = 1.0
+RECONNECT_DELAY = 0.5
+MAX_RECONNECT_DELAY = 30.0
+
+# Members of a struct of at most this size [bytes] may be served by a single
+# subscription of the struct; see `PlcVariable.share_parent`
+MAX_SHARED_PARENT_SIZE = 16 * 1024
+
+# Notification budget of each Plc; see `NotificationBudget`.  TwinCAT
+# limits the number of notifications of an ADS port.
+MAX_NOTIFICATIONS = 500
+# Poll period [sec] of variables without a notification
+BUDGET_POLL_RATE = 0.1
+# Change rate [Hz] beyond which variables are polled instead of notified
+BUDGET_FAST_CHANGE_RATE = 20.0
+# Period [sec] at which notifications are reassigned by change rate
+BUDGET_REBALANCE_PERIOD = 10.0
+# A polled variable takes the notification of another only if changing at
+# least this many times less often
+BUDGET_HYSTERESIS = 2.0
+# Polled variables changing on this fraction of polls may change faster
+_POLL_SATURATION = 0.9
+
+_SUM_READ_REQUEST = struct.Struct('<III')
+_SUM_READ_WRITE_REQUEST = struct.Struct('<IIII')
+_SUM_READ_WRITE_RESPONSE = struct.Struct('<II')
+_ERROR_CODE = struct.Struct('<I')
+# nSymbols, nSymSize, nDatatypes, nDatatypeSize, nMaxDynSymbols,
+# nUsedDynSymbols
+_UPLOAD_INFO2 = struct.Struct('<6I')
+
+# Maximum size of an ADSIGRP_SYM_INFOBYNAMEEX response
+_SYMBOL_INFO_SIZE = ctypes.sizeof(structs.SAdsSymbolEntry)
+
 
 class ADST_Type(enum.IntEnum):
     VOID = 0
@@ -53,77 +119,807 @@ ads_type_to_ctype = {
 }
 
 
-def get_symbol_information(plc, symbol_name) -> structs.SAdsSymbolEntry:
+def get_symbol_information(plc, symbol_name) -> upload.SymbolEntry:
+    data = read_write_raw(plc, constants.ADSIGRP_SYM_INFOBYNAMEEX, 0x0,
+                          _SYMBOL_INFO_SIZE, _encode_name(symbol_name))
+    return upload.parse_symbol_entry(data)[0]
+
+
+def get_symbol_information_many(plc, symbol_names):
+    '''
+    Get information on many symbols with ADS sum commands
+
+    Returns
+    -------
+    results : list of (error_code, upload.SymbolEntry)
+        In the same order as `symbol_names`.  The entry is None if the
+        request failed.
+    '''
+    requests = [(constants.ADSIGRP_SYM_INFOBYNAMEEX, 0x0, _SYMBOL_INFO_SIZE,
+                 _encode_name(name))
+                for name in symbol_names]
+    return [(error_code, None if error_code
+             else upload.parse_symbol_entry(data)[0])
+            for error_code, data in sum_read_write(plc, requests)]
+
+
+def _encode_name(symbol_name):
+    return symbol_name.encode(upload.SYMBOL_ENCODING) + b'\0'
+
+
+def get_symbol_handle(plc, symbol_name) -> int:
     return plc.read_write(
-        constants.ADSIGRP_SYM_INFOBYNAMEEX,
+        constants.ADSIGRP_SYM_HNDBYNAME,
         0x0,
-        structs.SAdsSymbolEntry,
+        constants.PLCTYPE_UDINT,
         symbol_name,
         constants.PLCTYPE_STRING,
     )
 
 
-def unpack_notification(notification, plc_datatype):
-    contents = notification.contents
-    data_size = contents.cbSampleSize
-    # Get dynamically sized data array
-    data = (ctypes.c_ubyte * data_size).from_address(
-        ctypes.addressof(contents) +
-        structs.SAdsNotificationHeader.data.offset)
-
-    datatype_map = {
-        constants.PLCTYPE_BOOL: "<?",
-        constants.PLCTYPE_BYTE: "<c",
-        constants.PLCTYPE_DINT: "<i",
-        constants.PLCTYPE_DWORD: "<I",
-        constants.PLCTYPE_INT: "<h",
-        constants.PLCTYPE_LREAL: "<d",
-        constants.PLCTYPE_REAL: "<f",
-        constants.PLCTYPE_SINT: "<b",
-        constants.PLCTYPE_UDINT: "<L",
-        constants.PLCTYPE_UINT: "<H",
-        constants.PLCTYPE_USINT: "<B",
-        constants.PLCTYPE_WORD: "<H",
-    }
+def get_symbol_handle_many(plc, symbol_names):
+    '''
+    Get handles of many symbols with ADS sum commands
 
-    if plc_datatype == constants.PLCTYPE_STRING:
-        # read only until null-termination character
-        value = bytearray(data).split(b"\0", 1)[0].decode("utf-8")
-
-    elif issubclass(plc_datatype, ctypes.Structure):
-        value = plc_datatype()
-        fit_size = min(data_size, ctypes.sizeof(value))
-        ctypes.memmove(ctypes.addressof(value), ctypes.addressof(data),
-                       fit_size)
-    elif plc_datatype not in datatype_map:
-        value = bytearray(data)
+    Returns
+    -------
+    results : list of (error_code, handle)
+        In the same order as `symbol_names`.  The handle is None if the
+        request failed.
+    '''
+    requests = [(constants.ADSIGRP_SYM_HNDBYNAME, 0x0, _ERROR_CODE.size,
+                 _encode_name(name))
+                for name in symbol_names]
+    return [(error_code, None if error_code
+             else _ERROR_CODE.unpack_from(data)[0])
+            for error_code, data in sum_read_write(plc, requests)]
+
+
+def release_symbol_handle(plc, handle):
+    plc.write(
+        constants.ADSIGRP_SYM_RELEASEHND,
+        0x0,
+        handle,
+        constants.PLCTYPE_UDINT,
+    )
+
+
+def read_write_raw(plc, index_group, index_offset, read_size, data):
+    '''
+    ADS read-write of raw bytes
+
+    Unlike `pyads.Connection.read_write`, the response may be shorter than
+    `read_size`.  Returns a memoryview of the bytes read.
+
+    Connections other than `pyads.Connection` (e.g., `fake.FakeConnection`)
+    may implement this as a ``read_write_raw`` method.
+    '''
+    if not isinstance(plc, pyads.Connection):
+        return plc.read_write_raw(index_group, index_offset, read_size, data)
+
+    read_buffer = (ctypes.c_ubyte * read_size)()
+    write_buffer = (ctypes.c_ubyte * len(data)).from_buffer_copy(data)
+    bytes_read = ctypes.c_ulong()
+    err_code = pyads.pyads_ex._adsDLL.AdsSyncReadWriteReqEx2(
+        plc._port,
+        ctypes.pointer(plc._adr.amsAddrStruct()),
+        ctypes.c_ulong(index_group),
+        ctypes.c_ulong(index_offset),
+        ctypes.c_ulong(read_size),
+        ctypes.pointer(read_buffer),
+        ctypes.c_ulong(len(data)),
+        ctypes.pointer(write_buffer),
+        ctypes.pointer(bytes_read),
+    )
+    if err_code:
+        raise pyads.ADSError(err_code)
+    return memoryview(read_buffer).cast('B')[:bytes_read.value]
+
+
+def _split_sum_requests(items, request_size, response_size):
+    '''
+    Split `items` into chunks that fit into a single ADS sum command
+
+    Parameters
+    ----------
+    items : list
+    request_size : callable
+        Number of request bytes required for an item
+    response_size : callable
+        Number of response bytes required for an item
+    '''
+    chunk = []
+    request_bytes = response_bytes = 0
+    for item in items:
+        req, resp = request_size(item), response_size(item)
+        if chunk and (len(chunk) == MAX_SUM_COMMANDS or
+                      request_bytes + req > MAX_SUM_BYTES or
+                      response_bytes + resp > MAX_SUM_BYTES):
+            yield chunk
+            chunk = []
+            request_bytes = response_bytes = 0
+        chunk.append(item)
+        request_bytes += req
+        response_bytes += resp
+
+    if chunk:
+        yield chunk
+
+
+def sum_read(plc, requests):
+    '''
+    Read many areas with ADS sum commands (ADSIGRP_SUMUP_READ)
+
+    Parameters
+    ----------
+    plc : pyads.Connection
+    requests : list of (index_group, index_offset, size)
+
+    Returns
+    -------
+    results : list of (error_code, data)
+        In the same order as `requests`.  `data` is None if the read failed.
+    '''
+    results = []
+    for chunk in _split_sum_requests(requests,
+                                     lambda req: _SUM_READ_REQUEST.size,
+                                     lambda req: _ERROR_CODE.size + req[2]):
+        request = b''.join(_SUM_READ_REQUEST.pack(*req) for req in chunk)
+        read_size = sum(_ERROR_CODE.size + size for _, _, size in chunk)
+        try:
+            response = read_write_raw(plc, constants.ADSIGRP_SUMUP_READ,
+                                      len(chunk), read_size, request)
+        except pyads.ADSError as ex:
+            # The whole chunk failed; report it for each item individually
+            results.extend((ex.err_code, None) for _ in chunk)
+            continue
+
+        data_offset = _ERROR_CODE.size * len(chunk)
+        for idx, (_, _, size) in enumerate(chunk):
+            error_code, = _ERROR_CODE.unpack_from(response,
+                                                  _ERROR_CODE.size * idx)
+            data = response[data_offset:data_offset + size]
+            results.append((error_code, None if error_code else data))
+            data_offset += size
+
+    return results
+
+
+def sum_write(plc, requests):
+    '''
+    Write many areas with ADS sum commands (ADSIGRP_SUMUP_WRITE)
+
+    Parameters
+    ----------
+    plc : pyads.Connection
+    requests : list of (index_group, index_offset, data)
+
+    Returns
+    -------
+    error_codes : list of int
+        In the same order as `requests`
+    '''
+    results = []
+    for chunk in _split_sum_requests(
+            requests, lambda req: _SUM_READ_REQUEST.size + len(req[2]),
+            lambda req: _ERROR_CODE.size):
+        request = b''.join(
+            [_SUM_READ_REQUEST.pack(group, offset, len(data))
+             for group, offset, data in chunk] +
+            [bytes(data) for _, _, data in chunk]
+        )
+        try:
+            response = read_write_raw(plc, constants.ADSIGRP_SUMUP_WRITE,
+                                      len(chunk),
+                                      _ERROR_CODE.size * len(chunk), request)
+        except pyads.ADSError as ex:
+            results.extend(ex.err_code for _ in chunk)
+            continue
+
+        results.extend(
+            _ERROR_CODE.unpack_from(response, _ERROR_CODE.size * idx)[0]
+            for idx in range(len(chunk)))
+
+    return results
+
+
+# struct format characters for ctypes scalar types (ADS is little-endian)
+_STRUCT_FORMATS = {
+    ctypes.c_bool: '?',
+    ctypes.c_int8: 'b',
+    ctypes.c_uint8: 'B',
+    ctypes.c_int16: 'h',
+    ctypes.c_uint16: 'H',
+    ctypes.c_int32: 'i',
+    ctypes.c_uint32: 'I',
+    ctypes.c_int64: 'q',
+    ctypes.c_uint64: 'Q',
+    ctypes.c_float: 'f',
+    ctypes.c_double: 'd',
+}
+
+_NOTIFICATION_DATA_OFFSET = structs.SAdsNotificationHeader.data.offset
+_EPOCH_AS_FILETIME = 116444736000000000
+
+
+def filetime_to_timestamp(filetime):
+    'Convert a Windows FILETIME to a UNIX timestamp (float seconds)'
+    return (filetime - _EPOCH_AS_FILETIME) * 1e-7
+
+
+@functools.lru_cache(maxsize=None)
+def _byte_array_type(size):
+    return ctypes.c_ubyte * size
+
+
+def get_decoder(plc_datatype, data_size=None, *, use_numpy=False,
+                copy=False):
+    '''
+    Get a decoder for raw PLC data of type `plc_datatype`
+
+    Parameters
+    ----------
+    plc_datatype : ctypes type
+        The data type, as from `get_symbol_data_type`
+    data_size : int, optional
+        Size of the data in bytes, required for strings
+    use_numpy : bool, optional
+        Decode arrays of numeric types to `numpy.ndarray`
+    copy : bool, optional
+        With `use_numpy`, copy array data out of the buffer.  Required if
+        the buffer is not valid beyond the decoding call (e.g., for
+        notifications).  Otherwise, arrays are views of the buffer.
+
+    Returns
+    -------
+    decode : callable
+        decode(buffer, offset=0), returning the value as
+        `pyads.Connection.read` would.  `buffer` may be any object supporting
+        the buffer protocol; it is not copied prior to decoding.
+    '''
+    if plc_datatype != constants.PLCTYPE_STRING:
+        # Only the size of strings is not implied by the data type
+        data_size = None
+    if use_numpy and np is None:
+        raise RuntimeError('numpy is required for use_numpy')
+    if use_numpy and get_numpy_dtype(plc_datatype) is not None:
+        return _make_numpy_decoder(plc_datatype, copy)
+    return _make_decoder(plc_datatype, data_size)
+
+
+def get_numpy_dtype(plc_datatype):
+    '''
+    Get the little-endian numpy element dtype of an array data type
+
+    Returns None if `plc_datatype` is not an array of a numeric type.
+    '''
+    if not issubclass(plc_datatype, ctypes.Array):
+        return None
+    element_type = plc_datatype._type_
+    if element_type not in _STRUCT_FORMATS:
+        return None
+    return np.dtype(element_type).newbyteorder('<')
+
+
+@functools.lru_cache(maxsize=None)
+def _make_numpy_decoder(plc_datatype, copy):
+    dtype = get_numpy_dtype(plc_datatype)
+    count = plc_datatype._length_
+
+    if copy:
+        def decode(buffer, offset=0):
+            return np.frombuffer(buffer, dtype, count, offset).copy()
     else:
-        value, = struct.unpack(datatype_map[plc_datatype], bytearray(data))
+        def decode(buffer, offset=0):
+            return np.frombuffer(buffer, dtype, count, offset)
+
+    return decode
+
+
+@functools.lru_cache(maxsize=None)
+def _make_decoder(plc_datatype, data_size):
+    if plc_datatype == constants.PLCTYPE_STRING:
+        def decode(buffer, offset=0):
+            # read only until null-termination character
+            end = None if data_size is None else offset + data_size
+            raw = bytes(buffer[offset:end])
+            return raw.split(b"\0", 1)[0].decode("utf-8")
+
+        return decode
+
+    if plc_datatype in _STRUCT_FORMATS:
+        unpack_from = struct.Struct('<' + _STRUCT_FORMATS[plc_datatype]
+                                    ).unpack_from
+
+        def decode(buffer, offset=0):
+            return unpack_from(buffer, offset)[0]
+
+        return decode
+
+    if (issubclass(plc_datatype, ctypes.Array) and
+            plc_datatype._type_ in _STRUCT_FORMATS):
+        unpack_from = struct.Struct(
+            '<{}{}'.format(plc_datatype._length_,
+                           _STRUCT_FORMATS[plc_datatype._type_])
+        ).unpack_from
+
+        def decode(buffer, offset=0):
+            return list(unpack_from(buffer, offset))
+
+        return decode
+
+    size = ctypes.sizeof(plc_datatype)
+
+    if issubclass(plc_datatype, ctypes.Structure):
+        def decode(buffer, offset=0):
+            if len(buffer) - offset >= size:
+                return plc_datatype.from_buffer_copy(buffer, offset)
+            # Fit as much as the PLC sent
+            value = plc_datatype()
+            data = bytes(buffer[offset:offset + size])
+            ctypes.memmove(ctypes.addressof(value), data, len(data))
+            return value
+
+        return decode
+
+    def decode(buffer, offset=0):
+        value = plc_datatype.from_buffer_copy(buffer, offset)
+        if isinstance(value, ctypes.Array):
+            return list(value)
+        return getattr(value, 'value', value)
+
+    return decode
+
+
+def get_encoder(plc_datatype, data_size=None):
+    '''
+    Get an encoder of values to raw PLC data of type `plc_datatype`
+
+    Parameters
+    ----------
+    plc_datatype : ctypes type
+        The data type, as from `get_symbol_data_type`
+    data_size : int, optional
+        Size of the data in bytes, used to truncate strings
+
+    Returns
+    -------
+    encode : callable
+        encode(value), returning bytes.  Arrays may be given as any
+        sequence, including `numpy.ndarray`, and may be shorter than the
+        data type.
+    '''
+    if plc_datatype != constants.PLCTYPE_STRING:
+        data_size = None
+    return _make_encoder(plc_datatype, data_size)
+
+
+def _coerce_function(ctype):
+    if ctype in (ctypes.c_float, ctypes.c_double):
+        return float
+    if ctype is ctypes.c_bool:
+        return bool
+    return int
+
+
+@functools.lru_cache(maxsize=None)
+def _make_encoder(plc_datatype, data_size):
+    if plc_datatype == constants.PLCTYPE_STRING:
+        def encode(value):
+            raw = str(value).encode('utf-8')
+            if data_size is not None:
+                raw = raw[:data_size - 1]
+            return raw + b'\0'
+
+        return encode
+
+    if plc_datatype in _STRUCT_FORMATS:
+        pack = struct.Struct('<' + _STRUCT_FORMATS[plc_datatype]).pack
+        coerce = _coerce_function(plc_datatype)
+
+        def encode(value):
+            return pack(coerce(value))
+
+        return encode
+
+    size = ctypes.sizeof(plc_datatype)
+
+    if (issubclass(plc_datatype, ctypes.Array) and
+            plc_datatype._type_ in _STRUCT_FORMATS):
+        length = plc_datatype._length_
+        element_format = _STRUCT_FORMATS[plc_datatype._type_]
+        coerce = _coerce_function(plc_datatype._type_)
+
+        def encode(value):
+            if np is not None and isinstance(value, np.ndarray):
+                value = value.tolist()
+            if len(value) > length:
+                raise ValueError(f'Array of {len(value)} elements does not '
+                                 f'fit into {length}')
+            raw = struct.pack(f'<{len(value)}{element_format}',
+                              *map(coerce, value))
+            return raw.ljust(size, b'\0')
+
+        return encode
+
+    def encode(value):
+        if isinstance(value, plc_datatype):
+            return bytes(value)
+        if issubclass(plc_datatype, ctypes.Array):
+            return bytes(plc_datatype(*value))
+        return bytes(plc_datatype(value))
+
+    return encode
+
+
+def sum_read_write(plc, requests):
+    '''
+    Many read-write requests with ADS sum commands (ADSIGRP_SUMUP_READWRITE)
+
+    Parameters
+    ----------
+    plc : pyads.Connection
+    requests : list of (index_group, index_offset, read_size, write_data)
+
+    Returns
+    -------
+    results : list of (error_code, data)
+        In the same order as `requests`.  `data` is None if the request
+        failed, and may be shorter than `read_size`.
+    '''
+    def request_size(req):
+        return _SUM_READ_WRITE_REQUEST.size + len(req[3])
+
+    def response_size(req):
+        return _SUM_READ_WRITE_RESPONSE.size + req[2]
+
+    results = []
+    for chunk in _split_sum_requests(requests, request_size, response_size):
+        request = b''.join(
+            [_SUM_READ_WRITE_REQUEST.pack(group, offset, read_size,
+                                          len(write_data))
+             for group, offset, read_size, write_data in chunk] +
+            [write_data for _, _, _, write_data in chunk]
+        )
+        try:
+            response = read_write_raw(
+                plc, ADSIGRP_SUMUP_READWRITE, len(chunk),
+                sum(response_size(req) for req in chunk), request)
+        except pyads.ADSError as ex:
+            results.extend((ex.err_code, None) for _ in chunk)
+            continue
+
+        data_offset = _SUM_READ_WRITE_RESPONSE.size * len(chunk)
+        for idx in range(len(chunk)):
+            error_code, length = _SUM_READ_WRITE_RESPONSE.unpack_from(
+                response, _SUM_READ_WRITE_RESPONSE.size * idx)
+            data = response[data_offset:data_offset + length]
+            results.append((error_code, None if error_code else data))
+            data_offset += length
+
+    return results
+
+
+def unpack_value(data, plc_datatype):
+    '''
+    Unpack raw bytes read from the PLC, as `pyads.Connection.read` would
+    '''
+    return get_decoder(plc_datatype, len(data))(data)
+
+
+def notification_data(notification):
+    '''
+    Get the timestamp and a view of the data of a notification
+
+    The view is only valid for the duration of the notification callback.
+    '''
+    contents = notification.contents
+    data = _byte_array_type(contents.cbSampleSize).from_address(
+        ctypes.addressof(contents) + _NOTIFICATION_DATA_OFFSET)
+    return (filetime_to_timestamp(contents.nTimeStamp),
+            memoryview(data).cast('B'))
+
+
+def unpack_notification(notification, plc_datatype):
+    timestamp, data = notification_data(notification)
+    return timestamp, get_decoder(plc_datatype, len(data))(data)
+
+
+# IEC 61131-3 elementary types by name, for members of structures
+_IEC_TYPES = {
+    'BOOL': constants.PLCTYPE_BOOL,
+    'BIT': constants.PLCTYPE_BOOL,
+    'BYTE': constants.PLCTYPE_BYTE,
+    'SINT': constants.PLCTYPE_SINT,
+    'USINT': constants.PLCTYPE_USINT,
+    'INT': constants.PLCTYPE_INT,
+    'UINT': constants.PLCTYPE_UINT,
+    'WORD': constants.PLCTYPE_WORD,
+    'DINT': constants.PLCTYPE_DINT,
+    'UDINT': constants.PLCTYPE_UDINT,
+    'DWORD': constants.PLCTYPE_DWORD,
+    'LINT': ctypes.c_int64,
+    'ULINT': ctypes.c_uint64,
+    'LWORD': ctypes.c_uint64,
+    'REAL': constants.PLCTYPE_REAL,
+    'LREAL': constants.PLCTYPE_LREAL,
+    'TIME': constants.PLCTYPE_TIME,
+    'TOD': constants.PLCTYPE_TOD,
+    'TIME_OF_DAY': constants.PLCTYPE_TOD,
+    'DATE': constants.PLCTYPE_DATE,
+    'DT': constants.PLCTYPE_DT,
+    'DATE_AND_TIME': constants.PLCTYPE_DT,
+}
+
+_ARRAY_TYPE_NAME = re.compile(r'^\s*ARRAY\s*\[(.*)\]\s*OF\s+(.+?)\s*$',
+                              re.IGNORECASE)
+_STRING_TYPE_NAME = re.compile(
+    r'^\s*STRING\s*(?:[(\[]\s*(\d+)\s*[)\]])?\s*$', re.IGNORECASE)
+
 
-    timestamp = pyads.filetimes.filetime_to_dt(contents.nTimeStamp)
-    return timestamp, value
+def _array_length(dimensions):
+    'Number of elements of ARRAY [dimensions], e.g., "1..3, 0..1"'
+    length = 1
+    for dimension in dimensions.split(','):
+        low, high = dimension.split('..')
+        length *= int(high) - int(low) + 1
+    return length
 
 
-def get_symbol_data_type(plc, symbol_name, *, custom_types=None):
+class DataTypes:
+    '''
+    ctypes types built from the data type table of a PLC
+
+    Structures (including nested structures, arrays and strings) are built
+    on first use and cached.  Members which cannot be resolved are kept as
+    byte arrays, so that the layout always matches the PLC.
+
+    Parameters
+    ----------
+    entries : list of upload.DataTypeEntry, optional
+    loader : callable, optional
+        Called without arguments to get `entries` on first use
+    '''
+
+    def __init__(self, entries=None, *, loader=None):
+        self._loader = loader
+        self._entries = None
+        self._types = {}
+        self._building = set()
+        self._lock = threading.RLock()
+        if entries is not None:
+            self._set_entries(entries)
+
+    def _set_entries(self, entries):
+        self._entries = {entry.name.lower(): entry for entry in entries}
+
+    @property
+    def entries(self):
+        'Data type table entries by lower-case name'
+        if self._entries is None:
+            with self._lock:
+                if self._entries is None:
+                    entries = []
+                    try:
+                        entries = self._loader()
+                    except Exception as ex:
+                        logger.warning('Data type upload failed: %s', ex)
+                    self._set_entries(entries)
+        return self._entries
+
+    def get(self, type_name, default=None):
+        'Get the ctypes type of `type_name`'
+        key = type_name.lower()
+        try:
+            return self._types[key]
+        except KeyError:
+            ...
+
+        with self._lock:
+            if key in self._building:
+                # Self-referencing type; only possible through pointers
+                return default
+            self._building.add(key)
+            try:
+                data_type = self._resolve(type_name)
+            finally:
+                self._building.discard(key)
+            if data_type is None:
+                return default
+            self._types[key] = data_type
+            return data_type
+
+    def __getitem__(self, type_name):
+        data_type = self.get(type_name)
+        if data_type is None:
+            raise KeyError(type_name)
+        return data_type
+
+    def __contains__(self, type_name):
+        return self.get(type_name) is not None
+
+    def _resolve(self, type_name):
+        entry = self.entries.get(type_name.lower())
+        if entry is not None:
+            return self._from_entry(entry)
+
+        match = _ARRAY_TYPE_NAME.match(type_name)
+        if match:
+            dimensions, element_name = match.groups()
+            element = self.get(element_name)
+            if element is None:
+                return None
+            return element * _array_length(dimensions)
+
+        match = _STRING_TYPE_NAME.match(type_name)
+        if match:
+            length = int(match.group(1) or 80)
+            return ctypes.c_char * (length + 1)
+
+        return _IEC_TYPES.get(type_name.strip().upper())
+
+    def _from_entry(self, entry):
+        if entry.sub_items:
+            return self._make_structure(entry)
+
+        if entry.array_info:
+            element = self._member_type(entry.type_name, entry.dataType,
+                                        None)
+            length = 1
+            for _, elements in entry.array_info:
+                length *= elements
+            if element is not None and ctypes.sizeof(element) * length == \
+                    entry.size:
+                return element * length
+            return _byte_array_type(entry.size)
+
+        # Aliases, enums and elementary types
+        return self._member_type(entry.type_name, entry.dataType,
+                                 entry.size, exclude=entry.name)
+
+    def _member_type(self, type_name, ads_type, size, *, exclude=None):
+        'Resolve a type by name, falling back to its ADS data type'
+        data_type = None
+        if type_name and type_name.lower() != (exclude or '').lower():
+            data_type = self.get(type_name)
+        if data_type is None:
+            if ads_type == ADST_Type.STRING and size:
+                data_type = ctypes.c_char * size
+            else:
+                data_type = ads_type_to_ctype.get(ads_type)
+                if data_type is constants.PLCTYPE_STRING:
+                    data_type = None
+        if size is not None and (data_type is None or
+                                 ctypes.sizeof(data_type) != size):
+            return _byte_array_type(size) if size else None
+        return data_type
+
+    def _make_structure(self, entry):
+        fields = []
+        position = 0
+        for item in sorted(entry.sub_items, key=lambda item: item.offset):
+            if item.offset < position or not item.name:
+                # Overlapping (union) or bit members cannot be represented
+                continue
+            if item.offset > position:
+                fields.append((f'_pad{position}',
+                               _byte_array_type(item.offset - position)))
+            if item.sub_items:
+                member = self._make_structure(item)
+            else:
+                member = self._member_type(item.type_name, item.dataType,
+                                           item.size)
+            if member is None:
+                continue
+            fields.append((item.name, member))
+            position = item.offset + ctypes.sizeof(member)
+
+        if entry.size > position:
+            fields.append((f'_pad{position}',
+                           _byte_array_type(entry.size - position)))
+
+        return type(entry.name, (ctypes.Structure, ),
+                    {'_pack_': 1, '_fields_': fields})
+
+
+def upload_data_type_table(plc, *, use_cache=True):
+    '''
+    Upload and parse the data type table of the target
+
+    Parameters
+    ----------
+    plc : pyads.Connection
+    use_cache : bool, optional
+        Use the on-disk cache, as with `upload_symbol_table`
+
+    Returns
+    -------
+    entries : list of upload.DataTypeEntry
+    '''
+    upload_info = plc.read(constants.ADSIGRP_SYM_UPLOADINFO2, 0x0,
+                           _byte_array_type(_UPLOAD_INFO2.size),
+                           return_ctypes=True)
+    _, _, num_types, types_size, _, _ = _UPLOAD_INFO2.unpack(
+        bytes(upload_info))
+
+    ams_id, port = plc._adr.netid, plc._adr.port
+    version = (get_symbol_version(plc), num_types, types_size)
+    if use_cache:
+        entries = upload.load_cached('datatypes', ams_id, port, version)
+        if entries is not None:
+            return entries
+
+    buffer = plc.read(constants.ADSIGRP_SYM_DT_UPLOAD, 0,
+                      _byte_array_type(types_size), return_ctypes=True)
+    entries = upload.parse_data_type_table(buffer)
+    if use_cache:
+        upload.save_cached('datatypes', ams_id, port, version, buffer)
+    return entries
+
+
+def get_symbol_data_type(plc, symbol_name, *, custom_types=None,
+                         data_types=None):
+    '''
+    Get the ctypes data type of a symbol
+
+    Parameters
+    ----------
+    plc : pyads.Connection
+    symbol_name : str
+    custom_types : dict, optional
+        Data types by ADS type number or type name, taking precedence
+    data_types : DataTypes, optional
+        Structures of the target.  By default, the data type table is
+        uploaded if required.
+
+    Returns
+    -------
+    data_type : ctypes type
+    array_length : int
+    '''
     info = get_symbol_information(plc, symbol_name)
+    if data_types is None:
+        data_types = DataTypes(loader=lambda: upload_data_type_table(plc))
+    return data_type_from_symbol_info(info, custom_types=custom_types,
+                                      data_types=data_types)
+
+
+def data_type_from_symbol_info(info, *, custom_types=None, data_types=None):
+    '''
+    Get the ctypes data type from symbol information
+
+    Elementary types are mapped directly; others are looked up in
+    `custom_types`, then in `data_types`.
+
+    Returns
+    -------
+    data_type : ctypes type
+    array_length : int
+    '''
     type_name = info.type_name
     data_type_int = info.dataType
 
     if custom_types is None:
         custom_types = {}
 
+    array_match = _ARRAY_TYPE_NAME.match(type_name)
+    element_name = array_match.group(2) if array_match else type_name
+
     if data_type_int in custom_types:
         data_type = custom_types[data_type_int]
     elif type_name in custom_types:
-        # Potential feature: allow mapping of type names to structures by
-        # registering them in `custom_types`
         data_type = custom_types[type_name]
+    elif element_name in custom_types:
+        data_type = custom_types[element_name]
     elif data_type_int in ads_type_to_ctype:
         data_type = ads_type_to_ctype[data_type_int]
     elif type_name in ads_type_to_ctype:
         # Potential feature: allow mapping of type names to structures by
         # registering them in `ads_type_to_ctype`
         data_type = ads_type_to_ctype[type_name]
+    elif data_types is not None and data_types.get(element_name):
+        # Arrays of structures are handled below, by size
+        data_type = data_types.get(element_name)
     else:
         raise ValueError(
             'Unsupported data type {!r} (number={} size={} comment={!r})'
@@ -144,174 +940,1490 @@ def get_symbol_data_type(plc, symbol_name, *, custom_types=None):
     return data_type, array_length
 
 
-def enumerate_plc_symbols(plc):
+def get_symbol_version(plc):
+    'Symbol version of the target, incremented on online changes'
+    return plc.read(constants.ADSIGRP_SYM_VERSION, 0x0,
+                    constants.PLCTYPE_BYTE)
+
+
+def upload_symbol_table(plc, *, use_cache=True):
+    '''
+    Upload and parse the symbol table of the target
+
+    Parameters
+    ----------
+    plc : pyads.Connection
+    use_cache : bool, optional
+        Use the on-disk symbol table cache.  The table is only uploaded if
+        the symbol version or upload size of the target changed since it was
+        cached.
+
+    Returns
+    -------
+    entries : list of upload.SymbolEntry
+    '''
     symbol_info = plc.read(constants.ADSIGRP_SYM_UPLOADINFO, 0x0,
                            structs.SAdsSymbolUploadInfo)
 
     if symbol_info is None:
         raise RuntimeError('PLC connection not open')
 
-    symbol_buffer = bytearray(
-        plc.read(constants.ADSIGRP_SYM_UPLOAD, 0,
-                 ctypes.c_ubyte * symbol_info.nSymSize,
-                 return_ctypes=True))
+    ams_id, port = plc._adr.netid, plc._adr.port
+    version = (get_symbol_version(plc), symbol_info.nSymbols,
+               symbol_info.nSymSize)
+    if use_cache:
+        entries = upload.load_cached('symbols', ams_id, port, version)
+        if entries is not None:
+            return entries
+
+    symbol_buffer = plc.read(constants.ADSIGRP_SYM_UPLOAD, 0,
+                             ctypes.c_ubyte * symbol_info.nSymSize,
+                             return_ctypes=True)
+    entries = upload.parse_symbol_table(symbol_buffer)
+    if use_cache:
+        upload.save_cached('symbols', ams_id, port, version,
+                           symbol_buffer)
+    return entries
+
+
+def enumerate_plc_symbols(plc, *, use_cache=True):
+    return {entry.name: {'entry': entry,
+                         'type': entry.type_name,
+                         'comment': entry.comment}
+            for entry in upload_symbol_table(plc, use_cache=use_cache)}
+
+
+class SymbolIndex:
+    '''
+    Case-insensitive search of a symbol table by name and type
+
+    The search keys are built once, e.g., in a background thread, so that
+    each search is a scan over prebuilt lower-case strings.
+
+    Parameters
+    ----------
+    entries : list of upload.SymbolEntry
+    '''
+
+    def __init__(self, entries):
+        self.entries = list(entries)
+        self._keys = [f'{entry.name}\t{entry.type_name}'.lower()
+                      for entry in self.entries]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def search(self, text):
+        '''
+        Find entries matching all words of `text` in their name or type
+
+        Returns
+        -------
+        rows : sequence of int
+            Indices into `entries`, in order; all of them if `text` is empty
+        '''
+        words = text.lower().split()
+        if not words:
+            return range(len(self.entries))
+
+        keys = self._keys
+        rows = [row for row, key in enumerate(keys) if words[0] in key]
+        for word in words[1:]:
+            rows = [row for row in rows if word in keys[row]]
+        return rows
+
+
+_NO_VALUE = object()
+
+
+def value_changed(old, new, deadband=None, rel_deadband=None):
+    '''
+    Has the value changed from `old` to `new`, outside of any deadband?
+
+    Parameters
+    ----------
+    old : any
+        The last value
+    new : any
+        The new value
+    deadband : float, optional
+        Absolute deadband, for numeric values
+    rel_deadband : float, optional
+        Deadband relative to `old`, for numeric values.  If both are given,
+        the larger of the two applies.
+    '''
+    if old is _NO_VALUE:
+        return True
+
+    if np is not None and isinstance(new, np.ndarray):
+        if not isinstance(old, np.ndarray) or old.shape != new.shape:
+            return True
+        if new.dtype.kind == 'f' and old.dtype.kind == 'f':
+            # NaN to NaN is unchanged, NaN to a number (or back) a change
+            if not np.array_equal(np.isnan(old), np.isnan(new)):
+                return True
+            if not (deadband or rel_deadband):
+                return not np.array_equal(old, new, equal_nan=True)
+        if (deadband or rel_deadband) and new.dtype.kind in 'iuf':
+            if new.dtype.kind in 'iu':
+                # Differences of unsigned or narrow integers would wrap
+                old = old.astype(np.float64)
+                new = new.astype(np.float64)
+            threshold = np.maximum(deadband or 0,
+                                   np.abs(old) * (rel_deadband or 0))
+            return bool(np.any(np.abs(new - old) > threshold))
+        return not np.array_equal(old, new)
+
+    if isinstance(new, ctypes.Structure):
+        return bytes(old) != bytes(new)
+
+    if isinstance(new, float) or isinstance(old, float):
+        old_nan = isinstance(old, float) and math.isnan(old)
+        new_nan = isinstance(new, float) and math.isnan(new)
+        if old_nan or new_nan:
+            return old_nan != new_nan
+
+    if isinstance(new, list) and isinstance(old, list):
+        if old == new:
+            return False
+        return (len(old) != len(new) or
+                any(_item_changed(a, b) for a, b in zip(old, new)))
+
+    if ((deadband or rel_deadband) and
+            isinstance(new, (int, float)) and not isinstance(new, bool) and
+            isinstance(old, (int, float))):
+        threshold = max(deadband or 0, abs(old) * (rel_deadband or 0))
+        return abs(new - old) > threshold
+
+    return old != new
+
+
+def _item_changed(old, new):
+    'Change of a list element, where NaN equals NaN'
+    if old == new:
+        return False
+    return not (isinstance(old, float) and isinstance(new, float) and
+                math.isnan(old) and math.isnan(new))
+
+
+def _parent_name(symbol_name):
+    '''
+    The name of the struct containing `symbol_name`, if it may have one
+
+    Members of programs and global variable lists (e.g., ``MAIN.fValue``)
+    have no parent variable.
+    '''
+    parent, _, _ = symbol_name.rpartition('.')
+    if '.' not in parent:
+        return None
+    return parent
+
+
+class PlcVariable:
+    '''
+    A PLC variable, shared by all Symbols of the same name on a Plc
+
+    Owns the ADS resources of the variable (information, handle, and a
+    single notification or poll registration) and fans out updates to all
+    subscribed Symbols.  The subscription is torn down when the last Symbol
+    unsubscribes.
+    '''
+
+    def __init__(self, plc, name):
+        self.plc = plc
+        self.ads = plc.ads
+        self.name = name
+        self.data_type = None
+        self.array_size = None
+        self.data_size = None
+        self.handle = None
+        self.notification_handle = None
+        self.poll_rate = None
+        self.consumers = []
+        #: Subscribe through the parent struct, if other members do as well
+        self.share_parent = False
+        #: The parent variable serving this one, and our offset in its data
+        self.parent = None
+        self.parent_offset = None
+        self._parent_checked = False
+        #: Member variables served by the subscription of this one
+        self.members = []
+        self._last_raw = None
+        self._decoders = {}
+        self._encoder = None
+        self._poll_error = 0
+        # Changes observed since the last rebalance of the budget
+        self._changes = 0
+        self._polls = 0
+        self._last_poll_data = None
+        # Guards the data held back for consumers of slower rates
+        self._held_lock = threading.Lock()
+
+    def __repr__(self):
+        return (f'<{self.__class__.__name__} {self.name!r} '
+                f'consumers={len(self.consumers)} poll_rate={self.poll_rate} '
+                f'notification={self.notification_handle is not None}>')
+
+    def _update_data_type(self):
+        info = self.plc.get_symbol_info(self.name)
+        try:
+            self.data_type, self.array_size = data_type_from_symbol_info(
+                info, data_types=self.plc.data_types)
+        except ValueError:
+            if self.consumers or not self.members:
+                raise
+            # Members only need the raw data of their parent
+            self.data_type, self.array_size = _byte_array_type(info.size), 1
+        self.data_size = info.size
+        self._decoders.clear()
+        self._encoder = None
+
+    def get_decoder(self, use_numpy=False, copy=False):
+        'Decoder for the resolved data type; see `get_decoder`'
+        key = (use_numpy, copy)
+        try:
+            return self._decoders[key]
+        except KeyError:
+            decoder = get_decoder(self.data_type, self.data_size,
+                                  use_numpy=use_numpy, copy=copy)
+            self._decoders[key] = decoder
+            return decoder
+
+    def get_encoder(self):
+        'Encoder for the resolved data type; see `get_encoder`'
+        if self._encoder is None:
+            self._encoder = get_encoder(self.data_type, self.data_size)
+        return self._encoder
+
+    def _resolve(self):
+        'Resolve the data type and acquire a variable handle, if necessary'
+        if self.data_type is None:
+            self._update_data_type()
+        if self.handle is None:
+            self.handle = get_symbol_handle(self.ads, self.name)
+
+    def _release_handle(self):
+        handle, self.handle = self.handle, None
+        if handle is None or not self.ads.is_open:
+            return
+
+        try:
+            release_symbol_handle(self.ads, handle)
+        except pyads.ADSError as ex:
+            logger.debug('Failed to release handle of %s: %s', self.name, ex)
+
+    def _invalidate(self):
+        'Forget the handle and data type, e.g., after an online change'
+        self._release_handle()
+        self.data_type = None
+        self._parent_checked = False
+        self.plc.forget_symbol_info(self.name)
+
+    def _call_by_handle(self, func):
+        'Call func(handle), re-acquiring the handle after an online change'
+        # Reopened if closed as unused
+        self.plc.open()
+        self._resolve()
+        try:
+            return func(self.handle)
+        except pyads.ADSError as ex:
+            if ex.err_code not in ONLINE_CHANGE_ERRORS:
+                raise
+            logger.info('Re-acquiring handle of %s after online change: %s',
+                        self.name, ex)
+
+        self._invalidate()
+        self._resolve()
+        return func(self.handle)
+
+    def read(self, *, use_numpy=False):
+        data = self.plc._timed(
+            'read', self._call_by_handle,
+            lambda handle: self.ads.read(
+                constants.ADSIGRP_SYM_VALBYHND, handle,
+                ctypes.c_ubyte * self.data_size, return_ctypes=True)
+        )
+        return self.get_decoder(use_numpy)(data)
+
+    def write(self, value):
+        if self.data_type is None:
+            self._update_data_type()
+        data = self.get_encoder()(value)
+        self.plc._timed(
+            'write', self._call_by_handle,
+            lambda handle: self.ads.write(
+                constants.ADSIGRP_SYM_VALBYHND, handle, data,
+                _byte_array_type(len(data)))
+        )
+
+    def write_async(self, value):
+        '''
+        Queue a write of `value` without waiting for it
+
+        See `Plc.queue_write`.
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+        '''
+        return self.plc.queue_write(self, value)
+
+    def _dispatch(self, timestamp, data, *, copy=False, period=None):
+        '''
+        Decode `data` once per numpy mode and send it to all consumers
+
+        Consumers with a `poll_rate` slower than `period`, the poll period
+        of polled data, only receive updates at their own rate.  For
+        notifications, the latest data held back is delivered once the
+        consumer's period has passed.
+        '''
+        if self.members:
+            data = self._last_raw = bytes(data)
+            for member in list(self.members):
+                try:
+                    member._parent_update(timestamp, data, period=period)
+                except Exception:
+                    logger.exception('Update of member %s failed',
+                                     member.name)
+
+        metrics = self.plc.metrics
+        values = {}
+        now = time.monotonic()
+        for consumer in list(self.consumers):
+            rate = consumer.poll_rate
+            if rate and (period is None or rate > period):
+                # Allowing for jitter of the poll schedule
+                if now - consumer._last_delivery < rate - (period or 0) / 2:
+                    if period is None:
+                        self._hold(consumer, timestamp, data)
+                    continue
+                consumer._last_delivery = now
+                if consumer._held is not None:
+                    with self._held_lock:
+                        consumer._held = None
+
+            use_numpy = consumer.use_numpy
+            try:
+                value = values[use_numpy]
+            except KeyError:
+                decode = self.get_decoder(use_numpy, copy)
+                if metrics is None:
+                    value = decode(data)
+                else:
+                    t0 = time.perf_counter()
+                    value = decode(data)
+                    metrics.variable(self.name).decode_time.observe(
+                        time.perf_counter() - t0)
+                values[use_numpy] = value
+
+            try:
+                consumer._update(timestamp, value)
+            except Exception:
+                logger.exception('Update of %s failed', consumer)
+
+    def _hold(self, consumer, timestamp, data):
+        'Hold back notified data for `consumer` until its period has passed'
+        with self._held_lock:
+            scheduled = consumer._held is not None
+            consumer._held = (timestamp, bytes(data))
+        if not scheduled:
+            self.plc.call_later(
+                consumer._last_delivery + consumer.poll_rate -
+                time.monotonic(), self._deliver_held, consumer)
+
+    def _deliver_held(self, consumer):
+        'Deliver the latest data held back for `consumer`; see `_hold`'
+        delay = consumer._last_delivery + consumer.poll_rate - time.monotonic()
+        if delay > 0:
+            # Delivered directly in the meantime, and held back again since
+            self.plc.call_later(delay, self._deliver_held, consumer)
+            return
+
+        with self._held_lock:
+            held, consumer._held = consumer._held, None
+        if held is None or consumer not in self.consumers:
+            return
+
+        timestamp, data = held
+        consumer._last_delivery = time.monotonic()
+        value = self.get_decoder(consumer.use_numpy)(data)
+        consumer._update(timestamp, value)
 
-    symbol_buffer = bytearray(symbol_buffer)
+    def _parent_update(self, timestamp, data, *, period=None):
+        'Update from the parent subscription, dispatched if our bytes changed'
+        if self.data_type is None or self.parent_offset is None:
+            return
+        data = data[self.parent_offset:self.parent_offset + self.data_size]
+        # Polls are always dispatched, for consumers of slower poll rates
+        if data == self._last_raw and period is None:
+            return
+        self._last_raw = data
+        self._dispatch(timestamp, data, period=period)
+
+    def _notification_update(self, notification, name):
+        timestamp, data = notification_data(notification)
+        self._changes += 1
+        if self.plc.metrics is not None:
+            self.plc.metrics.variable(self.name).notifications += 1
+        # Notification buffers are only valid during the callback
+        self._dispatch(timestamp, data, copy=True)
+
+    def _poll_result(self, timestamp, error_code, data):
+        'Poll group sum-read result for this variable'
+        if error_code:
+            if error_code != self._poll_error:
+                logger.error('Poll of %s failed: %s', self.name,
+                             pyads.ADSError(error_code))
+            self._poll_error = error_code
+            if error_code in ONLINE_CHANGE_ERRORS:
+                # Handle will be re-acquired on the next poll
+                self._invalidate()
+            return
+
+        self._poll_error = 0
+        if self in self.plc.budget.polled:
+            # Observe how often it changes, as a candidate for notification
+            self._polls += 1
+            data = bytes(data)
+            if data != self._last_poll_data:
+                self._changes += 1
+                self._last_poll_data = data
+        if self.plc.metrics is not None:
+            self.plc.metrics.variable(self.name).polls += 1
+        self._dispatch(timestamp, data, period=self.poll_rate)
+
+    def add_consumer(self, consumer, *, initialize=True):
+        '''
+        Subscribe a Symbol to updates of this variable
+
+        Without `initialize`, the caller subscribes the variable and
+        delivers the first value; see `Plc.start_symbols`.
+        '''
+        if consumer in self.consumers:
+            return
+        self.consumers.append(consumer)
+        if initialize:
+            self.plc.add_to_queue(self._consumer_added, consumer)
+
+    def remove_consumer(self, consumer):
+        'Unsubscribe a Symbol from updates of this variable'
+        try:
+            self.consumers.remove(consumer)
+        except ValueError:
+            return
+        self.plc.add_to_queue(self._update_subscription)
+
+    def _consumer_added(self, consumer):
+        if consumer not in self.consumers:
+            return
+
+        had_notification = self.notification_handle is not None
+        self._update_subscription()
+        if self.notification_handle is not None and not had_notification:
+            # A new notification delivers the current value to everyone
+            return
+
+        # Otherwise, the new consumer gets an initial value of its own
+        value = self.read(use_numpy=consumer.use_numpy)
+        consumer._update(time.time(), value)
+
+    def _wanted_poll_rate(self):
+        '''
+        The subscription required by the current consumers
+
+        Returns None for a notification, the fastest requested poll rate,
+        or False if there are no consumers.  Member variables served by
+        this one count as consumers.
+        '''
+        rates = [consumer.poll_rate for consumer in list(self.consumers)]
+        rates.extend(rate for rate in (member._wanted_poll_rate()
+                                       for member in list(self.members))
+                     if rate is not False)
+        if not rates:
+            return False
+        if None in rates:
+            return None
+        return min(rates)
+
+    def _latency_sensitive(self):
+        'Whether a consumer, or one of a member, needs a notification'
+        return (any(consumer.latency_sensitive
+                    for consumer in list(self.consumers)) or
+                any(member._latency_sensitive()
+                    for member in list(self.members)))
+
+    def _update_subscription(self):
+        'Add, switch or remove the ADS subscription; run on the PLC thread'
+        wanted = self._wanted_poll_rate()
+        parent = None if wanted is False else self._shared_parent()
+        budget = self.plc.budget
+        if wanted is None and parent is None:
+            if not budget.request(self):
+                wanted = budget.poll_rate
+        else:
+            budget.release(self)
+
+        if self.parent is not None and self.parent is not parent:
+            old_parent, self.parent = self.parent, None
+            old_parent._remove_member(self)
+
+        if parent is not None:
+            # Served by the subscription of the parent instead of our own
+            self._unsubscribe()
+            if self.data_type is None:
+                self._update_data_type()
+            self.parent = parent
+            parent._add_member(self)
+            return
+
+        if wanted is None and self.notification_handle is not None:
+            return
+        if wanted and wanted == self.poll_rate:
+            return
+
+        self._unsubscribe()
+        if wanted is None:
+            self._resolve()
+            attr = pyads.NotificationAttrib(self.data_size)
+            # By our handle: by name, pyads would acquire a second one
+            self.notification_handle = self.plc._timed(
+                'add_notification', self.ads.add_device_notification,
+                (constants.ADSIGRP_SYM_VALBYHND, self.handle), attr,
+                self._notification_update)
+        elif wanted:
+            self.poll_rate = wanted
+            self.plc.add_poll_variable(wanted, self)
+        else:
+            self._release_handle()
+
+    def _shared_parent(self):
+        '''
+        The parent variable to subscribe through, or None
 
-    symbols = {}
-    while symbol_buffer:
-        if len(symbol_buffer) < ctypes.sizeof(structs.SAdsSymbolEntry):
-            symbol_buffer += (bytearray(ctypes.sizeof(structs.SAdsSymbolEntry)
-                                        - len(symbol_buffer)))
-        entry = structs.SAdsSymbolEntry.from_buffer(symbol_buffer)
-        if entry.entryLength == 0:
-            break
+        A struct member is served by the subscription of its parent if at
+        least two subscribed members of the parent share it, and the member
+        lies within the data of a parent no larger than
+        MAX_SHARED_PARENT_SIZE.
+        '''
+        if not self.share_parent:
+            return None
+        parent_name = _parent_name(self.name)
+        sharing = [sibling for sibling in self._siblings()
+                   if sibling is self or
+                   sibling._wanted_poll_rate() is not False]
+        if len(sharing) < 2:
+            return None
 
-        symbols[entry.name] = {'entry': entry,
-                               'type': entry.type_name,
-                               'comment': entry.comment}
-        symbol_buffer = symbol_buffer[entry.entryLength:]
+        if not self._parent_checked:
+            self.parent_offset = self._find_parent_offset(parent_name)
+            self._parent_checked = True
+        if self.parent_offset is None:
+            return None
+        return self.plc.get_variable(parent_name)
 
-    return symbols
+    def _siblings(self):
+        'Members of our parent, including this one, that may share it'
+        return list(self.plc._shared_members.get(
+            _parent_name(self.name).lower(), ()))
+
+    def _find_parent_offset(self, parent_name):
+        'Offset of our data in that of the parent, or None if not contained'
+        try:
+            info = self.plc.get_symbol_info(self.name)
+            parent_info = self.plc.get_symbol_info(parent_name)
+        except pyads.ADSError as ex:
+            logger.debug('Not sharing the subscription of %s: %s',
+                         parent_name, ex)
+            return None
+
+        offset = info.iOffs - parent_info.iOffs
+        if (info.iGroup != parent_info.iGroup or offset < 0 or
+                offset + info.size > parent_info.size or
+                parent_info.size > MAX_SHARED_PARENT_SIZE):
+            logger.debug('Not sharing the subscription of %s with %s',
+                         parent_name, self.name)
+            return None
+        return offset
+
+    def _add_member(self, member):
+        'Serve `member` by the subscription of this variable'
+        if member not in self.members:
+            self.members.append(member)
+            member._last_raw = None
+            if self._last_raw is not None:
+                member._parent_update(time.time(), self._last_raw)
+            # Subscribed siblings may now move here as well
+            for sibling in member._siblings():
+                if sibling not in self.members and sibling.consumers:
+                    self.plc.add_to_queue(sibling._update_subscription)
+        self._update_subscription()
+
+    def _remove_member(self, member):
+        try:
+            self.members.remove(member)
+        except ValueError:
+            return
+        if len(self.members) == 1:
+            # A single member is cheaper to subscribe on its own
+            self.plc.add_to_queue(self.members[0]._update_subscription)
+        self._update_subscription()
+        # Parents are only registered for their members
+        self.plc._remove_if_unused(self)
+
+    def _unsubscribe(self):
+        self._last_raw = None
+        if self.poll_rate is not None:
+            self.plc.remove_poll_variable(self.poll_rate, self)
+            self.poll_rate = None
+
+        handle, self.notification_handle = self.notification_handle, None
+        if handle is not None:
+            try:
+                self.ads.del_device_notification(*handle)
+            except pyads.ADSError as ex:
+                logger.debug('Failed to delete notification of %s: %s',
+                             self.name, ex)
 
 
 class Symbol:
-    def __init__(self, plc, symbol, poll_rate):
+    '''
+    A consumer of a PLC variable
+
+    Symbols of the same name share a single `PlcVariable` and, through it,
+    a single ADS notification or poll registration.
+
+    Parameters
+    ----------
+    plc : Plc
+    symbol : str
+        The symbol name
+    poll_rate : float or None
+        Poll period in seconds, or None to use a device notification
+    use_numpy : bool, optional
+        Decode numeric arrays to numpy arrays
+    deadband : float, optional
+        Absolute deadband for value updates
+    rel_deadband : float, optional
+        Deadband for value updates, relative to the last value
+    share_parent : bool, optional
+        If the symbol is a struct member, subscribe through the parent
+        struct together with other members doing the same
+    latency_sensitive : bool, optional
+        With a poll_rate of None, always use a notification, rather than
+        polling once the `NotificationBudget` is exhausted
+    '''
+    #: Decode numeric arrays to numpy arrays
+    use_numpy = False
+
+    def __init__(self, plc, symbol, poll_rate, *, use_numpy=None,
+                 deadband=None, rel_deadband=None, share_parent=False,
+                 latency_sensitive=False):
+        if use_numpy is not None:
+            self.use_numpy = use_numpy
+        self.latency_sensitive = latency_sensitive
+        self.deadband = deadband
+        self.rel_deadband = rel_deadband
+        self._last_value = _NO_VALUE
+        # Time of the last update, and the latest (timestamp, data) held
+        # back since, for consumers slower than the subscription
+        self._last_delivery = -math.inf
+        self._held = None
         self._subscribed = False
         self.plc = plc
+        #: False while the connection to the PLC is lost
+        self.connected = plc.connected
         self.symbol = symbol
         self.connection = None
         self.ads = self.plc.ads
-        self.data_type = None
-        self.array_size = None
-        self.notification_handle = None
+        self.variable = plc.get_variable(symbol, share_parent=share_parent)
         self.poll_rate = poll_rate
 
+    def __repr__(self):
+        return (f'<{self.__class__.__name__} {self.symbol!r} '
+                f'poll_rate={self.poll_rate}>')
+
+    @property
+    def data_type(self):
+        return self.variable.data_type
+
+    @property
+    def array_size(self):
+        return self.variable.array_size
+
+    @property
+    def data_size(self):
+        return self.variable.data_size
+
     def value_updated(self, timestamp, value):
         'Value update hook for subclasses'
 
-    def _notification_update(self, notification, name):
-        timestamp, value = unpack_notification(notification, self.data_type)
-        self.value_updated(timestamp, value)
+    def connection_changed(self, connected):
+        'Connection state hook for subclasses'
 
-    def _update_data_type(self):
-        self.data_type, self.array_size = get_symbol_data_type(
-            self.ads, self.symbol)
+    def _connection_changed(self, connected):
+        self.connected = connected
+        # Always deliver the first value after reconnecting
+        self._last_value = _NO_VALUE
+        self.connection_changed(connected)
+
+    def _update(self, timestamp, value):
+        'Call `value_updated` if the value changed outside of the deadband'
+        if value_changed(self._last_value, value, self.deadband,
+                         self.rel_deadband):
+            self._last_value = value
+            self.value_updated(timestamp, value)
 
     def read(self):
-        if self.data_type is None:
-            self._update_data_type()
-        return self.ads.read_by_name(self.symbol, plc_datatype=self.data_type)
+        return self.variable.read(use_numpy=self.use_numpy)
 
     def write(self, value):
         try:
-            if self.data_type is None:
-                self._update_data_type()
-            if self.data_type not in (constants.PLCTYPE_REAL,
-                                      constants.PLCTYPE_LREAL):
-                # TODO ... int types
-                value = int(value)
-            self.ads.write_by_name(self.symbol, value=value,
-                                   plc_datatype=self.data_type)
+            self.variable.write(value)
         except Exception:
             logger.exception('Failed to write %s to %s', self.symbol, value)
 
-    def _poll(self):
-        if self.data_type is None:
-            self._update_data_type()
-        value = self.ads.read_by_name(self.symbol, plc_datatype=self.data_type)
-        self.value_updated(time.time(), value)
+    def write_async(self, value):
+        '''
+        Queue a write of `value` without waiting for it
 
-    def start(self):
+        Returns
+        -------
+        future : concurrent.futures.Future
+            Completed once the value, or a later one superseding it, was
+            written
+        '''
+        return self.variable.write_async(value)
+
+    def start(self, *, initialize=True):
+        'Subscribe; see `Plc.start_symbols` to start many at once'
         if self._subscribed:
             return
 
         self._subscribed = True
-
-        def init():
-            if self.poll_rate is None:
-                self._update_data_type()
-                attr = pyads.NotificationAttrib(ctypes.sizeof(self.data_type))
-                self.notification_handle = self.ads.add_device_notification(
-                    self.symbol, attr, self._notification_update)
-            else:
-                self._poll()
-
-        self.plc.add_to_queue(init)
-        if self.poll_rate is not None:
-            self.plc.add_to_poll_thread(self.poll_rate, self._poll)
+        # Always deliver the first value of a subscription
+        self._last_value = _NO_VALUE
+        self.variable.add_consumer(self, initialize=initialize)
 
     def stop(self):
         if not self._subscribed:
             return
 
-        self.plc.stop_polling(self.poll_rate, self._poll)
-        handle = self.notification_handle
-        if self.poll_rate is None and handle is not None:
-            self.notification_handle = None
-            self.ads.del_device_notification(*handle)
-
+        self.variable.remove_consumer(self)
         self._subscribed = False
 
 
+def _complete_futures(futures, exception=None):
+    for future in futures:
+        # Skips futures cancelled by their caller, without racing it
+        if not future.set_running_or_notify_cancel():
+            continue
+        if exception is None:
+            future.set_result(None)
+        else:
+            future.set_exception(exception)
+
+
+class _PollGroup:
+    'Variables and calls polled together at a single rate'
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.variables = []
+        self.calls = []
+        self.overruns = 0
+        self.last_duration = 0.0
+        self.last_overrun_warning = -math.inf
+        # Calls whose last invocation failed
+        self.failing = []
+
+    @property
+    def is_empty(self):
+        return not (self.variables or self.calls)
+
+
+class _DeferredCall:
+    'A call run once by the poll scheduler; see `Plc.call_later`'
+
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
+
+    def run(self):
+        try:
+            self.func(*self.args)
+        except Exception:
+            logger.exception('Deferred call %s(*%r) failed',
+                             self.func.__name__, self.args)
+
+
+class NotificationBudget:
+    '''
+    Assigns the limited ADS notifications of a Plc to its variables
+
+    Variables of Symbols with a poll_rate of None want a notification.  They
+    get one while fewer than `limit` are in use, and are otherwise polled at
+    `poll_rate` along with other polled variables.  Every
+    `rebalance_period`, notifications are reassigned from the observed
+    change rates: latency-sensitive variables first, then those changing
+    least often.  Variables changing faster than `fast_change_rate` are
+    polled even with notifications to spare, unless latency-sensitive.
+
+    Runs on the PLC thread.
+
+    Parameters
+    ----------
+    plc : Plc
+    limit : int or None, optional
+        Maximum number of notifications, or None for no limit
+    poll_rate : float, optional
+        Poll period [sec] of variables without a notification
+    fast_change_rate : float or None, optional
+        Change rate [Hz] beyond which variables are polled, or None to
+        notify regardless
+    rebalance_period : float, optional
+        Period [sec] at which notifications are reassigned
+    '''
+
+    def __init__(self, plc, *, limit=MAX_NOTIFICATIONS,
+                 poll_rate=BUDGET_POLL_RATE,
+                 fast_change_rate=BUDGET_FAST_CHANGE_RATE,
+                 rebalance_period=BUDGET_REBALANCE_PERIOD):
+        self.plc = plc
+        self.limit = limit
+        self.poll_rate = poll_rate
+        self.fast_change_rate = fast_change_rate
+        self.rebalance_period = rebalance_period
+        #: Variables wanting a notification, by whether they have one
+        self.notified = set()
+        self.polled = set()
+        #: Change rates [Hz] observed over the last rebalance period
+        self.change_rates = {}
+        self._last_rebalance = time.monotonic()
+
+    def __repr__(self):
+        return (f'<{self.__class__.__name__} notified={len(self.notified)} '
+                f'polled={len(self.polled)} limit={self.limit}>')
+
+    def _has_room(self):
+        return self.limit is None or len(self.notified) < self.limit
+
+    def request(self, variable):
+        'Whether `variable`, which wants a notification, may have one'
+        if variable in self.notified:
+            return True
+        sensitive = variable._latency_sensitive()
+        if variable in self.polled and not sensitive:
+            # Until promoted by `release` or `rebalance`
+            return False
+        if self._has_room() or (sensitive and self._evict()):
+            self.polled.discard(variable)
+            self.notified.add(variable)
+            return True
+        self.polled.add(variable)
+        return False
+
+    def release(self, variable):
+        'Forget `variable`, which no longer wants a notification'
+        self.polled.discard(variable)
+        self.change_rates.pop(variable, None)
+        if variable not in self.notified:
+            return
+        self.notified.remove(variable)
+        candidates = [candidate for candidate in self.polled
+                      if not self._is_fast(candidate)]
+        if candidates:
+            self._move([], [min(candidates, key=self._rate)])
+
+    def _rate(self, variable):
+        return self.change_rates.get(variable, 0.0)
+
+    def _is_fast(self, variable):
+        return (self.fast_change_rate is not None and
+                self._rate(variable) > self.fast_change_rate)
+
+    def _evict(self):
+        'Poll the notified variable changing most often to make room'
+        candidates = [variable for variable in self.notified
+                      if not variable._latency_sensitive()]
+        if not candidates:
+            return False
+        self._move([max(candidates, key=self._rate)], [])
+        return True
+
+    def _move(self, demote, promote):
+        'Switch variables between notification and polling'
+        for variable in demote:
+            self.notified.discard(variable)
+            self.polled.add(variable)
+        for variable in promote:
+            self.polled.discard(variable)
+            self.notified.add(variable)
+        for variable in demote + promote:
+            # After the current subscription change
+            self.plc.add_to_queue(variable._update_subscription)
+
+    def rebalance_due(self):
+        return time.monotonic() - self._last_rebalance >= \
+            self.rebalance_period
+
+    def rebalance(self):
+        'Reassign notifications by the change rates since the last call'
+        now = time.monotonic()
+        elapsed = now - self._last_rebalance
+        if elapsed < self.rebalance_period / 2:
+            # Queued more than once
+            return
+        self._last_rebalance = now
+
+        rates = {}
+        for variable in self.notified | self.polled:
+            rate = variable._changes / elapsed
+            if (variable in self.polled and variable._polls and
+                    variable._changes >= _POLL_SATURATION * variable._polls):
+                # Changed on nearly every poll; it may change faster
+                rate = math.inf
+            rates[variable] = rate
+            variable._changes = variable._polls = 0
+        self.change_rates = rates
+
+        sensitive = {variable for variable in self.notified
+                     if variable._latency_sensitive()}
+        demote = [variable for variable in self.notified
+                  if variable not in sensitive and self._is_fast(variable)]
+        kept = len(self.notified) - len(demote)
+        # Latency-sensitive variables first, e.g., when all notifications
+        # were taken by others that are latency-sensitive
+        candidates = sorted(
+            (variable for variable in self.polled
+             if variable._latency_sensitive() or not self._is_fast(variable)),
+            key=lambda variable: (not variable._latency_sensitive(),
+                                  rates[variable]))
+        free = (len(candidates) if self.limit is None
+                else max(self.limit - kept, 0))
+        promote, candidates = candidates[:free], candidates[free:]
+
+        # Swap notified variables for polled ones changing less often
+        worst = sorted((variable for variable in self.notified
+                        if variable not in sensitive and
+                        variable not in demote), key=rates.get, reverse=True)
+        for notified, candidate in zip(worst, candidates):
+            if (not candidate._latency_sensitive() and
+                    rates[candidate] * BUDGET_HYSTERESIS >= rates[notified]):
+                break
+            demote.append(notified)
+            promote.append(candidate)
+
+        if demote or promote:
+            logger.debug('Rebalanced notifications of %s: %d to polling, '
+                         '%d to notification', self.plc, len(demote),
+                         len(promote))
+            self._move(demote, promote)
+
+
 class Plc:
-    def __init__(self, ip_address, ams_id, port):
+    '''
+    A PLC connection, with a thread servicing its requests
+
+    Parameters
+    ----------
+    ip_address : str
+    ams_id : str
+    port : int
+    connection : pyads.Connection, optional
+        Use this connection (e.g., a `fake.FakeConnection`) instead of
+        creating one
+    '''
+
+    def __init__(self, ip_address, ams_id, port, *, connection=None):
         self.running = True
         self.ip_address = ip_address
         self.ams_id = ams_id
         self.port = port
         self.symbols = {}
-        self.ads = pyads.Connection(ams_id, port, ip_address=ip_address)
+        # Writes not yet sent: {variable: (value, futures, queued_at)}
+        self._pending_writes = {}
+        self._write_lock = threading.Lock()
+        # Shared variables by lower-case name (TwinCAT is case-insensitive)
+        self.variables = {}
+        # Variables sharing the subscription of their parent, by lower-case
+        # parent name
+        self._shared_members = {}
+        # Symbol information by lower-case name
+        self.symbol_info = {}
+        self._unresolved = set()
+        self._symbol_info_lock = threading.Lock()
+        #: Structures of the PLC, from its data type table
+        self.data_types = self._new_data_types()
+        #: Performance metrics, if enabled; see `ads_pcds.metrics`
+        self.metrics = _metrics.new_plc_metrics()
+        #: Assignment of ADS notifications to variables
+        self.budget = NotificationBudget(self)
+        if connection is None:
+            connection = pyads.Connection(ams_id, port, ip_address=ip_address)
+        self.ads = connection
         self.queue = queue.Queue()
         self.thread = threading.Thread(target=self._thread, daemon=True)
         self.thread.start()
-        self.poll_threads = {}
+        self.poll_groups = {}
+        self._poll_lock = threading.Condition()
+        self._poll_schedule = []
+        self._poll_sequence = itertools.count()
+        self.poll_thread = threading.Thread(target=self._poll_scheduler,
+                                            daemon=True)
+        self.poll_thread.start()
+        #: False while the connection to the PLC is lost
+        self.connected = True
+        self._wake_supervisor = threading.Event()
+        self.supervisor_thread = threading.Thread(target=self._supervisor,
+                                                  daemon=True)
+        self.supervisor_thread.start()
+
+    def _get_poll_group(self, rate):
+        'Get or create the poll group for `rate`; call with _poll_lock held'
+        group = self.poll_groups.get(rate)
+        if group is None:
+            group = _PollGroup(rate)
+            self.poll_groups[rate] = group
+            self._schedule(group, time.monotonic())
+        return group
+
+    def _remove_if_empty(self, group):
+        'Remove an empty poll group; call with _poll_lock held'
+        if group.is_empty and self.poll_groups.get(group.rate) is group:
+            # Its scheduled deadline is discarded when it comes due
+            del self.poll_groups[group.rate]
+
+    def _schedule(self, group, deadline):
+        heapq.heappush(self._poll_schedule,
+                       (deadline, next(self._poll_sequence), group))
+        self._poll_lock.notify()
+
+    def call_later(self, delay, func, *args):
+        'Call func(*args) once, after `delay` seconds, on the poll thread'
+        with self._poll_lock:
+            self._schedule(_DeferredCall(func, args),
+                           time.monotonic() + max(delay, 0))
 
     def stop_polling(self, rate, func, *args, **kwargs):
-        if rate not in self.poll_threads:
-            return
+        with self._poll_lock:
+            group = self.poll_groups.get(rate)
+            if group is None:
+                return
 
-        # TODO cid
-        self.poll_threads[rate]['calls'].remove((func, args, kwargs))
+            # TODO cid
+            group.calls.remove((func, args, kwargs))
+            self._remove_if_empty(group)
 
     def add_to_poll_thread(self, rate, func, *args, **kwargs):
-        if rate not in self.poll_threads:
-            thread = threading.Thread(target=self._poll_thread, args=(rate, ),
-                                      daemon=True)
-            self.poll_threads[rate] = dict(thread=thread, calls=[])
-            thread.start()
+        with self._poll_lock:
+            self._get_poll_group(rate).calls.append((func, args, kwargs))
 
-        self.poll_threads[rate]['calls'].append((func, args, kwargs))
+    def add_poll_variable(self, rate, variable):
+        'Add a variable to the sum-read poll group at `rate`'
+        with self._poll_lock:
+            variables = self._get_poll_group(rate).variables
+            if variable not in variables:
+                variables.append(variable)
+
+    def remove_poll_variable(self, rate, variable):
+        'Remove a variable from the sum-read poll group at `rate`'
+        with self._poll_lock:
+            group = self.poll_groups.get(rate)
+            if group is None:
+                return
+
+            try:
+                group.variables.remove(variable)
+            except ValueError:
+                ...
+            self._remove_if_empty(group)
 
     def stop(self):
         self.running = False
         self.add_to_queue(lambda: None)
+        self._wake_supervisor.set()
+        with self._poll_lock:
+            self._poll_lock.notify()
+
+    def _supervisor(self):
+        'Check the connection periodically, and re-establish it once lost'
+        delay = RECONNECT_DELAY
+        while self.running:
+            self._wake_supervisor.wait(
+                HEARTBEAT_PERIOD if self.connected else delay)
+            self._wake_supervisor.clear()
+            if not self.running:
+                break
+
+            if self.budget.rebalance_due():
+                self.add_to_queue(self.budget.rebalance)
+
+            if self.connected:
+                if not self.ads.is_open:
+                    # Not opened yet, or closed as unused
+                    continue
+                try:
+                    self._timed('read_state', self.ads.read_state)
+                except pyads.ADSError as ex:
+                    self._connection_lost(ex)
+                    delay = RECONNECT_DELAY
+            elif self._reconnect():
+                delay = RECONNECT_DELAY
+            else:
+                delay = min(2 * delay, MAX_RECONNECT_DELAY)
+
+    def _connection_lost(self, ex):
+        logger.error('Lost connection to %s:%s:%d: %s', self.ip_address,
+                     self.ams_id, self.port, ex)
+        self._set_connected(False)
+
+    def _reconnect(self):
+        try:
+            self.ads.close()
+            self.ads.open()
+            self.ads.read_state()
+        except pyads.ADSError as ex:
+            logger.debug('Reconnection to %s:%s:%d failed: %s',
+                         self.ip_address, self.ams_id, self.port, ex)
+            return False
+
+        try:
+            self.submit(self._restore).result()
+        except Exception:
+            logger.exception('Failed to restore subscriptions of %s:%s:%d',
+                             self.ip_address, self.ams_id, self.port)
+            return False
+
+        logger.info('Reconnected to %s:%s:%d', self.ip_address, self.ams_id,
+                    self.port)
+        return True
+
+    def _restore(self):
+        '''
+        Restore all subscriptions after reconnecting; run on the PLC thread
+
+        Symbol information and handles are requested with ADS sum commands
+        for all subscribed variables at once.  Polled variables remain in
+        their poll groups throughout.
+        '''
+        self.invalidate_handles()
+        variables = [variable for variable in list(self.variables.values())
+                     if variable.consumers or variable.members]
+        for variable in variables:
+            # Notifications did not survive the connection
+            variable.notification_handle = None
+
+        errors = self.resolve_variables(variables)
+        for variable, ex in errors.items():
+            logger.error('Failed to restore %s: %s', variable.name, ex)
+
+        self._set_connected(True)
+        for variable in variables:
+            if variable not in errors:
+                try:
+                    variable._update_subscription()
+                except Exception:
+                    logger.exception('Failed to restore subscription of %s',
+                                     variable.name)
+
+    def _set_connected(self, connected):
+        'Update the connection state of all subscribed Symbols in one pass'
+        self.connected = connected
+        for variable in list(self.variables.values()):
+            for consumer in list(variable.consumers):
+                try:
+                    consumer._connection_changed(connected)
+                except Exception:
+                    logger.exception('Connection update of %s failed',
+                                     consumer)
 
     def add_to_queue(self, func, *args, **kwargs):
         self.queue.put((func, args, kwargs))
+        if self.metrics is not None:
+            self.metrics.observe_queue_depth(self.queue.qsize())
+
+    def _timed(self, kind, func, *args, **kwargs):
+        'Call `func`, recording its duration as an ADS request of `kind`'
+        metrics = self.metrics
+        if metrics is None:
+            return func(*args, **kwargs)
+
+        t0 = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            metrics.observe_request(kind, time.perf_counter() - t0)
+
+    def stats(self):
+        '''
+        Snapshot of the connection state and performance metrics
+
+        Metrics are only included if enabled; see `ads_pcds.metrics`.
+        '''
+        with self._poll_lock:
+            poll_groups = {
+                rate: {
+                    'variables': len(group.variables),
+                    'calls': len(group.calls),
+                    'overruns': group.overruns,
+                    'last_duration': group.last_duration,
+                }
+                for rate, group in self.poll_groups.items()
+            }
+
+        variables = list(self.variables.values())
+        stats = {
+            'connected': self.connected,
+            'queue_depth': self.queue.qsize(),
+            'symbols': len(self.symbols),
+            'variables': len(variables),
+            'notifications': sum(variable.notification_handle is not None
+                                 for variable in variables),
+            'notification_budget': {
+                'limit': self.budget.limit,
+                'notified': len(self.budget.notified),
+                'polled': len(self.budget.polled),
+            },
+            'poll_groups': poll_groups,
+        }
+        if self.metrics is not None:
+            stats['metrics'] = self.metrics.snapshot()
+        return stats
+
+    def submit(self, func, *args, **kwargs):
+        '''
+        Run `func(*args, **kwargs)` on the PLC thread
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+            Completed with the result or exception of the call
+        '''
+        future = concurrent.futures.Future()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as ex:
+                future.set_exception(ex)
+            else:
+                future.set_result(result)
+
+        run.__name__ = getattr(func, '__name__', repr(func))
+        self.add_to_queue(run)
+        return future
+
+    def queue_write(self, variable, value):
+        '''
+        Queue a write of `value` to `variable` on the PLC thread
+
+        Writes are coalesced per variable: if a write is still pending, its
+        value is replaced by `value`.  All pending writes are sent in a
+        single ADS sum command.
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+            Completed with None once the value, or a later one superseding
+            it, was written, or with the exception of a failed write
+        '''
+        future = concurrent.futures.Future()
+        with self._write_lock:
+            flush_queued = bool(self._pending_writes)
+            _, futures, queued_at = self._pending_writes.get(
+                variable, (None, [], time.perf_counter()))
+            futures.append(future)
+            self._pending_writes[variable] = (value, futures, queued_at)
+
+        if not flush_queued:
+            self.add_to_queue(self._flush_writes)
+        return future
+
+    def _flush_writes(self):
+        with self._write_lock:
+            pending, self._pending_writes = self._pending_writes, {}
+
+        try:
+            # Reopened if closed as unused
+            self.open()
+        except Exception as ex:
+            for _, futures, _ in pending.values():
+                _complete_futures(futures, exception=ex)
+            return
+
+        errors = self.resolve_variables(list(pending))
+        ready = []
+        for variable, (value, futures, _) in pending.items():
+            try:
+                if variable in errors:
+                    raise errors[variable]
+                data = variable.get_encoder()(value)
+            except Exception as ex:
+                _complete_futures(futures, exception=ex)
+            else:
+                ready.append((variable, data))
+
+        if not ready:
+            return
+
+        try:
+            results = self._timed(
+                'sum_write', sum_write, self.ads,
+                [(constants.ADSIGRP_SYM_VALBYHND, variable.handle, data)
+                 for variable, data in ready])
+        except Exception as ex:
+            for variable, _ in ready:
+                _complete_futures(pending[variable][1], exception=ex)
+            return
+
+        for (variable, _), error_code in zip(ready, results):
+            value, futures, queued_at = pending[variable]
+            try:
+                if error_code in ONLINE_CHANGE_ERRORS:
+                    # Re-acquires the handle
+                    variable.write(value)
+                elif error_code:
+                    raise pyads.ADSError(error_code)
+            except Exception as ex:
+                _complete_futures(futures, exception=ex)
+            else:
+                _complete_futures(futures)
+                if self.metrics is not None:
+                    self.metrics.write_latency.observe(
+                        time.perf_counter() - queued_at)
+
+    def _next_poll_group(self):
+        '''
+        Wait for the next poll group to come due
+
+        Returns (deadline, group), or (None, None) when stopped.
+        '''
+        with self._poll_lock:
+            while self.running:
+                if not self._poll_schedule:
+                    self._poll_lock.wait()
+                    continue
 
-    def _poll_thread(self, rate):
+                deadline, _, group = self._poll_schedule[0]
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    self._poll_lock.wait(delay)
+                    continue
+
+                heapq.heappop(self._poll_schedule)
+                if (isinstance(group, _DeferredCall) or
+                        self.poll_groups.get(group.rate) is group):
+                    return deadline, group
+
+        return None, None
+
+    def _poll_scheduler(self):
         while self.running:
-            info = self.poll_threads[rate]
-            t0 = time.time()
-            for item in list(info['calls']):
-                func, args, kwargs = item
-                try:
-                    func(*args, **kwargs)
-                except Exception:
+            deadline, group = self._next_poll_group()
+            if group is None:
+                break
+            if isinstance(group, _DeferredCall):
+                group.run()
+                continue
+
+            with self._poll_lock:
+                variables = list(group.variables)
+                calls = list(group.calls)
+
+            t0 = time.monotonic()
+            if self.connected:
+                # Otherwise, wait for the supervisor to reconnect
+                self._poll_variables(variables)
+                self._poll_calls(group, calls)
+            now = time.monotonic()
+            group.last_duration = now - t0
+
+            # Deadlines advance by whole periods from the previous deadline,
+            # so slow cycles do not accumulate drift
+            next_deadline = deadline + group.rate
+            overrun = next_deadline <= now
+            if self.metrics is not None:
+                self.metrics.observe_poll_cycle(group.rate,
+                                                group.last_duration, overrun)
+            if overrun:
+                missed = int((now - deadline) // group.rate)
+                next_deadline = deadline + (missed + 1) * group.rate
+                group.overruns += 1
+                if now - group.last_overrun_warning > 60.0:
+                    group.last_overrun_warning = now
+                    logger.warning(
+                        'Poll group %s:%s:%d @ %.3f sec overran: started '
+                        '%.3f sec late, cycle took %.3f sec (%d overruns, '
+                        '%d cycles skipped)',
+                        self.ip_address, self.ams_id, self.port, group.rate,
+                        t0 - deadline, group.last_duration, group.overruns,
+                        missed)
+
+            with self._poll_lock:
+                if self.poll_groups.get(group.rate) is group:
+                    self._schedule(group, next_deadline)
+
+    def _poll_calls(self, group, calls):
+        for item in calls:
+            func, args, kwargs = item
+            try:
+                func(*args, **kwargs)
+            except Exception:
+                # Keep calling it; report only the first of repeated failures
+                if item not in group.failing:
+                    group.failing.append(item)
                     logger.exception(
                         'Poll thread %s:%s:%d @ %.3f sec failure: '
                         '%s(*%r, **%r)',
                         self.ip_address, self.ams_id, self.port,
-                        rate, func.__name__, args, kwargs
+                        group.rate, func.__name__, args, kwargs
                     )
-                    info['calls'].remove(item)
-            elapsed = time.time() - t0
-            time.sleep(max((0, rate - elapsed)))
+            else:
+                if item in group.failing:
+                    group.failing.remove(item)
+
+    def _poll_variables(self, variables):
+        'Read `variables` with ADS sum commands and dispatch their values'
+        errors = self.resolve_variables(variables)
+        for variable, ex in errors.items():
+            error_code = getattr(ex, 'err_code', -1)
+            if error_code != variable._poll_error:
+                logger.error('Failed to resolve %s: %s', variable.name, ex)
+            variable._poll_error = error_code
+
+        ready = [variable for variable in variables if variable not in errors]
+        if not ready:
+            return
+
+        results = self._timed(
+            'sum_read', sum_read, self.ads,
+            [(constants.ADSIGRP_SYM_VALBYHND, variable.handle,
+              variable.data_size) for variable in ready])
+        if all(error_code for error_code, _ in results):
+            # Possibly a lost connection; check it now
+            self._wake_supervisor.set()
+
+        timestamp = time.time()
+        for variable, (error_code, data) in zip(ready, results):
+            try:
+                variable._poll_result(timestamp, error_code, data)
+            except Exception:
+                logger.exception('Poll update of %s failed', variable.name)
 
     def _thread(self):
         while self.running:
             func, args, kwargs = self.queue.get()
+            if self._unresolved:
+                # Batch information requests of newly-added symbols prior
+                # to servicing their queued initialization.  On failure,
+                # each is requested again on its own when used.
+                try:
+                    self.resolve_symbol_info()
+                except Exception as ex:
+                    logger.warning('Failed to request symbol information: '
+                                   '%s', ex)
             try:
                 func(*args, **kwargs)
             except Exception:
@@ -321,29 +2433,383 @@ class Plc:
         self.ads.close()
 
     def clear_symbol(self, symbol):
-        _ = self.symbols.pop(symbol)
+        '''
+        Stop and forget a Symbol
+
+        Parameters
+        ----------
+        symbol : Symbol or str
+            The Symbol instance, or a name to clear all Symbols of that name
+        '''
+        if isinstance(symbol, str):
+            to_clear = [sym for sym in self.symbols.values()
+                        if sym.symbol == symbol]
+        else:
+            to_clear = [symbol]
+
+        for sym in to_clear:
+            sym.stop()
+            for key, value in list(self.symbols.items()):
+                if value is sym:
+                    del self.symbols[key]
+
+            self._remove_if_unused(sym.variable)
+
         if not self.symbols:
-            self.ads.close()
+            # After any queued unsubscriptions
+            self.add_to_queue(self.close_if_unused)
+
+    def _remove_if_unused(self, variable):
+        'Forget `variable` once no consumer, member or Symbol uses it'
+        if variable.consumers or variable.members or any(
+                sym.variable is variable
+                for sym in list(self.symbols.values())):
+            return
+        self._remove_variable(variable)
+
+    def _remove_variable(self, variable):
+        if self.variables.get(variable.name.lower()) is variable:
+            del self.variables[variable.name.lower()]
+        if variable.share_parent:
+            siblings = self._shared_members.get(
+                _parent_name(variable.name).lower(), [])
+            if variable in siblings:
+                siblings.remove(variable)
+            if len(siblings) == 1:
+                self.add_to_queue(siblings[0]._update_subscription)
+            elif not siblings:
+                self._shared_members.pop(
+                    _parent_name(variable.name).lower(), None)
+        self.add_to_queue(variable._release_handle)
+
+    def close_if_unused(self):
+        '''
+        Close the ADS port unless a Symbol or consumer still uses it
+
+        Run on the PLC thread, e.g., with `add_to_queue`.  The port is
+        reopened by the next request.
+        '''
+        # Subscribers need not be Symbols of this Plc, e.g., those of aio
+        if self.symbols or any(
+                variable.consumers or variable.members
+                for variable in list(self.variables.values())):
+            return
+        self.ads.close()
 
-    def get_symbol(self, symbol_name, poll_rate, *, cls=Symbol):
-        key = (symbol_name, poll_rate, cls)
+    def get_variable(self, symbol_name, *, share_parent=False):
+        '''
+        Get the shared PlcVariable for `symbol_name`
+
+        With `share_parent`, a struct member is served by the subscription
+        of its parent struct once two or more of its members are.
+        '''
+        key = symbol_name.lower()
+        try:
+            variable = self.variables[key]
+        except KeyError:
+            variable = PlcVariable(self, symbol_name)
+            self.variables[key] = variable
+            with self._symbol_info_lock:
+                if key not in self.symbol_info:
+                    self._unresolved.add(symbol_name)
+
+        parent_name = _parent_name(symbol_name)
+        if share_parent and not variable.share_parent and parent_name:
+            variable.share_parent = True
+            siblings = self._shared_members.setdefault(parent_name.lower(),
+                                                       [])
+            siblings.append(variable)
+        return variable
+
+    def load_symbol_table(self, *, use_cache=True):
+        'Fill the symbol information index from the symbol table upload'
+        entries = upload_symbol_table(self.ads, use_cache=use_cache)
+        with self._symbol_info_lock:
+            self.symbol_info.update(
+                (entry.name.lower(), entry) for entry in entries)
+        return entries
+
+    def resolve_symbol_info(self, symbol_names=()):
+        '''
+        Request information of `symbol_names` and any pending symbols
+
+        Information is requested in ADS sum commands for all symbols not yet
+        in the index.
+
+        Returns
+        -------
+        errors : dict
+            ADS error codes by symbol name, for failed requests
+        '''
+        with self._symbol_info_lock:
+            names = sorted(
+                name for name in self._unresolved.union(symbol_names)
+                if name.lower() not in self.symbol_info)
+            self._unresolved.clear()
+
+        if not names:
+            return {}
+
+        results = self._timed('symbol_info', get_symbol_information_many,
+                              self.ads, names)
+        errors = {}
+        with self._symbol_info_lock:
+            for name, (error_code, info) in zip(names, results):
+                if error_code:
+                    errors[name] = error_code
+                else:
+                    self.symbol_info[name.lower()] = info
+        return errors
+
+    def resolve_variables(self, variables):
+        '''
+        Resolve data types and handles of `variables` with ADS sum commands
+
+        Returns
+        -------
+        errors : dict
+            Exceptions by variable, for those that failed to resolve
+        '''
+        errors = {}
+        untyped = [variable for variable in variables
+                   if variable.data_type is None]
+        if untyped:
+            info_errors = self.resolve_symbol_info(
+                [variable.name for variable in untyped])
+            for variable in untyped:
+                if variable.name in info_errors:
+                    errors[variable] = pyads.ADSError(
+                        info_errors[variable.name])
+                    continue
+                try:
+                    variable._update_data_type()
+                except Exception as ex:
+                    errors[variable] = ex
+
+        no_handle = [variable for variable in variables
+                     if variable.handle is None and variable not in errors]
+        if not no_handle:
+            return errors
+
+        results = self._timed(
+            'handles', get_symbol_handle_many, self.ads,
+            [variable.name for variable in no_handle])
+        for variable, (error_code, handle) in zip(no_handle, results):
+            if error_code:
+                errors[variable] = pyads.ADSError(error_code)
+            else:
+                variable.handle = handle
+        return errors
+
+    def read_many(self, symbol_names, *, use_numpy=False):
+        '''
+        Read many symbols with ADS sum commands
+
+        Returns
+        -------
+        values : list
+            In the same order as `symbol_names`
+
+        Raises
+        ------
+        pyads.ADSError
+            If any of the symbols could not be read
+        '''
+        variables = [self.get_variable(name) for name in symbol_names]
+        return self.read_variables(variables, use_numpy=use_numpy)
+
+    def read_variables(self, variables, *, use_numpy=False):
+        '''
+        Read many PlcVariables with ADS sum commands
+
+        Parameters
+        ----------
+        variables : list of PlcVariable
+        use_numpy : bool or list of bool, optional
+            Decode numeric arrays to numpy arrays, for all variables or for
+            each of them
+
+        Returns
+        -------
+        values : list
+            In the same order as `variables`
+
+        Raises
+        ------
+        pyads.ADSError
+            If any of the variables could not be read
+        '''
+        if isinstance(use_numpy, bool):
+            use_numpy = [use_numpy] * len(variables)
+
+        # Reopened if closed as unused
+        self.open()
+        errors = self.resolve_variables(variables)
+        if errors:
+            raise next(iter(errors.values()))
+
+        results = self._timed(
+            'sum_read', sum_read, self.ads,
+            [(constants.ADSIGRP_SYM_VALBYHND, variable.handle,
+              variable.data_size) for variable in variables])
+        values = []
+        for variable, numpy_, (error_code, data) in zip(variables, use_numpy,
+                                                        results):
+            if error_code in ONLINE_CHANGE_ERRORS:
+                # Re-acquires the handle
+                values.append(variable.read(use_numpy=numpy_))
+            elif error_code:
+                raise pyads.ADSError(error_code)
+            else:
+                values.append(variable.get_decoder(numpy_)(data))
+        return values
+
+    def get_symbol_info(self, symbol_name):
+        'Get symbol information from the index, requesting it if necessary'
+        try:
+            return self.symbol_info[symbol_name.lower()]
+        except KeyError:
+            ...
+
+        errors = self.resolve_symbol_info([symbol_name])
+        if symbol_name in errors:
+            raise pyads.ADSError(errors[symbol_name])
+        return self.symbol_info[symbol_name.lower()]
+
+    def forget_symbol_info(self, symbol_name):
+        'Remove a symbol from the information index'
+        with self._symbol_info_lock:
+            self.symbol_info.pop(symbol_name.lower(), None)
+
+    def _new_data_types(self):
+        return DataTypes(loader=lambda: upload_data_type_table(self.ads))
+
+    def invalidate_handles(self):
+        'Drop all symbol handles, to be re-acquired on next use'
+        with self._symbol_info_lock:
+            self.symbol_info.clear()
+        # Data types may have changed as well
+        self.data_types = self._new_data_types()
+        for variable in list(self.variables.values()):
+            variable.handle = None
+            variable.data_type = None
+            variable._parent_checked = False
+            variable._last_raw = None
+
+    def open(self):
+        'Open the ADS connection, if not already open'
+        if not self.ads.is_open:
+            self.ads.open()
+            # Handles from any prior connection are no longer valid
+            self.invalidate_handles()
+
+    def start_symbols(self, symbols):
+        '''
+        Start many Symbols at once, e.g., those of a display being opened
+
+        Information and handles of their variables are requested with ADS
+        sum commands, and their first values are read with a single one
+        before the variables are subscribed.
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+            Completed once started, with the exceptions of the Symbols that
+            could not be subscribed: {symbol: exception}
+        '''
+        started = [symbol for symbol in symbols if not symbol._subscribed]
+        for symbol in started:
+            symbol.start(initialize=False)
+        return self.submit(self._start_consumers, started)
+
+    def _start_consumers(self, consumers):
+        consumers = [consumer for consumer in consumers
+                     if consumer in consumer.variable.consumers]
+        variables = list(dict.fromkeys(
+            consumer.variable for consumer in consumers))
+        try:
+            self._read_first_values(consumers, variables)
+        except Exception as ex:
+            # Left to the subscriptions
+            logger.error('Failed to read first values of %d symbols: %s',
+                         len(consumers), ex)
+        finally:
+            # Values delivered by new notifications are the same, unless
+            # changed since
+            errors = {}
+            for variable in variables:
+                try:
+                    variable._update_subscription()
+                except Exception as ex:
+                    logger.error('Failed to subscribe %s: %s', variable.name,
+                                 ex)
+                    errors[variable] = ex
+        return {consumer: errors[consumer.variable]
+                for consumer in consumers if consumer.variable in errors}
+
+    def _read_first_values(self, consumers, variables):
+        'Read the values of `variables` with a sum-read, for `consumers`'
+        errors = self.resolve_variables(variables)
+        ready = [variable for variable in variables if variable not in errors]
+        if not ready:
+            return
+
+        results = self._timed(
+            'sum_read', sum_read, self.ads,
+            [(constants.ADSIGRP_SYM_VALBYHND, variable.handle,
+              variable.data_size) for variable in ready])
+        timestamp = time.time()
+        first_data = {variable: data
+                      for variable, (error_code, data) in zip(ready, results)
+                      if not error_code}
+        for consumer in consumers:
+            variable = consumer.variable
+            if variable not in first_data:
+                continue
+            try:
+                value = variable.get_decoder(consumer.use_numpy)(
+                    first_data[variable])
+                consumer._update(timestamp, value)
+            except Exception:
+                logger.exception('Update of %s failed', consumer)
+
+    def get_symbol(self, symbol_name, poll_rate, *, cls=Symbol, **kwargs):
+        key = (symbol_name, poll_rate, cls) + tuple(sorted(kwargs.items()))
         try:
             return self.symbols[key]
         except KeyError:
-            if not self.ads.is_open:
-                self.ads.open()
-            self.symbols[key] = cls(self, symbol_name, poll_rate)
+            self.open()
+            self.symbols[key] = cls(self, symbol_name, poll_rate, **kwargs)
             return self.symbols[key]
 
 
 _PLCS = {}
 
 
-def get_connection(ip_address, ams_id, port):
+def get_connection(ip_address, ams_id, port, *, connection=None,
+                   proxy=None):
+    '''
+    Get the shared Plc for (ip_address, ams_id, port), creating it if needed
+
+    `connection` is only used if the Plc does not yet exist; see `Plc`.
+
+    With `proxy`, a socket path or True for the default one, the PLC is
+    accessed through a `ads_pcds.proxy.ProxyServer` shared with other
+    processes.  It defaults to $ADS_PCDS_PROXY, unless a `connection` is
+    given; pass False to always connect directly.
+    '''
+    if proxy is None and connection is None:
+        proxy = os.environ.get('ADS_PCDS_PROXY') or None
+    if proxy:
+        from .proxy import get_proxy_connection
+        return get_proxy_connection(
+            ip_address, ams_id, port,
+            path=None if proxy is True else proxy)
+
     key = (ip_address, ams_id, port)
     try:
         return _PLCS[key]
     except KeyError:
-        plc = Plc(ip_address, ams_id, port)
+        plc = Plc(ip_address, ams_id, port, connection=connection)
         _PLCS[key] = plc
         return plc
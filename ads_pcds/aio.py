@@ -0,0 +1,166 @@
+import asyncio
+import logging
+
+from .ads import get_connection, Symbol
+
+
+logger = logging.getLogger(__name__)
+
+#: Default number of values buffered per subscription before the oldest
+#: are dropped
+SUBSCRIPTION_QUEUE_SIZE = 100
+
+
+class _QueueSymbol(Symbol):
+    'A Symbol which forwards its updates to an asyncio queue'
+
+    def __init__(self, plc, symbol, poll_rate, *, loop, maxsize, **kwargs):
+        super().__init__(plc, symbol, poll_rate, **kwargs)
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        #: Values dropped because the consumer fell behind
+        self.dropped = 0
+
+    def value_updated(self, timestamp, value):
+        # Called from ADS threads
+        try:
+            self.loop.call_soon_threadsafe(self._put, value)
+        except RuntimeError:
+            # The loop was closed while still subscribed
+            ...
+
+    def _put(self, value):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(value)
+
+
+class AsyncSymbol:
+    '''
+    asyncio interface to a PLC symbol
+
+    Parameters
+    ----------
+    plc : AsyncPlc
+    symbol : str
+        The symbol name
+    poll_rate : float or None, optional
+        Poll period in seconds for subscriptions, or None to use a device
+        notification
+    use_numpy : bool, optional
+        Decode numeric arrays to numpy arrays
+    deadband : float, optional
+        Absolute deadband for subscription updates
+    rel_deadband : float, optional
+        Deadband for subscription updates, relative to the last value
+    '''
+
+    def __init__(self, plc, symbol, poll_rate=None, *, use_numpy=False,
+                 deadband=None, rel_deadband=None):
+        self.plc = plc
+        self.symbol = symbol
+        self.poll_rate = poll_rate
+        self.use_numpy = use_numpy
+        self.deadband = deadband
+        self.rel_deadband = rel_deadband
+        self.variable = plc.plc.get_variable(symbol)
+
+    def __repr__(self):
+        return (f'<{self.__class__.__name__} {self.symbol!r} '
+                f'poll_rate={self.poll_rate}>')
+
+    async def read(self):
+        'Read the value of the symbol'
+        return await self.plc.run(self.variable.read,
+                                  use_numpy=self.use_numpy)
+
+    async def write(self, value):
+        'Write `value` to the symbol, coalescing with other pending writes'
+        await asyncio.wrap_future(self.variable.write_async(value))
+
+    async def subscribe(self, *, maxsize=SUBSCRIPTION_QUEUE_SIZE):
+        '''
+        Iterate over value updates of the symbol
+
+        The first value is the current one.  At most `maxsize` updates are
+        buffered; if the consumer falls behind, the oldest are dropped.
+
+        Example::
+
+            async for value in symbol.subscribe():
+                print(value)
+        '''
+        consumer = _QueueSymbol(
+            self.plc.plc, self.symbol, self.poll_rate,
+            loop=asyncio.get_running_loop(), maxsize=maxsize,
+            use_numpy=self.use_numpy, deadband=self.deadband,
+            rel_deadband=self.rel_deadband)
+        consumer.start()
+        try:
+            while True:
+                yield await consumer.queue.get()
+        finally:
+            consumer.stop()
+            if consumer.dropped:
+                logger.debug('%s subscription dropped %d values',
+                             self.symbol, consumer.dropped)
+
+
+class AsyncPlc:
+    '''
+    asyncio interface to a PLC
+
+    All ADS requests are serviced by the thread of the underlying `Plc`, so
+    any number of symbols may be used from a single event loop.
+
+    Parameters
+    ----------
+    ip_address : str
+    ams_id : str
+    port : int
+    '''
+
+    def __init__(self, ip_address, ams_id, port):
+        self.plc = get_connection(ip_address, ams_id, port)
+        self.plc.open()
+        self.symbols = {}
+
+    def __repr__(self):
+        return (f'<{self.__class__.__name__} {self.plc.ip_address} '
+                f'{self.plc.ams_id}:{self.plc.port}>')
+
+    async def run(self, func, *args, **kwargs):
+        'Run `func(*args, **kwargs)` on the PLC thread and await its result'
+        return await asyncio.wrap_future(
+            self.plc.submit(func, *args, **kwargs))
+
+    def get_symbol(self, symbol_name, poll_rate=None, **kwargs):
+        'Get an `AsyncSymbol`, creating it if necessary'
+        key = (symbol_name, poll_rate) + tuple(sorted(kwargs.items()))
+        try:
+            return self.symbols[key]
+        except KeyError:
+            symbol = AsyncSymbol(self, symbol_name, poll_rate, **kwargs)
+            self.symbols[key] = symbol
+            return symbol
+
+    async def read(self, symbol_name, *, use_numpy=False):
+        'Read the value of a symbol'
+        return await self.get_symbol(symbol_name, use_numpy=use_numpy).read()
+
+    async def write(self, symbol_name, value):
+        'Write `value` to a symbol'
+        await self.get_symbol(symbol_name).write(value)
+
+    async def read_many(self, symbol_names, *, use_numpy=False):
+        '''
+        Read many symbols with ADS sum commands
+
+        Returns
+        -------
+        values : list
+            In the same order as `symbol_names`
+        '''
+        return await self.run(self.plc.read_many, list(symbol_names),
+                              use_numpy=use_numpy)
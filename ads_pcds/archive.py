@@ -0,0 +1,420 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+from pyads import constants
+
+from .ads import Symbol
+from .capture import _sample_dtype
+
+
+logger = logging.getLogger(__name__)
+
+#: Rows per chunk file, after which a new chunk is started
+ARCHIVE_CHUNK_ROWS = 1000000
+#: Period [sec] at which queued updates are written
+ARCHIVE_FLUSH_PERIOD = 1.0
+#: Time [sec] to wait for the PLC thread to resolve an invalidated data type
+ARCHIVE_RESOLVE_TIMEOUT = 5.0
+
+_TIME_DTYPE = np.dtype('<f8')
+
+
+def _target_directory(path, ams_id, port):
+    return os.path.join(path, f'{ams_id}_{port}')
+
+
+def _symbol_directory(path, ams_id, port, symbol):
+    # TwinCAT symbol names are case-insensitive
+    return os.path.join(_target_directory(path, ams_id, port), symbol.lower())
+
+
+def _value_dtype(variable):
+    'Record dtype for values of a resolved PlcVariable'
+    data_type = variable.data_type
+    if data_type == constants.PLCTYPE_STRING:
+        return np.dtype(f'S{variable.data_size}')
+    try:
+        dtype = _sample_dtype(data_type)
+    except ValueError:
+        # Structures and others are stored as raw bytes
+        return np.dtype((np.void, variable.data_size))
+    count = variable.data_size // dtype.itemsize
+    return dtype if count == 1 else np.dtype((dtype, (count, )))
+
+
+def _resolve_data_type(variable):
+    'Resolve the data type of `variable`; run on the PLC thread'
+    # Reopened if closed as unused
+    variable.plc.open()
+    if variable.data_type is None:
+        variable._update_data_type()
+
+
+def _dtype_to_json(dtype):
+    return {'dtype': dtype.base.str, 'shape': list(dtype.shape)}
+
+
+def _dtype_from_json(meta):
+    dtype = np.dtype(meta['dtype'])
+    if meta['shape']:
+        return np.dtype((dtype, tuple(meta['shape'])))
+    return dtype
+
+
+def _chunk_names(directory):
+    'Chunk file name prefixes in `directory`, in order'
+    return sorted(name[:-len('.time')] for name in os.listdir(directory)
+                  if name.endswith('.time'))
+
+
+def _last_time(directory, chunks):
+    'The last timestamp of the chunks in `directory`, or -inf if none'
+    for chunk in reversed(chunks):
+        filename = os.path.join(directory, chunk + '.time')
+        rows = os.path.getsize(filename) // _TIME_DTYPE.itemsize
+        if rows:
+            return float(np.fromfile(
+                filename, _TIME_DTYPE, count=1,
+                offset=(rows - 1) * _TIME_DTYPE.itemsize)[0])
+    return -np.inf
+
+
+class _ArchiveSymbol(Symbol):
+    use_numpy = True
+
+    def __init__(self, plc, symbol, poll_rate, *, archiver, **kwargs):
+        super().__init__(plc, symbol, poll_rate, **kwargs)
+        self.archiver = archiver
+
+    def value_updated(self, timestamp, value):
+        # ADS callback threads only enqueue.  The receive time is recorded,
+        # as notifications carry PLC time and polls host time, and a
+        # variable may switch between the two.
+        self.archiver.queue.put((self, time.time(), value))
+
+
+class _ColumnWriter:
+    'Appends rows to the chunk files of a single symbol'
+
+    def __init__(self, directory, symbol, dtype, chunk_rows):
+        self.directory = directory
+        self.chunk_rows = chunk_rows
+        os.makedirs(directory, exist_ok=True)
+
+        meta_filename = os.path.join(directory, 'meta.json')
+        if os.path.exists(meta_filename):
+            with open(meta_filename) as f:
+                dtype = _dtype_from_json(json.load(f))
+        else:
+            with open(meta_filename, 'w') as f:
+                json.dump(dict(_dtype_to_json(dtype), symbol=symbol), f)
+        self.dtype = dtype
+
+        chunks = _chunk_names(directory)
+        self.chunk = int(chunks[-1]) if chunks else 0
+        # Timestamps are kept non-decreasing, for searches by time
+        self.last_time = _last_time(directory, chunks)
+        self._open_chunk()
+        if self.rows >= self.chunk_rows:
+            self._next_chunk()
+
+    def _open_chunk(self):
+        prefix = os.path.join(self.directory, f'{self.chunk:06d}')
+        self.time_file = open(prefix + '.time', 'ab')
+        self.value_file = open(prefix + '.values', 'ab')
+        # Drop any partial row, e.g., from an interrupted write
+        self.rows = min(self.time_file.tell() // _TIME_DTYPE.itemsize,
+                        self.value_file.tell() // self.dtype.itemsize)
+        self.time_file.truncate(self.rows * _TIME_DTYPE.itemsize)
+        self.value_file.truncate(self.rows * self.dtype.itemsize)
+
+    def _next_chunk(self):
+        self.close()
+        self.chunk += 1
+        self._open_chunk()
+
+    def _records(self, values):
+        if self.dtype.base.kind == 'V':
+            records = np.frombuffer(
+                b''.join(bytes(value) for value in values), self.dtype.base)
+        elif self.dtype.base.kind == 'S':
+            # Decoded as UTF-8; numpy would only encode ASCII
+            records = np.array(
+                [value.encode('utf-8', errors='replace')
+                 if isinstance(value, str) else value
+                 for value in values],
+                dtype=self.dtype.base)
+        else:
+            records = np.array(values, dtype=self.dtype.base)
+        if records.nbytes != len(values) * self.dtype.itemsize:
+            raise ValueError(f'Values do not match the archived data type '
+                             f'{self.dtype}')
+        return records
+
+    def append(self, timestamps, values):
+        # e.g., after the host clock was set back
+        times = np.maximum.accumulate(
+            np.concatenate(([self.last_time], timestamps)))[1:]
+        times = times.astype(_TIME_DTYPE)
+        records = self._records(values)
+        if len(times):
+            self.last_time = float(times[-1])
+        start = 0
+        while start < len(times):
+            count = min(len(times) - start, self.chunk_rows - self.rows)
+            self.time_file.write(times[start:start + count].tobytes())
+            self.value_file.write(records[start:start + count].tobytes())
+            self.rows += count
+            start += count
+            if self.rows >= self.chunk_rows:
+                self._next_chunk()
+        self.time_file.flush()
+        self.value_file.flush()
+
+    def close(self):
+        self.time_file.close()
+        self.value_file.close()
+
+
+class Archiver:
+    '''
+    Record updates of PLC symbols to append-only columnar files
+
+    Each symbol is stored in its own directory as chunks of two files of
+    fixed-size records: timestamps (little-endian float64) and values.
+    Timestamps are the host times at which updates were received, and never
+    decrease within a symbol.
+    Updates are queued from the ADS threads and written in batches by a
+    background thread.  See `ArchiveReader` for reading.
+
+    Parameters
+    ----------
+    path : str
+        Archive root directory
+    flush_period : float, optional
+        Period [sec] at which queued updates are written
+    chunk_rows : int, optional
+        Rows per chunk file
+    '''
+
+    def __init__(self, path, *, flush_period=ARCHIVE_FLUSH_PERIOD,
+                 chunk_rows=ARCHIVE_CHUNK_ROWS):
+        self.path = path
+        self.flush_period = flush_period
+        self.chunk_rows = chunk_rows
+        self.queue = queue.SimpleQueue()
+        self.symbols = []
+        self._writers = {}
+        self._deferred = {}
+        self._stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._thread, daemon=True)
+        self.thread.start()
+
+    def __repr__(self):
+        return (f'<{self.__class__.__name__} {self.path!r} '
+                f'symbols={len(self.symbols)}>')
+
+    def add(self, plc, symbol_name, poll_rate=None, **kwargs):
+        '''
+        Record updates of a symbol
+
+        Parameters
+        ----------
+        plc : Plc
+        symbol_name : str
+        poll_rate : float or None, optional
+            Poll period in seconds, or None to use a device notification
+        **kwargs
+            Passed to `Symbol`, e.g., deadband
+
+        Returns
+        -------
+        symbol : Symbol
+
+        Raises
+        ------
+        ValueError
+            If the symbol is already archived with other settings
+        '''
+        symbol = plc.get_symbol(symbol_name, poll_rate, cls=_ArchiveSymbol,
+                                archiver=self, **kwargs)
+        directory = self._directory(symbol)
+        for other in self.symbols:
+            if other is not symbol and self._directory(other) == directory:
+                # Both would append to the same files
+                raise ValueError(f'{symbol_name} is already archived as '
+                                 f'{other}')
+        if symbol not in self.symbols:
+            self.symbols.append(symbol)
+            symbol.start()
+        return symbol
+
+    def remove(self, symbol):
+        'Stop recording a symbol returned by `add`'
+        if symbol in self.symbols:
+            self.symbols.remove(symbol)
+            symbol.plc.clear_symbol(symbol)
+
+    def stop(self):
+        'Stop recording, writing all queued updates'
+        for symbol in list(self.symbols):
+            self.remove(symbol)
+        self._stop_event.set()
+        self.thread.join()
+
+    def _directory(self, symbol):
+        plc = symbol.plc
+        return _symbol_directory(self.path, plc.ams_id, plc.port,
+                                 symbol.symbol)
+
+    def _get_writer(self, symbol):
+        directory = self._directory(symbol)
+        try:
+            return self._writers[directory]
+        except KeyError:
+            ...
+
+        variable = symbol.variable
+        if variable.data_type is None:
+            # Invalidated, e.g., by an online change, after the update
+            symbol.plc.submit(_resolve_data_type, variable).result(
+                timeout=ARCHIVE_RESOLVE_TIMEOUT)
+        writer = _ColumnWriter(directory, symbol.symbol,
+                               _value_dtype(variable), self.chunk_rows)
+        self._writers[directory] = writer
+        return writer
+
+    def _write_queued(self):
+        updates, self._deferred = self._deferred, {}
+        while True:
+            try:
+                symbol, timestamp, value = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            timestamps, values = updates.setdefault(symbol, ([], []))
+            timestamps.append(timestamp)
+            values.append(value)
+
+        for symbol, (timestamps, values) in updates.items():
+            try:
+                writer = self._get_writer(symbol)
+            except Exception as ex:
+                # Retried on the next flush, keeping the values in order
+                logger.warning('Deferring %d values of %s: %s',
+                               len(values), symbol.symbol, ex)
+                self._deferred[symbol] = (timestamps, values)
+                continue
+            try:
+                writer.append(timestamps, values)
+            except Exception:
+                logger.exception('Failed to archive %d values of %s',
+                                 len(values), symbol.symbol)
+
+    def _thread(self):
+        while not self._stop_event.wait(self.flush_period):
+            self._write_queued()
+
+        self._write_queued()
+        for symbol, (timestamps, values) in self._deferred.items():
+            logger.error('Dropped %d values of %s with an unresolved type',
+                         len(values), symbol.symbol)
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+
+
+class ArchiveReader:
+    '''
+    Read archives of `Archiver` by time range
+
+    Chunk files are memory-mapped and searched by time, so only the
+    requested rows are read.
+
+    Parameters
+    ----------
+    path : str
+        Archive root directory
+    '''
+
+    def __init__(self, path):
+        self.path = path
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.path!r}>'
+
+    def targets(self):
+        'Archived PLCs, as a list of (ams_id, port)'
+        targets = []
+        for name in sorted(os.listdir(self.path)):
+            ams_id, _, port = name.rpartition('_')
+            if ams_id and port.isdigit():
+                targets.append((ams_id, int(port)))
+        return targets
+
+    def symbols(self, ams_id, port):
+        'Names of the symbols archived for a PLC'
+        directory = _target_directory(self.path, ams_id, port)
+        names = []
+        for name in sorted(os.listdir(directory)):
+            try:
+                with open(os.path.join(directory, name, 'meta.json')) as f:
+                    names.append(json.load(f)['symbol'])
+            except (OSError, ValueError, KeyError):
+                continue
+        return names
+
+    def read(self, ams_id, port, symbol, start=None, stop=None):
+        '''
+        Read the values of a symbol with timestamps in [start, stop)
+
+        Parameters
+        ----------
+        ams_id : str
+        port : int
+        symbol : str
+        start : float, optional
+            UNIX timestamp [sec]; by default, from the first value
+        stop : float, optional
+            UNIX timestamp [sec]; by default, up to the last value
+
+        Returns
+        -------
+        timestamps : numpy.ndarray
+        values : numpy.ndarray
+        '''
+        directory = _symbol_directory(self.path, ams_id, port, symbol)
+        with open(os.path.join(directory, 'meta.json')) as f:
+            dtype = _dtype_from_json(json.load(f))
+
+        start = -np.inf if start is None else start
+        stop = np.inf if stop is None else stop
+        time_parts, value_parts = [], []
+        for chunk in _chunk_names(directory):
+            prefix = os.path.join(directory, chunk)
+            rows = min(
+                os.path.getsize(prefix + '.time') // _TIME_DTYPE.itemsize,
+                os.path.getsize(prefix + '.values') // dtype.itemsize)
+            if not rows:
+                continue
+
+            times = np.memmap(prefix + '.time', _TIME_DTYPE, 'r',
+                              shape=(rows, ))
+            if times[0] >= stop or times[-1] < start:
+                continue
+            first, last = np.searchsorted(times, [start, stop])
+            if first == last:
+                continue
+            values = np.memmap(prefix + '.values', dtype.base, 'r',
+                               shape=(rows, ) + dtype.shape)
+            time_parts.append(np.array(times[first:last]))
+            value_parts.append(np.array(values[first:last]))
+
+        if not time_parts:
+            return (np.empty(0, _TIME_DTYPE),
+                    np.empty((0, ) + dtype.shape, dtype.base))
+        return np.concatenate(time_parts), np.concatenate(value_parts)
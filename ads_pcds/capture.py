@@ -0,0 +1,293 @@
+import ctypes
+import logging
+import threading
+
+import numpy as np
+import pyads
+from pyads import constants
+
+from .ads import (_NOTIFICATION_DATA_OFFSET, _STRUCT_FORMATS,
+                  data_type_from_symbol_info, filetime_to_timestamp,
+                  get_numpy_dtype)
+
+
+logger = logging.getLogger(__name__)
+
+#: Default number of samples held by a capture
+CAPTURE_CAPACITY = 100000
+
+
+class RingBuffer:
+    '''
+    A preallocated ring buffer of timestamped samples
+
+    Samples are copied in as raw little-endian data along with their
+    FILETIME timestamps; both are converted only when read, in bulk.  Once
+    full, the oldest samples are overwritten.
+
+    Parameters
+    ----------
+    capacity : int
+        Number of samples held
+    dtype : numpy.dtype
+        Element type of the samples
+    shape : tuple of int, optional
+        Shape of each sample, for samples that are arrays
+    '''
+
+    def __init__(self, capacity, dtype, shape=()):
+        self.capacity = int(capacity)
+        self.values = np.zeros((self.capacity, ) + tuple(shape), dtype=dtype)
+        self.filetimes = np.zeros(self.capacity, dtype=np.int64)
+        self.sample_size = self.values[0].nbytes
+        #: Total number of samples written
+        self.written = 0
+        #: Samples overwritten before they were drained
+        self.overwritten = 0
+        # Number of the oldest sample not yet drained
+        self._first = 0
+        self._address = self.values.ctypes.data
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return (f'<{self.__class__.__name__} {len(self)}/{self.capacity} '
+                f'dtype={self.values.dtype} written={self.written}>')
+
+    def __len__(self):
+        'Number of samples available, not yet drained'
+        return self.written - self._first
+
+    def write(self, address, count, filetime, period=0):
+        '''
+        Copy `count` consecutive samples from memory at `address`
+
+        Parameters
+        ----------
+        address : int
+            Address of the raw sample data
+        count : int
+            Number of samples
+        filetime : int
+            Timestamp of the last sample, as Windows FILETIME
+        period : int, optional
+            Time between samples, in FILETIME units of 100 ns
+        '''
+        size = self.sample_size
+        if count > self.capacity:
+            # Only the latest fit
+            address += (count - self.capacity) * size
+            count = self.capacity
+
+        with self._lock:
+            idx = self.written % self.capacity
+            first_part = min(count, self.capacity - idx)
+            ctypes.memmove(self._address + idx * size, address,
+                           first_part * size)
+            if count > first_part:
+                ctypes.memmove(self._address, address + first_part * size,
+                               (count - first_part) * size)
+
+            if count == 1:
+                self.filetimes[idx] = filetime
+            else:
+                times = filetime - period * np.arange(count - 1, -1, -1)
+                self.filetimes[idx:idx + first_part] = times[:first_part]
+                self.filetimes[:count - first_part] = times[first_part:]
+
+            self.written += count
+            lost = len(self) - self.capacity
+            if lost > 0:
+                self.overwritten += lost
+                self._first += lost
+
+    def _read(self, count, drain):
+        with self._lock:
+            available = len(self)
+            if count is None or count > available:
+                count = available
+            start = self.written - count
+            indices = np.arange(start, self.written) % self.capacity
+            values = self.values.take(indices, axis=0)
+            filetimes = self.filetimes.take(indices)
+            if drain:
+                self._first = self.written
+        return filetime_to_timestamp(filetimes), values
+
+    def snapshot(self, count=None):
+        '''
+        Copy the latest `count` samples, by default all available
+
+        Returns
+        -------
+        timestamps : numpy.ndarray
+            UNIX timestamps [sec], oldest first
+        values : numpy.ndarray
+        '''
+        return self._read(count, drain=False)
+
+    def drain(self, count=None):
+        '''
+        Copy the latest `count` samples and mark all as drained
+
+        Samples not returned are discarded.  See `snapshot`.
+        '''
+        return self._read(count, drain=True)
+
+    def clear(self):
+        'Discard all samples'
+        with self._lock:
+            self._first = self.written
+
+
+def _sample_dtype(data_type):
+    'Numpy element dtype of a numeric data type or array thereof'
+    if data_type in _STRUCT_FORMATS:
+        return np.dtype(data_type).newbyteorder('<')
+    dtype = get_numpy_dtype(data_type)
+    if dtype is None:
+        raise ValueError(f'Unsupported data type for capture: {data_type}')
+    return dtype
+
+
+class Capture:
+    '''
+    Capture every sample of a numeric PLC variable into a `RingBuffer`
+
+    Samples are sent by the PLC every `cycle_time`, in ADS notifications
+    that it may buffer for up to `max_delay` and send together.  Callbacks
+    only copy raw data; decoding happens in bulk on `snapshot` or `drain`.
+
+    For rates beyond one sample per PLC cycle, have the PLC fill an array
+    of `oversampling` samples per cycle (e.g., from oversampling terminals)
+    and capture that array: each of its elements becomes a sample.
+
+    The notification is not restored after reconnecting; restart the
+    capture instead.
+
+    Parameters
+    ----------
+    plc : Plc
+    symbol : str
+        The symbol name
+    capacity : int, optional
+        Number of samples held
+    cycle_time : float, optional
+        Sampling period [sec]; by default, on every change
+    max_delay : float, optional
+        Time [sec] the PLC may buffer samples before sending them
+    oversampling : int, optional
+        Number of samples in each value of an array variable
+    sample_period : float, optional
+        Time [sec] between oversampled samples; defaults to
+        ``cycle_time / oversampling``
+    '''
+
+    def __init__(self, plc, symbol, *, capacity=CAPTURE_CAPACITY,
+                 cycle_time=None, max_delay=0.0, oversampling=None,
+                 sample_period=None):
+        self.plc = plc
+        self.symbol = symbol
+        self.capacity = capacity
+        self.cycle_time = cycle_time
+        self.max_delay = max_delay
+        self.oversampling = oversampling
+        if sample_period is None and oversampling and cycle_time:
+            sample_period = cycle_time / oversampling
+        self.sample_period = sample_period
+        self.buffer = None
+        self.notification_handle = None
+        # sample_period in FILETIME units
+        self._period = int(round((sample_period or 0) * 1e7))
+
+    def __repr__(self):
+        return (f'<{self.__class__.__name__} {self.symbol!r} '
+                f'cycle_time={self.cycle_time} buffer={self.buffer}>')
+
+    def _make_buffer(self):
+        info = self.plc.get_symbol_info(self.symbol)
+        data_type, array_size = data_type_from_symbol_info(
+            info, data_types=self.plc.data_types)
+        dtype = _sample_dtype(data_type)
+        elements = info.size // dtype.itemsize
+        if self.oversampling:
+            if elements % self.oversampling:
+                raise ValueError(
+                    f'{self.symbol} has {elements} elements, not a multiple '
+                    f'of oversampling={self.oversampling}')
+            elements //= self.oversampling
+        shape = () if elements == 1 else (elements, )
+        return RingBuffer(self.capacity, dtype, shape)
+
+    def _add_notification(self):
+        if self.notification_handle is not None:
+            return
+        if self.buffer is None:
+            self.buffer = self._make_buffer()
+
+        if self.cycle_time:
+            mode = constants.ADSTRANS_SERVERCYCLE
+        else:
+            mode = constants.ADSTRANS_SERVERONCHA
+        # NotificationAttrib times are in ms
+        attr = pyads.NotificationAttrib(
+            self.plc.get_symbol_info(self.symbol).size, trans_mode=mode,
+            max_delay=self.max_delay * 1e3,
+            cycle_time=(self.cycle_time or 0) * 1e3)
+        self.notification_handle = self.plc._timed(
+            'add_notification', self.plc.ads.add_device_notification,
+            self.symbol, attr, self._notification_update)
+
+    def _del_notification(self):
+        handle, self.notification_handle = self.notification_handle, None
+        if handle is None:
+            return
+        try:
+            self.plc.ads.del_device_notification(*handle)
+        except pyads.ADSError as ex:
+            logger.debug('Failed to delete notification of %s: %s',
+                         self.symbol, ex)
+
+    def _notification_update(self, notification, name):
+        header = notification.contents
+        buffer = self.buffer
+        buffer.write(ctypes.addressof(header) + _NOTIFICATION_DATA_OFFSET,
+                     header.cbSampleSize // buffer.sample_size,
+                     header.nTimeStamp, self._period)
+
+    def start(self):
+        'Start capturing; samples from prior captures are kept'
+        self.plc.open()
+        self.plc.submit(self._add_notification).result()
+
+    def stop(self):
+        'Stop capturing'
+        self.plc.submit(self._del_notification).result()
+
+    def snapshot(self, count=None):
+        'Copy the latest samples; see `RingBuffer.snapshot`'
+        return self.buffer.snapshot(count)
+
+    def drain(self, count=None):
+        'Copy the latest samples, draining the buffer; see `RingBuffer.drain`'
+        return self.buffer.drain(count)
+
+    def collect(self, key=None):
+        '''
+        Drain the buffer as events, as for the `collect` of a flyer
+
+        Parameters
+        ----------
+        key : str, optional
+            Data key of the samples; defaults to the symbol name
+
+        Yields
+        ------
+        event : dict
+            With time, data and timestamps of a single sample
+        '''
+        key = key or self.symbol
+        timestamps, values = self.drain()
+        for timestamp, value in zip(timestamps.tolist(), values.tolist()):
+            yield {'time': timestamp,
+                   'data': {key: value},
+                   'timestamps': {key: timestamp}}
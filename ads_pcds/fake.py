@@ -0,0 +1,437 @@
+import ctypes
+import struct
+import threading
+import time
+
+import pyads
+from pyads import constants, structs
+
+from .ads import (ADSIGRP_SUMUP_READWRITE, ADST_Type, ads_type_to_ctype,
+                  get_encoder)
+from .upload import SYMBOL_ENCODING
+
+
+_EPOCH_AS_FILETIME = 116444736000000000
+_NOTIFICATION_DATA_OFFSET = structs.SAdsNotificationHeader.data.offset
+
+
+class FakeVariable:
+    '''
+    A variable of a `FakeConnection`
+
+    Parameters
+    ----------
+    name : str
+        The symbol name
+    ads_type : ADST_Type
+        The ADS data type of the variable, or of its elements.  For types
+        other than elementary ones (e.g., ADST_Type.BIGTYPE), `size` is
+        required and values are raw bytes.
+    value : any, optional
+        The initial value
+    array_size : int, optional
+        Number of elements, for arrays
+    type_name : str, optional
+        The PLC type name, defaulting to the name of `ads_type`
+    comment : str, optional
+        The symbol comment
+    size : int, optional
+        Size in bytes; defaults to that of the data type
+    '''
+
+    def __init__(self, name, ads_type, value=0, *, array_size=1,
+                 type_name=None, comment='', size=None):
+        self.name = name
+        self.ads_type = ADST_Type(ads_type)
+        data_type = ads_type_to_ctype.get(self.ads_type)
+        if data_type is None:
+            # e.g., structures: values are given as bytes or ctypes
+            data_type = ctypes.c_ubyte * size
+            value = bytes(value or b'')
+        if array_size > 1:
+            data_type = data_type * array_size
+        if size is None:
+            size = ctypes.sizeof(data_type)
+        self.size = size
+        self.array_size = array_size
+        self.type_name = type_name or self.ads_type.name
+        self.comment = comment
+        self.buffer = bytearray(size)
+        self.index_group = 0x4020
+        self.index_offset = 0
+        self.connection = None
+        # The structure this is a member of, and members of this one
+        self.parent = None
+        self.members = []
+        # Notification handles of the variable
+        self.notification_handles = set()
+        self._encode = get_encoder(data_type, size)
+        self.set_raw(self._encode(value), notify=False)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.name!r}>'
+
+    def set_value(self, value):
+        'Set the value, notifying any subscribers'
+        self.set_raw(self._encode(value))
+
+    def set_raw(self, data, *, notify=True):
+        'Set the raw data, notifying any subscribers'
+        data = bytes(data)[:self.size]
+        self.buffer[:len(data)] = data
+        if notify and self.connection is not None:
+            self.connection._notify(self)
+            # Data is shared with the parent structure and members
+            for other in [self.parent] + self.members:
+                if other is not None:
+                    self.connection._notify(other)
+
+    def pack_info(self):
+        'Pack the AdsSymbolEntry of the variable'
+        name = self.name.encode(SYMBOL_ENCODING)
+        type_name = self.type_name.encode(SYMBOL_ENCODING)
+        comment = self.comment.encode(SYMBOL_ENCODING)
+        body = name + b'\0' + type_name + b'\0' + comment + b'\0'
+        length = 30 + len(body)
+        length += -length % 4
+        header = struct.pack('<6I3H', length, self.index_group,
+                             self.index_offset, self.size,
+                             int(self.ads_type), 8, len(name),
+                             len(type_name), len(comment))
+        return (header + body).ljust(length, b'\0')
+
+
+def pack_data_type_entry(name, size, *, type_name='', comment='',
+                         ads_type=ADST_Type.BIGTYPE, offset=0, array_info=(),
+                         sub_items=()):
+    '''
+    Pack an AdsDatatypeEntry, for `FakeConnection.add_data_type`
+
+    Parameters
+    ----------
+    name : str
+        Name of the data type, or of the structure member
+    size : int
+        Size in bytes
+    type_name : str, optional
+        Base type name (aliases, arrays) or type of the structure member
+    comment : str, optional
+    ads_type : ADST_Type, optional
+    offset : int, optional
+        Offset of a structure member
+    array_info : list of (lower_bound, elements), optional
+    sub_items : list of bytes, optional
+        Packed structure member entries
+    '''
+    name = name.encode(SYMBOL_ENCODING)
+    type_name = type_name.encode(SYMBOL_ENCODING)
+    comment = comment.encode(SYMBOL_ENCODING)
+    body = b''.join(
+        [name, b'\0', type_name, b'\0', comment, b'\0'] +
+        [struct.pack('<iI', low, elements) for low, elements in array_info] +
+        list(sub_items)
+    )
+    length = 42 + len(body)
+    length += -length % 4
+    header = struct.pack('<8I5H', length, 1, 0, 0, size, offset,
+                         int(ads_type), 0, len(name), len(type_name),
+                         len(comment), len(array_info), len(sub_items))
+    return (header + body).ljust(length, b'\0')
+
+
+class FakeConnection:
+    '''
+    An in-process stand-in for `pyads.Connection`
+
+    Serves the symbol, handle, sum command and notification requests used
+    by `ads_pcds` from `FakeVariable` instances, without an AMS router.
+    Use it with ``Plc(..., connection=FakeConnection())``.
+
+    Notifications are delivered synchronously from the thread changing the
+    value.
+
+    Parameters
+    ----------
+    ams_id : str, optional
+    port : int, optional
+    ip_address : str, optional
+        Unused
+    latency : float, optional
+        Seconds added to each request, to simulate a network round-trip
+    '''
+
+    def __init__(self, ams_id='127.0.0.1.1.1', port=851, ip_address=None,
+                 *, latency=0.0):
+        self._adr = pyads.AmsAddr(ams_id, port)
+        self.latency = latency
+        self.variables = {}
+        self.data_types = []
+        self.handles = {}
+        self.notifications = {}
+        self.symbol_version = 1
+        self.is_open = False
+        #: Number of requests served
+        self.requests = 0
+        self._next_handle = 1
+        self._next_offset = 0
+        self._lock = threading.RLock()
+
+    def add_variable(self, variable):
+        'Add a `FakeVariable`'
+        variable.index_offset = self._next_offset
+        self._next_offset += variable.size
+        variable.connection = self
+        self.variables[variable.name.lower()] = variable
+        return variable
+
+    def add_member(self, parent, variable, offset):
+        '''
+        Add a `FakeVariable` for a member of the structure `parent`
+
+        The member shares the data of `parent` at `offset`, which replaces
+        its initial value.
+        '''
+        variable.index_group = parent.index_group
+        variable.index_offset = parent.index_offset + offset
+        variable.buffer = memoryview(parent.buffer)[
+            offset:offset + variable.size]
+        variable.parent = parent
+        parent.members.append(variable)
+        variable.connection = self
+        self.variables[variable.name.lower()] = variable
+        return variable
+
+    def add_data_type(self, entry):
+        'Add a packed data type entry; see `pack_data_type_entry`'
+        self.data_types.append(bytes(entry))
+
+    def open(self):
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+
+    def online_change(self):
+        'Invalidate all handles, as an online change would'
+        with self._lock:
+            self.handles.clear()
+            self.symbol_version = (self.symbol_version + 1) % 256
+
+    def _round_trip(self):
+        if not self.is_open:
+            raise pyads.ADSError(1864)  # ADSERR_CLIENT_PORTNOTOPEN
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _variable(self, name):
+        try:
+            return self.variables[name.lower()]
+        except KeyError:
+            raise pyads.ADSError(1808) from None  # symbol not found
+
+    def _by_handle(self, handle):
+        try:
+            return self.handles[handle]
+        except KeyError:
+            raise pyads.ADSError(1809) from None  # symbol version invalid
+
+    def _symbol_table(self):
+        return b''.join(var.pack_info() for var in self.variables.values())
+
+    def read_state(self):
+        self._round_trip()
+        return (constants.ADSSTATE_RUN, 0)
+
+    def _read(self, group, offset, size):
+        if group == constants.ADSIGRP_SYM_VALBYHND:
+            return bytes(self._by_handle(offset).buffer[:size])
+        if group == constants.ADSIGRP_SYM_VERSION:
+            return bytes([self.symbol_version])
+        if group == constants.ADSIGRP_SYM_UPLOADINFO:
+            return struct.pack('<II', len(self.variables),
+                               len(self._symbol_table()))
+        if group == constants.ADSIGRP_SYM_UPLOAD:
+            return self._symbol_table()[:size]
+        if group == constants.ADSIGRP_SYM_UPLOADINFO2:
+            data_types = b''.join(self.data_types)
+            return struct.pack('<6I', len(self.variables),
+                               len(self._symbol_table()),
+                               len(self.data_types), len(data_types), 0, 0)
+        if group == constants.ADSIGRP_SYM_DT_UPLOAD:
+            return b''.join(self.data_types)[:size]
+        raise pyads.ADSError(1794)  # invalid index group
+
+    def read(self, index_group, index_offset, plc_datatype,
+             return_ctypes=False, check_length=True):
+        self._round_trip()
+        size = ctypes.sizeof(plc_datatype)
+        with self._lock:
+            data = self._read(index_group, index_offset, size)
+        value = plc_datatype.from_buffer_copy(data.ljust(size, b'\0'))
+        if return_ctypes:
+            return value
+        return getattr(value, 'value', value)
+
+    def _write(self, group, offset, data):
+        if group == constants.ADSIGRP_SYM_VALBYHND:
+            self._by_handle(offset).set_raw(data)
+        elif group == constants.ADSIGRP_SYM_RELEASEHND:
+            handle, = struct.unpack('<I', data)
+            self.handles.pop(handle, None)
+        else:
+            raise pyads.ADSError(1794)
+
+    def write(self, index_group, index_offset, value, plc_datatype):
+        self._round_trip()
+        if plc_datatype == constants.PLCTYPE_STRING:
+            data = value.encode('utf-8') + b'\0'
+        elif issubclass(plc_datatype, ctypes.Array):
+            data = bytes(plc_datatype(*value))
+        else:
+            data = bytes(plc_datatype(value))
+        with self._lock:
+            self._write(index_group, index_offset, data)
+
+    def _read_write(self, group, offset, read_size, data):
+        if group == constants.ADSIGRP_SYM_HNDBYNAME:
+            var = self._variable(
+                bytes(data).rstrip(b'\0').decode(SYMBOL_ENCODING))
+            handle = self._next_handle
+            self._next_handle += 1
+            self.handles[handle] = var
+            return struct.pack('<I', handle)
+        if group == constants.ADSIGRP_SYM_INFOBYNAMEEX:
+            var = self._variable(
+                bytes(data).rstrip(b'\0').decode(SYMBOL_ENCODING))
+            return var.pack_info()[:read_size]
+        if group == constants.ADSIGRP_SUMUP_READ:
+            return self._sum_read(offset, data)
+        if group == constants.ADSIGRP_SUMUP_WRITE:
+            return self._sum_write(offset, data)
+        if group == ADSIGRP_SUMUP_READWRITE:
+            return self._sum_read_write(offset, data)
+        raise pyads.ADSError(1794)
+
+    def _sum_read(self, count, data):
+        errors, results = [], []
+        for idx in range(count):
+            group, offset, size = struct.unpack_from('<III', data, 12 * idx)
+            try:
+                result = self._read(group, offset, size)
+                errors.append(0)
+            except pyads.ADSError as ex:
+                result = b''
+                errors.append(ex.err_code)
+            results.append(result.ljust(size, b'\0'))
+        return struct.pack(f'<{count}I', *errors) + b''.join(results)
+
+    def _sum_write(self, count, data):
+        errors = []
+        pos = 12 * count
+        for idx in range(count):
+            group, offset, size = struct.unpack_from('<III', data, 12 * idx)
+            try:
+                self._write(group, offset, data[pos:pos + size])
+                errors.append(0)
+            except pyads.ADSError as ex:
+                errors.append(ex.err_code)
+            pos += size
+        return struct.pack(f'<{count}I', *errors)
+
+    def _sum_read_write(self, count, data):
+        headers, results = [], []
+        pos = 16 * count
+        for idx in range(count):
+            group, offset, read_size, write_size = struct.unpack_from(
+                '<IIII', data, 16 * idx)
+            try:
+                result = self._read_write(group, offset, read_size,
+                                          data[pos:pos + write_size])
+                headers.append(struct.pack('<II', 0, len(result)))
+            except pyads.ADSError as ex:
+                result = b''
+                headers.append(struct.pack('<II', ex.err_code, 0))
+            results.append(result)
+            pos += write_size
+        return b''.join(headers) + b''.join(results)
+
+    def read_write_raw(self, index_group, index_offset, read_size, data):
+        'See `ads.read_write_raw`'
+        self._round_trip()
+        with self._lock:
+            return memoryview(self._read_write(index_group, index_offset,
+                                               read_size, bytes(data)))
+
+    def read_write(self, index_group, index_offset, plc_read_datatype, value,
+                   plc_write_datatype, return_ctypes=False,
+                   check_length=True):
+        if plc_write_datatype == constants.PLCTYPE_STRING:
+            data = value.encode('utf-8') + b'\0'
+        else:
+            data = bytes(plc_write_datatype(value))
+        size = ctypes.sizeof(plc_read_datatype)
+        result = bytes(self.read_write_raw(index_group, index_offset, size,
+                                           data))
+        value = plc_read_datatype.from_buffer_copy(result.ljust(size, b'\0'))
+        if return_ctypes:
+            return value
+        return getattr(value, 'value', value)
+
+    def add_device_notification(self, data, attr, callback,
+                                user_handle=None):
+        self._round_trip()
+        with self._lock:
+            if isinstance(data, tuple):
+                # (index_group, index_offset), e.g., of a variable handle
+                group, offset = data
+                if group != constants.ADSIGRP_SYM_VALBYHND:
+                    raise pyads.ADSError(1794)
+                var = self._by_handle(offset)
+                symbol_handle = None
+            else:
+                # pyads acquires a handle, released with the notification
+                var = self._variable(data)
+                symbol_handle = self._next_handle
+                self._next_handle += 1
+                self.handles[symbol_handle] = var
+            handle = self._next_handle
+            self._next_handle += 1
+            self.notifications[handle] = (var, callback, data)
+            var.notification_handles.add(handle)
+        # As with ADS, the current value is sent on registration
+        self._notify(var, handle)
+        return handle, symbol_handle
+
+    def del_device_notification(self, notification_handle, user_handle):
+        self._round_trip()
+        with self._lock:
+            var, _, _ = self.notifications.pop(notification_handle,
+                                               (None, None, None))
+            if var is not None:
+                var.notification_handles.discard(notification_handle)
+            if user_handle is not None:
+                self.handles.pop(user_handle, None)
+
+    def _notify(self, var, only_handle=None):
+        handles = (var.notification_handles if only_handle is None
+                   else [only_handle])
+        for handle in list(handles):
+            try:
+                _, callback, name = self.notifications[handle]
+            except KeyError:
+                continue
+            callback(self._make_notification(handle, var), name)
+
+    def _make_notification(self, handle, var):
+        buffer = ctypes.create_string_buffer(
+            _NOTIFICATION_DATA_OFFSET + max(var.size, 1))
+        header = structs.SAdsNotificationHeader.from_buffer(buffer)
+        header.hNotification = handle
+        header.nTimeStamp = int(time.time() * 1e7) + _EPOCH_AS_FILETIME
+        header.cbSampleSize = var.size
+        ctypes.memmove(ctypes.addressof(buffer) + _NOTIFICATION_DATA_OFFSET,
+                       bytes(var.buffer), var.size)
+        # Keep the buffer alive for the duration of the callback
+        header._buffer = buffer
+        return ctypes.pointer(header)
@@ -0,0 +1,314 @@
+import bisect
+import http.server
+import logging
+import os
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+#: Histogram buckets [sec] for ADS round-trips, poll cycles and writes
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+#: Histogram buckets [sec] for decoding values
+DECODE_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4,
+                  1e-3, 1e-2)
+
+_enabled = os.environ.get('ADS_PCDS_METRICS', '') not in ('', '0')
+_server = None
+
+
+def enabled():
+    'Are metrics recorded for new connections?'
+    return _enabled
+
+
+def enable(http_port=None, http_address='127.0.0.1'):
+    '''
+    Record metrics for all current and future connections
+
+    Parameters
+    ----------
+    http_port : int, optional
+        Also serve metrics in the Prometheus text format on this port
+    http_address : str, optional
+        Address to serve metrics on
+    '''
+    global _enabled
+    from .ads import _PLCS
+
+    _enabled = True
+    for plc in list(_PLCS.values()):
+        if plc.metrics is None:
+            plc.metrics = PlcMetrics()
+
+    if http_port is not None:
+        start_http_server(http_port, http_address)
+
+
+def new_plc_metrics():
+    '''
+    Metrics for a new connection, or None if disabled
+
+    With $ADS_PCDS_METRICS_PORT set, this also starts the HTTP server.
+    '''
+    if not _enabled:
+        return None
+
+    port = os.environ.get('ADS_PCDS_METRICS_PORT')
+    if port and _server is None:
+        try:
+            start_http_server(int(port))
+        except Exception:
+            logger.exception('Unable to serve metrics on port %s', port)
+    return PlcMetrics()
+
+
+class Histogram:
+    '''
+    A histogram of observed values
+
+    Updates are not locked: with concurrent observers, counts may be
+    slightly off, which is acceptable for monitoring.
+    '''
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        # The last count is for values above the highest bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        'Estimate the `q` quantile as the upper bound of its bucket'
+        if not self.count:
+            return None
+        target = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= target:
+                return bound
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else None,
+            'p50': self.quantile(0.5),
+            'p99': self.quantile(0.99),
+            'max': self.max,
+            'buckets': dict(zip(self.buckets + (float('inf'), ),
+                                self.counts)),
+        }
+
+
+class VariableMetrics:
+    'Update and decoding metrics of a single PLC variable'
+
+    def __init__(self):
+        self.since = time.monotonic()
+        self.notifications = 0
+        self.polls = 0
+        self.decode_time = Histogram(DECODE_BUCKETS)
+
+    def snapshot(self):
+        elapsed = max(time.monotonic() - self.since, 1e-9)
+        return {
+            'notifications': self.notifications,
+            'notification_rate': self.notifications / elapsed,
+            'polls': self.polls,
+            'decode_time': self.decode_time.snapshot(),
+        }
+
+
+class PlcMetrics:
+    'Metrics of a single PLC connection'
+
+    def __init__(self):
+        self.since = time.time()
+        self.requests = {}
+        self.poll_cycles = {}
+        self.poll_overruns = {}
+        self.write_latency = Histogram()
+        self.max_queue_depth = 0
+        self.variables = {}
+
+    def observe_request(self, kind, duration):
+        'Record the duration of an ADS round-trip of `kind`'
+        try:
+            histogram = self.requests[kind]
+        except KeyError:
+            histogram = self.requests.setdefault(kind, Histogram())
+        histogram.observe(duration)
+
+    def observe_poll_cycle(self, rate, duration, overrun):
+        try:
+            histogram = self.poll_cycles[rate]
+        except KeyError:
+            histogram = self.poll_cycles.setdefault(rate, Histogram())
+            self.poll_overruns.setdefault(rate, 0)
+        histogram.observe(duration)
+        if overrun:
+            self.poll_overruns[rate] += 1
+
+    def observe_queue_depth(self, depth):
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+
+    def variable(self, name):
+        'Metrics of the variable `name`'
+        try:
+            return self.variables[name]
+        except KeyError:
+            return self.variables.setdefault(name, VariableMetrics())
+
+    def snapshot(self):
+        return {
+            'since': self.since,
+            'requests': {kind: histogram.snapshot()
+                         for kind, histogram in list(self.requests.items())},
+            'poll_cycles': {
+                rate: dict(histogram.snapshot(),
+                           overruns=self.poll_overruns.get(rate, 0))
+                for rate, histogram in list(self.poll_cycles.items())
+            },
+            'write_latency': self.write_latency.snapshot(),
+            'max_queue_depth': self.max_queue_depth,
+            'variables': {name: variable.snapshot()
+                          for name, variable in list(self.variables.items())},
+        }
+
+
+def _format_labels(labels):
+    return '{' + ','.join('{}="{}"'.format(
+        key, str(value).replace('\\', r'\\').replace('"', r'\"'))
+        for key, value in labels.items()) + '}'
+
+
+def _format_histogram(lines, name, labels, histogram):
+    cumulative = 0
+    for bound, count in zip(histogram.buckets + (float('inf'), ),
+                            histogram.counts):
+        cumulative += count
+        le = '+Inf' if bound == float('inf') else repr(bound)
+        lines.append('{}_bucket{} {}'.format(
+            name, _format_labels(dict(labels, le=le)), cumulative))
+    lines.append('{}_sum{} {!r}'.format(name, _format_labels(labels),
+                                        histogram.sum))
+    lines.append('{}_count{} {}'.format(name, _format_labels(labels),
+                                        histogram.count))
+
+
+# Metric families: name, type, help
+_FAMILIES = [
+    ('ads_pcds_connected', 'gauge', 'Connection state of the PLC'),
+    ('ads_pcds_queue_depth', 'gauge', 'Requests queued for the PLC thread'),
+    ('ads_pcds_max_queue_depth', 'gauge',
+     'Highest number of requests queued for the PLC thread'),
+    ('ads_pcds_request_seconds', 'histogram', 'ADS request durations'),
+    ('ads_pcds_poll_cycle_seconds', 'histogram',
+     'Poll cycle durations by poll period'),
+    ('ads_pcds_poll_overruns_total', 'counter',
+     'Poll cycles that exceeded their period'),
+    ('ads_pcds_write_latency_seconds', 'histogram',
+     'Time from queueing a write to its completion'),
+    ('ads_pcds_notifications_total', 'counter',
+     'Notifications received by symbol'),
+    ('ads_pcds_decode_seconds', 'histogram', 'Value decoding durations'),
+]
+
+
+def format_prometheus(plcs):
+    'Format the metrics of `plcs` in the Prometheus text exposition format'
+    families = {name: [] for name, _, _ in _FAMILIES}
+
+    def add_sample(name, labels, value):
+        families[name].append('{}{} {}'.format(name, _format_labels(labels),
+                                               value))
+
+    for plc in plcs:
+        labels = {'ams_id': plc.ams_id, 'port': plc.port}
+        add_sample('ads_pcds_connected', labels, int(plc.connected))
+        add_sample('ads_pcds_queue_depth', labels, plc.queue.qsize())
+
+        metrics = plc.metrics
+        if metrics is None:
+            continue
+
+        add_sample('ads_pcds_max_queue_depth', labels,
+                   metrics.max_queue_depth)
+        for kind, histogram in list(metrics.requests.items()):
+            _format_histogram(families['ads_pcds_request_seconds'],
+                              'ads_pcds_request_seconds',
+                              dict(labels, request=kind), histogram)
+        for rate, histogram in list(metrics.poll_cycles.items()):
+            rate_labels = dict(labels, rate=rate)
+            _format_histogram(families['ads_pcds_poll_cycle_seconds'],
+                              'ads_pcds_poll_cycle_seconds', rate_labels,
+                              histogram)
+            add_sample('ads_pcds_poll_overruns_total', rate_labels,
+                       metrics.poll_overruns.get(rate, 0))
+        _format_histogram(families['ads_pcds_write_latency_seconds'],
+                          'ads_pcds_write_latency_seconds', labels,
+                          metrics.write_latency)
+        for name, variable in list(metrics.variables.items()):
+            variable_labels = dict(labels, symbol=name)
+            add_sample('ads_pcds_notifications_total', variable_labels,
+                       variable.notifications)
+            _format_histogram(families['ads_pcds_decode_seconds'],
+                              'ads_pcds_decode_seconds', variable_labels,
+                              variable.decode_time)
+
+    lines = []
+    for name, type_, help_ in _FAMILIES:
+        lines.append(f'# HELP {name} {help_}')
+        lines.append(f'# TYPE {name} {type_}')
+        lines.extend(families[name])
+    return '\n'.join(lines) + '\n'
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        from .ads import _PLCS
+
+        body = format_prometheus(list(_PLCS.values())).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug('%s - %s', self.address_string(), format % args)
+
+
+def start_http_server(port, address='127.0.0.1'):
+    '''
+    Serve the metrics of all connections in the Prometheus text format
+
+    Returns
+    -------
+    server : http.server.ThreadingHTTPServer
+    '''
+    global _server
+    if _server is not None:
+        return _server
+
+    _server = http.server.ThreadingHTTPServer((address, port),
+                                              _MetricsHandler)
+    thread = threading.Thread(target=_server.serve_forever, daemon=True)
+    thread.start()
+    logger.info('Serving ADS metrics on http://%s:%d/metrics', address,
+                _server.server_address[1])
+    return _server
@@ -0,0 +1,865 @@
+import argparse
+import concurrent.futures
+import ctypes
+import functools
+import itertools
+import logging
+import os
+import queue
+import socket
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+from .ads import (MAX_RECONNECT_DELAY, RECONNECT_DELAY, DataTypes, Symbol,
+                  data_type_from_symbol_info, get_connection, get_decoder,
+                  upload_data_type_table)
+
+
+logger = logging.getLogger(__name__)
+
+#: Threads of the proxy servicing requests of clients
+PROXY_WORKERS = 8
+#: Time [sec] requests wait for the connection to the proxy
+PROXY_CONNECT_TIMEOUT = 5.0
+
+
+#: Size [bytes] of the key authenticating proxy and clients to each other
+AUTHKEY_SIZE = 32
+
+
+def _private_directory():
+    '$XDG_RUNTIME_DIR, or ~/.ads_pcds; only accessible by the user'
+    directory = (os.environ.get('XDG_RUNTIME_DIR') or
+                 os.path.join(os.path.expanduser('~'), '.ads_pcds'))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    _check_private(directory)
+    return directory
+
+
+def _check_private(path):
+    info = os.stat(path)
+    if info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise PermissionError(
+            f'{path} must be owned by and only accessible to the user')
+
+
+def default_socket_path():
+    'Default socket path of the proxy, one per user'
+    return os.path.join(_private_directory(), 'ads_pcds_proxy.sock')
+
+
+def default_key_path():
+    'Default key file of the proxy, one per user'
+    return os.path.join(_private_directory(), 'ads_pcds_proxy.key')
+
+
+def load_authkey(path=None):
+    '''
+    Load the key authenticating proxy and clients, creating it if needed
+
+    Values are exchanged as pickles, so the proxy and its clients must
+    trust each other: both prove knowledge of this key, readable only by
+    the user, before anything is sent.
+
+    Parameters
+    ----------
+    path : str, optional
+        Key file; see `default_key_path`
+
+    Returns
+    -------
+    authkey : bytes
+    '''
+    path = path or default_key_path()
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        ...
+    else:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(os.urandom(AUTHKEY_SIZE))
+
+    _check_private(path)
+    with open(path, 'rb') as f:
+        authkey = f.read()
+    if len(authkey) < AUTHKEY_SIZE:
+        raise ValueError(f'Proxy key file {path} is incomplete')
+    return authkey
+
+
+class RawValue:
+    '''
+    Raw data of a value, for types only known to the PLC
+
+    Structures are built from the data type table of each PLC, so they are
+    sent between proxy and clients as raw data and decoded by the receiver.
+    '''
+    __slots__ = ('data', )
+
+    def __init__(self, data):
+        self.data = data
+
+    def __reduce__(self):
+        return (RawValue, (self.data, ))
+
+
+def _to_wire(value):
+    if isinstance(value, (ctypes.Structure, ctypes.Array)):
+        return RawValue(bytes(value))
+    if (isinstance(value, list) and value and
+            isinstance(value[0], ctypes.Structure)):
+        return RawValue(b''.join(bytes(item) for item in value))
+    return value
+
+
+def _from_wire(value):
+    'Value for writing, on the proxy'
+    if isinstance(value, RawValue):
+        return value.data
+    return value
+
+
+class _ProxySymbol(Symbol):
+    'A subscription of a proxy client'
+
+    def __init__(self, plc, symbol, poll_rate, *, client, sub_id, **kwargs):
+        super().__init__(plc, symbol, poll_rate, **kwargs)
+        self.client = client
+        self.sub_id = sub_id
+
+    def _update(self, timestamp, value):
+        # Deadbands are applied by the client
+        self.client.send(('value', self.sub_id, timestamp, _to_wire(value)))
+
+    def connection_changed(self, connected):
+        self.client.send(('connection', self.sub_id, connected))
+
+
+class _ProxyClient:
+    'A client process connected to the proxy'
+
+    def __init__(self, server, conn):
+        self.server = server
+        self.conn = conn
+        self.symbols = {}
+        self._send_queue = queue.SimpleQueue()
+        self._closed = False
+        self._receive_thread = threading.Thread(target=self._receive,
+                                                daemon=True)
+        self._send_thread = threading.Thread(target=self._send_loop,
+                                             daemon=True)
+
+    def start(self):
+        self._receive_thread.start()
+        self._send_thread.start()
+
+    def send(self, message):
+        'Queue a message to the client, from any thread'
+        self._send_queue.put(message)
+
+    def _send_loop(self):
+        while True:
+            message = self._send_queue.get()
+            if message is None:
+                break
+            try:
+                self.conn.send(message)
+            except OSError:
+                _shutdown(self.conn)
+                break
+            except Exception as ex:
+                # e.g., values or exceptions that cannot be pickled
+                logger.error('Unable to send %s message: %s', message[0], ex)
+                if message[0] == 'result' or message[0] == 'error':
+                    self.send(('error', message[1],
+                               RuntimeError(f'Unable to send result: {ex}')))
+
+    def _receive(self):
+        try:
+            while True:
+                self._handle(self.conn.recv())
+        except (EOFError, OSError):
+            ...
+        finally:
+            self._closed = True
+            for symbol in list(self.symbols.values()):
+                symbol.plc.clear_symbol(symbol)
+            self.symbols.clear()
+            self._send_queue.put(None)
+            self._send_thread.join()
+            self.conn.close()
+            self.server.clients.discard(self)
+
+    def _handle(self, message):
+        kind = message[0]
+        if kind == 'subscribe':
+            self._subscribe(message[1])
+        elif kind == 'unsubscribe':
+            symbol = self.symbols.pop(message[1], None)
+            if symbol is not None:
+                symbol.plc.clear_symbol(symbol)
+        elif kind == 'call':
+            _, req_id, target, method, args = message
+            self.server.executor.submit(self._call, req_id, target, method,
+                                        args)
+        else:
+            logger.error('Unknown proxy message: %r', kind)
+
+    def _subscribe(self, subscriptions):
+        'Start `subscriptions` with a single `Plc.start_symbols` per PLC'
+        symbols_by_plc = {}
+        for (sub_id, target, name, poll_rate, use_numpy, share_parent,
+             latency_sensitive) in subscriptions:
+            try:
+                plc = self.server.get_plc(target)
+                symbol = plc.get_symbol(name, poll_rate, cls=_ProxySymbol,
+                                        client=self, sub_id=sub_id,
+                                        use_numpy=use_numpy,
+                                        share_parent=share_parent,
+                                        latency_sensitive=latency_sensitive)
+            except Exception as ex:
+                self.send(('subscription_error', sub_id, ex))
+                continue
+            self.symbols[sub_id] = symbol
+            symbols_by_plc.setdefault(plc, []).append(symbol)
+
+        for plc, symbols in symbols_by_plc.items():
+            if not plc.connected:
+                for symbol in symbols:
+                    self.send(('connection', symbol.sub_id, False))
+            plc.start_symbols(symbols).add_done_callback(
+                functools.partial(self._subscribed, symbols))
+
+    def _subscribed(self, symbols, future):
+        try:
+            errors = future.result()
+        except Exception as ex:
+            errors = dict.fromkeys(symbols, ex)
+        for symbol, ex in errors.items():
+            self.send(('subscription_error', symbol.sub_id, ex))
+
+    def _call(self, req_id, target, method, args):
+        try:
+            handler = getattr(self, f'_call_{method}')
+            result = handler(self.server.get_plc(target), *args)
+        except Exception as ex:
+            self.send(('error', req_id, ex))
+            return
+
+        if not isinstance(result, concurrent.futures.Future):
+            self.send(('result', req_id, result))
+            return
+
+        def done(future):
+            try:
+                self.send(('result', req_id, future.result()))
+            except Exception as ex:
+                self.send(('error', req_id, ex))
+
+        result.add_done_callback(done)
+
+    def _call_read(self, plc, name, use_numpy):
+        variable = plc.get_variable(name)
+        return _to_wire(
+            plc.submit(variable.read, use_numpy=use_numpy).result())
+
+    def _call_write(self, plc, name, value):
+        return plc.submit(plc.get_variable(name).write, _from_wire(value))
+
+    def _call_write_async(self, plc, name, value):
+        return plc.queue_write(plc.get_variable(name), _from_wire(value))
+
+    def _call_read_many(self, plc, names, use_numpy):
+        variables = [plc.get_variable(name) for name in names]
+        values = plc.submit(plc.read_variables, variables,
+                            use_numpy=use_numpy).result()
+        return [_to_wire(value) for value in values]
+
+    def _call_symbol_info(self, plc, name):
+        return plc.submit(plc.get_symbol_info, name).result()
+
+    def _call_symbol_table(self, plc):
+        return plc.submit(plc.load_symbol_table).result()
+
+    def _call_data_type_table(self, plc):
+        return plc.submit(upload_data_type_table, plc.ads).result()
+
+    def close(self):
+        'Disconnect the client; its subscriptions are cleared'
+        if not self._closed:
+            _shutdown(self.conn)
+
+
+class ProxyServer:
+    '''
+    Share PLC connections among the processes of a host
+
+    Clients (see `ProxyPlc`) connect over a Unix socket.  The proxy owns a
+    single `Plc` per PLC, so subscriptions of all clients to a symbol share
+    one ADS notification or poll, and writes of all clients are coalesced.
+
+    Run it with ``python -m ads_pcds.proxy``, and select it in clients by
+    setting $ADS_PCDS_PROXY to its socket path.  Only clients of the same
+    key may connect; see `load_authkey`.
+
+    Parameters
+    ----------
+    path : str, optional
+        Socket path; see `default_socket_path`
+    authkey : bytes, optional
+        Key shared with the clients; by default, that of `load_authkey`
+    '''
+
+    def __init__(self, path=None, *, authkey=None):
+        self.path = path or default_socket_path()
+        self.authkey = authkey or load_authkey()
+        self.clients = set()
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=PROXY_WORKERS)
+        self.running = False
+        self.thread = None
+        if os.path.exists(self.path):
+            if _is_listening(self.path):
+                raise RuntimeError(f'A proxy is already serving {self.path}')
+            # Left behind by a proxy that did not exit cleanly
+            os.unlink(self.path)
+
+        # Only the user may connect
+        umask = os.umask(0o177)
+        try:
+            self.listener = Listener(self.path, family='AF_UNIX',
+                                     authkey=self.authkey)
+        finally:
+            os.umask(umask)
+
+    def __repr__(self):
+        return (f'<{self.__class__.__name__} {self.path!r} '
+                f'clients={len(self.clients)}>')
+
+    def get_plc(self, target):
+        'The Plc of target (ip_address, ams_id, port)'
+        ip_address, ams_id, port = target
+        plc = get_connection(ip_address, ams_id, port, proxy=False)
+        plc.open()
+        return plc
+
+    def serve_forever(self):
+        self.running = True
+        logger.info('ADS proxy serving %s', self.path)
+        while self.running:
+            try:
+                conn = self.listener.accept()
+            except (AuthenticationError, EOFError, OSError) as ex:
+                if not self.running:
+                    break
+                # Failed to authenticate, or disconnected while doing so
+                logger.warning('Rejected proxy client: %s', ex)
+                continue
+            if not self.running:
+                conn.close()
+                break
+            client = _ProxyClient(self, conn)
+            self.clients.add(client)
+            client.start()
+
+    def start(self):
+        'Serve clients in a background thread'
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        # Wake up a pending accept
+        _is_listening(self.path)
+        self.listener.close()
+        for client in list(self.clients):
+            client.close()
+        if self.thread is not None:
+            self.thread.join()
+        self.executor.shutdown(wait=False)
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            ...
+
+
+def _shutdown(conn):
+    'Shut down the socket of `conn`, waking up threads blocked on it'
+    try:
+        sock = socket.fromfd(conn.fileno(), socket.AF_UNIX,
+                             socket.SOCK_STREAM)
+    except OSError:
+        return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        ...
+    finally:
+        sock.close()
+
+
+def _is_listening(path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        return False
+    finally:
+        sock.close()
+    return True
+
+
+class ProxyVariable:
+    '''
+    A PLC variable served by the proxy; see `PlcVariable`
+
+    Each subscribed Symbol has a subscription of its own on the proxy,
+    where they share a single `PlcVariable`.
+    '''
+
+    def __init__(self, plc, name):
+        self.plc = plc
+        self.name = name
+        self.share_parent = False
+        self.data_type = None
+        self.array_size = None
+        self.data_size = None
+        self.consumers = []
+        self._decoders = {}
+
+    def __repr__(self):
+        return (f'<{self.__class__.__name__} {self.name!r} '
+                f'consumers={len(self.consumers)}>')
+
+    def _resolve(self):
+        if self.data_type is None:
+            info = self.plc.call('symbol_info', self.name)
+            self.data_type, self.array_size = data_type_from_symbol_info(
+                info, data_types=self.plc.data_types)
+            self.data_size = info.size
+
+    def _decode(self, value, use_numpy):
+        'Decode raw values sent by the proxy; not on the receiving thread'
+        if not isinstance(value, RawValue):
+            return value
+        self._resolve()
+        try:
+            decode = self._decoders[use_numpy]
+        except KeyError:
+            decode = get_decoder(self.data_type, self.data_size,
+                                 use_numpy=use_numpy)
+            self._decoders[use_numpy] = decode
+        return decode(value.data)
+
+    def read(self, *, use_numpy=False):
+        return self._decode(self.plc.call('read', self.name, use_numpy),
+                            use_numpy)
+
+    def write(self, value):
+        self.plc.call('write', self.name, _to_wire(value))
+
+    def write_async(self, value):
+        '''
+        Queue a write of `value` on the proxy, without waiting for it
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+        '''
+        return self.plc.call_async('write_async', self.name, _to_wire(value))
+
+    def add_consumer(self, consumer, *, initialize=True):
+        '''
+        Subscribe a Symbol to updates of this variable
+
+        The proxy always delivers the first value.  Without `initialize`,
+        the caller sends the subscription; see `ProxyPlc.start_symbols`.
+        '''
+        if consumer in self.consumers:
+            return
+        self.consumers.append(consumer)
+        self.plc._subscribe(self, consumer, send=initialize)
+
+    def remove_consumer(self, consumer):
+        try:
+            self.consumers.remove(consumer)
+        except ValueError:
+            return
+        self.plc._unsubscribe(consumer)
+
+
+class ProxyPlc:
+    '''
+    A drop-in for `Plc`, served by a `ProxyServer`
+
+    `get_connection` returns these when $ADS_PCDS_PROXY is set.  Updates and
+    connection changes are delivered on a thread of the ProxyPlc, which
+    also runs `submit`.  The connection to the proxy is re-established if
+    lost, restoring all subscriptions.
+
+    Parameters
+    ----------
+    ip_address : str
+    ams_id : str
+    port : int
+    path : str, optional
+        Socket path of the proxy; see `default_socket_path`
+    authkey : bytes, optional
+        Key shared with the proxy; by default, that of `load_authkey`
+    '''
+
+    def __init__(self, ip_address, ams_id, port, *, path=None, authkey=None):
+        self.ip_address = ip_address
+        self.ams_id = ams_id
+        self.port = port
+        self.target = (ip_address, ams_id, port)
+        self.path = path or default_socket_path()
+        self.authkey = authkey or load_authkey()
+        self.ads = None
+        self.metrics = None
+        self.symbols = {}
+        self.variables = {}
+        #: False while the proxy or the PLC is not connected
+        self.connected = False
+        self.data_types = DataTypes(
+            loader=lambda: self.call('data_type_table'))
+        self.running = True
+        self.conn = None
+        self._ids = itertools.count(1)
+        self._send_lock = threading.Lock()
+        # {consumer: (sub_id, variable)}
+        self._subscriptions = {}
+        self._consumers = {}
+        # {req_id: future}
+        self._calls = {}
+        self._connected_event = threading.Event()
+        self._stop_event = threading.Event()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.thread = threading.Thread(target=self._thread, daemon=True)
+        self.thread.start()
+
+    def __repr__(self):
+        return (f'<{self.__class__.__name__} {self.ip_address} '
+                f'{self.ams_id}:{self.port} via {self.path!r}>')
+
+    def _send(self, message):
+        with self._send_lock:
+            if self.conn is None:
+                raise ConnectionError(f'Not connected to proxy {self.path}')
+            self.conn.send(message)
+
+    def call_async(self, method, *args):
+        '''
+        Call `method` on the proxy
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+        '''
+        if not self._connected_event.wait(PROXY_CONNECT_TIMEOUT):
+            raise ConnectionError(f'Not connected to proxy {self.path}')
+        req_id = next(self._ids)
+        future = concurrent.futures.Future()
+        self._calls[req_id] = future
+        try:
+            self._send(('call', req_id, self.target, method, args))
+        except Exception:
+            self._calls.pop(req_id, None)
+            raise
+        return future
+
+    def call(self, method, *args):
+        'Call `method` on the proxy and wait for its result'
+        return self.call_async(method, *args).result()
+
+    def _subscribe(self, variable, consumer, *, send=True):
+        sub_id = next(self._ids)
+        self._subscriptions[consumer] = (sub_id, variable)
+        self._consumers[sub_id] = (consumer, variable)
+        if send:
+            self._send_subscriptions([sub_id])
+
+    def _send_subscriptions(self, sub_ids):
+        'Subscribe on the proxy, started there together'
+        if not sub_ids:
+            return
+        try:
+            self._send(self._subscribe_message(sub_ids))
+        except (ConnectionError, OSError):
+            # Subscribed once connected
+            ...
+
+    def _subscribe_message(self, sub_ids):
+        subscriptions = []
+        for sub_id in sub_ids:
+            try:
+                consumer, variable = self._consumers[sub_id]
+            except KeyError:
+                # Unsubscribed in the meantime
+                continue
+            subscriptions.append(
+                (sub_id, self.target, variable.name, consumer.poll_rate,
+                 consumer.use_numpy, variable.share_parent,
+                 consumer.latency_sensitive))
+        return ('subscribe', subscriptions)
+
+    def _unsubscribe(self, consumer):
+        sub_id, _ = self._subscriptions.pop(consumer, (None, None))
+        if sub_id is None:
+            return
+        self._consumers.pop(sub_id, None)
+        try:
+            self._send(('unsubscribe', sub_id))
+        except (ConnectionError, OSError):
+            ...
+
+    def _thread(self):
+        delay = RECONNECT_DELAY
+        while self.running:
+            try:
+                conn = Client(self.path, family='AF_UNIX',
+                              authkey=self.authkey)
+            except AuthenticationError as ex:
+                logger.error('Proxy %s failed authentication: %s',
+                             self.path, ex)
+                self._stop_event.wait(delay)
+                delay = min(2 * delay, MAX_RECONNECT_DELAY)
+                continue
+            except (EOFError, OSError) as ex:
+                logger.debug('Unable to connect to proxy %s: %s', self.path,
+                             ex)
+                self._stop_event.wait(delay)
+                delay = min(2 * delay, MAX_RECONNECT_DELAY)
+                continue
+
+            delay = RECONNECT_DELAY
+            with self._send_lock:
+                self.conn = conn
+                conn.send(self._subscribe_message(list(self._consumers)))
+            self._connected_event.set()
+            self.add_to_queue(self._set_connected, True)
+            try:
+                while True:
+                    self._handle(conn.recv())
+            except (EOFError, OSError):
+                ...
+
+            self._connected_event.clear()
+            with self._send_lock:
+                self.conn = None
+            conn.close()
+            calls, self._calls = self._calls, {}
+            for future in calls.values():
+                future.set_exception(
+                    ConnectionError(f'Lost connection to proxy {self.path}'))
+            if self.running:
+                logger.error('Lost connection to proxy %s', self.path)
+                self.add_to_queue(self._set_connected, False)
+
+    def _handle(self, message):
+        kind = message[0]
+        if kind == 'value':
+            _, sub_id, timestamp, value = message
+            self.add_to_queue(self._deliver, sub_id, timestamp, value)
+        elif kind == 'connection':
+            _, sub_id, connected = message
+            self.add_to_queue(self._connection_changed, sub_id, connected)
+        elif kind == 'subscription_error':
+            _, sub_id, ex = message
+            self.add_to_queue(self._subscription_failed, sub_id, ex)
+        elif kind in ('result', 'error'):
+            future = self._calls.pop(message[1], None)
+            if future is None or future.cancelled():
+                return
+            if kind == 'result':
+                future.set_result(message[2])
+            else:
+                future.set_exception(message[2])
+
+    def _deliver(self, sub_id, timestamp, value):
+        try:
+            consumer, variable = self._consumers[sub_id]
+        except KeyError:
+            return
+        try:
+            consumer._update(timestamp,
+                             variable._decode(value, consumer.use_numpy))
+        except Exception:
+            logger.exception('Update of %s failed', consumer)
+
+    def _connection_changed(self, sub_id, connected):
+        try:
+            consumer, _ = self._consumers[sub_id]
+        except KeyError:
+            return
+        consumer._connection_changed(connected)
+
+    def _subscription_failed(self, sub_id, ex):
+        try:
+            consumer, variable = self._consumers[sub_id]
+        except KeyError:
+            return
+        logger.error('Failed to subscribe %s: %s', variable.name, ex)
+        # As for a symbol of a PLC that is not connected
+        consumer._connection_changed(False)
+
+    def _set_connected(self, connected):
+        self.connected = connected
+        for consumer, _ in list(self._consumers.values()):
+            try:
+                consumer._connection_changed(connected)
+            except Exception:
+                logger.exception('Connection update of %s failed', consumer)
+
+    def add_to_queue(self, func, *args, **kwargs):
+        try:
+            self.executor.submit(func, *args, **kwargs)
+        except RuntimeError:
+            # Stopped, or the interpreter is shutting down
+            ...
+
+    def submit(self, func, *args, **kwargs):
+        '''
+        Run `func(*args, **kwargs)` on the thread of this ProxyPlc
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+        '''
+        return self.executor.submit(func, *args, **kwargs)
+
+    def open(self):
+        'The connection to the proxy is opened automatically'
+
+    def stop(self):
+        self.running = False
+        self._stop_event.set()
+        with self._send_lock:
+            if self.conn is not None:
+                _shutdown(self.conn)
+        self.thread.join()
+        self.executor.shutdown(wait=False)
+
+    def close_if_unused(self):
+        'The proxy server closes the ADS port once it is unused'
+
+    def get_variable(self, symbol_name, *, share_parent=False):
+        'Get the shared ProxyVariable for `symbol_name`'
+        key = symbol_name.lower()
+        try:
+            variable = self.variables[key]
+        except KeyError:
+            variable = ProxyVariable(self, symbol_name)
+            self.variables[key] = variable
+        if share_parent:
+            variable.share_parent = True
+        return variable
+
+    def get_symbol(self, symbol_name, poll_rate, *, cls=Symbol, **kwargs):
+        key = (symbol_name, poll_rate, cls) + tuple(sorted(kwargs.items()))
+        try:
+            return self.symbols[key]
+        except KeyError:
+            self.symbols[key] = cls(self, symbol_name, poll_rate, **kwargs)
+            return self.symbols[key]
+
+    def clear_symbol(self, symbol):
+        '''
+        Stop and forget a Symbol
+
+        Parameters
+        ----------
+        symbol : Symbol or str
+            The Symbol instance, or a name to clear all Symbols of that name
+        '''
+        if isinstance(symbol, str):
+            to_clear = [sym for sym in self.symbols.values()
+                        if sym.symbol == symbol]
+        else:
+            to_clear = [symbol]
+
+        for sym in to_clear:
+            sym.stop()
+            for key, value in list(self.symbols.items()):
+                if value is sym:
+                    del self.symbols[key]
+
+    def start_symbols(self, symbols):
+        '''
+        Start many Symbols at once; see `Plc.start_symbols`
+
+        Their subscriptions are sent in a single message, for the proxy to
+        start them together.  Failures are reported per Symbol, as
+        subscription errors.
+        '''
+        started = [symbol for symbol in symbols if not symbol._subscribed]
+        for symbol in started:
+            symbol.start(initialize=False)
+        self._send_subscriptions(
+            [self._subscriptions[symbol][0] for symbol in started
+             if symbol in self._subscriptions])
+        future = concurrent.futures.Future()
+        future.set_result({})
+        return future
+
+    def get_symbol_info(self, symbol_name):
+        return self.call('symbol_info', symbol_name)
+
+    def load_symbol_table(self, *, use_cache=True):
+        'Upload the symbol table through the proxy'
+        return self.call('symbol_table')
+
+    def read_many(self, symbol_names, *, use_numpy=False):
+        'Read many symbols with ADS sum commands; see `Plc.read_many`'
+        variables = [self.get_variable(name) for name in symbol_names]
+        return self.read_variables(variables, use_numpy=use_numpy)
+
+    def read_variables(self, variables, *, use_numpy=False):
+        'Read many variables with ADS sum commands; see `Plc.read_variables`'
+        if isinstance(use_numpy, bool):
+            use_numpy = [use_numpy] * len(variables)
+        values = self.call('read_many',
+                           [variable.name for variable in variables],
+                           use_numpy)
+        return [variable._decode(value, numpy_)
+                for variable, numpy_, value in zip(variables, use_numpy,
+                                                   values)]
+
+
+_PROXY_PLCS = {}
+
+
+def get_proxy_connection(ip_address, ams_id, port, *, path=None,
+                         authkey=None):
+    'Get the shared ProxyPlc for (ip_address, ams_id, port) via `path`'
+    path = path or default_socket_path()
+    key = (path, ip_address, ams_id, port)
+    try:
+        return _PROXY_PLCS[key]
+    except KeyError:
+        plc = ProxyPlc(ip_address, ams_id, port, path=path, authkey=authkey)
+        _PROXY_PLCS[key] = plc
+        return plc
+
+
+def main(path=None, key_file=None):
+    server = ProxyServer(path, authkey=load_authkey(key_file))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        ...
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Share PLC connections among the processes of a host')
+    parser.add_argument('--socket', help='Socket path of the proxy')
+    parser.add_argument('--key-file',
+                        help='File of the key shared with the clients')
+    parser.add_argument('--log-level', default='INFO')
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level)
+    main(args.socket, args.key_file)
@@ -1,9 +1,11 @@
+import contextlib
 import logging
 import time
 
 from ophyd import Signal
+from ophyd.status import Status
 
-from .ads import get_connection, Symbol
+from .ads import get_connection, Symbol, value_changed
 from .util import parse_address, make_address
 
 
@@ -14,6 +16,7 @@ class _SignalSymbol(Symbol):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.callbacks = []
+        self.connection_callbacks = []
 
     def value_updated(self, timestamp, value):
         for cb in list(self.callbacks):
@@ -24,6 +27,14 @@ class _SignalSymbol(Symbol):
                                  cb.__name__, timestamp, value)
                 self.callbacks.remove(cb)
 
+    def connection_changed(self, connected):
+        for cb in list(self.connection_callbacks):
+            try:
+                cb(connected)
+            except Exception:
+                logger.exception('Connection update failed: %s(%s)',
+                                 cb.__name__, connected)
+
     def stop(self):
         if self.callbacks:
             return
@@ -32,7 +43,8 @@ class _SignalSymbol(Symbol):
 
 class AdsSignal(Signal):
     def __init__(self, read_pv, *, ip_address=None, ams_id=None, port=None,
-                 poll_rate=None, name=None, **kwargs):
+                 poll_rate=None, use_numpy=False, deadband=None,
+                 rel_deadband=None, share_parent=True, name=None, **kwargs):
         if name is None:
             name = read_pv
 
@@ -47,46 +59,144 @@ class AdsSignal(Signal):
             port = info['port'] or port
             symbol = info['symbol'] or symbol
             poll_rate = info['poll_rate'] or poll_rate
+            if info['deadband'] is not None:
+                deadband = info['deadband']
+            if info['rel_deadband'] is not None:
+                rel_deadband = info['rel_deadband']
+            if info['numpy'] is not None:
+                use_numpy = info['numpy']
 
         self.ip_address = ip_address
         self.ams_id = ams_id or (ip_address and ip_address + '.1.1')
         self.port = port or 851
         self.poll_rate = poll_rate
         self.symbol = symbol
+        self.deadband = deadband
+        self.rel_deadband = rel_deadband
         self.ads_address = make_address(
             self.ip_address, self.ams_id, self.port, self.symbol,
-            poll_rate=self.poll_rate)
+            poll_rate=self.poll_rate, deadband=self.deadband,
+            rel_deadband=self.rel_deadband, numpy=use_numpy)
 
         if self.ip_address is None:
             raise ValueError(f'IP address unset: {self.ads_address}')
 
         self.plc = get_connection(self.ip_address, self.ams_id, self.port)
         self._symbol = self.plc.get_symbol(self.symbol, self.poll_rate,
-                                           cls=_SignalSymbol)
+                                           cls=_SignalSymbol,
+                                           use_numpy=use_numpy,
+                                           deadband=self.deadband,
+                                           rel_deadband=self.rel_deadband,
+                                           share_parent=share_parent)
         self._symbol.update_hook = self._value_changed
+        self._symbol.connection_callbacks.append(self._connection_changed)
         self._subscribed = False
+        # Set while the value was just read by `batched_read`
+        self._batch_read = False
+        # Set once the subscription delivered a value, while connected
+        self._monitored = False
 
     def _repr_info(self):
         yield from super()._repr_info()
         yield ('ads_address', self.ads_address)
 
-    def get(self):
-        'Read the Symbol value over ADS'
+    def get(self, *, use_monitor=None, **kwargs):
+        '''
+        The value of the Symbol
+
+        Parameters
+        ----------
+        use_monitor : bool, optional
+            Return the last value received by the subscription, without
+            I/O.  This is the default while subscribed and connected; with
+            False, the value is always read over ADS.
+        '''
+        if use_monitor is not False and (self._batch_read or
+                                         self._monitored):
+            # Just read together with other signals (see `batched_read`),
+            # or kept up to date by the subscription
+            return self._readback
+
         value = self._symbol.read()
-        super().put(value=value, timestamp=time.time(), force=True)
-        if not self._subscribed:
-            self._run_metadata_callbacks()
+        self._value_read(value, time.time())
         return value
 
-    def put(self, value):
-        'Write to the Symbol over ADS'
-        self._symbol.write(value)
-        super().put(value=value, timestamp=time.time(), force=True)
+    def _update_value(self, value, timestamp):
+        'Update the value, running callbacks only if it changed'
+        old_value = self._readback
+        if (type(old_value) is type(value) and
+                not value_changed(old_value, value)):
+            self._metadata['timestamp'] = timestamp
+            return False
 
-    def _value_changed(self, timestamp, value):
-        'ADS callback indicating that the value has changed'
         # super().put updates value+metadata and runs SUB_VALUE
         super().put(value=value, timestamp=timestamp, force=True)
+        return True
+
+    def _value_read(self, value, timestamp):
+        'Update with a value read over ADS'
+        if self._update_value(value, timestamp) and not self._subscribed:
+            self._run_metadata_callbacks()
+
+    def put(self, value, *, wait=False, timeout=None, **kwargs):
+        '''
+        Write to the Symbol over ADS
+
+        The value is not taken as the readback, as the PLC may not accept
+        it as-is; it is updated by the subscription or the next `get`.
+
+        Parameters
+        ----------
+        value : any
+        wait : bool, optional
+            Block until the write completed
+        timeout : float, optional
+            Maximum time to wait, with `wait`
+        '''
+        future = self._symbol.write_async(value)
+        if wait:
+            future.result(timeout)
+        else:
+            future.add_done_callback(self._put_done)
+
+    def _put_done(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error('Failed to write to %s: %s', self.ads_address,
+                         future.exception())
+
+    def set(self, value, *, timeout=None, settle_time=None, **kwargs):
+        '''
+        Write to the Symbol over ADS without blocking
+
+        Returns
+        -------
+        status : ophyd.status.Status
+            Finished once the value was written; see `put` for the readback
+        '''
+        status = Status(self, timeout=timeout, settle_time=settle_time)
+
+        def write_done(future):
+            try:
+                future.result()
+            except Exception as ex:
+                status.set_exception(ex)
+            else:
+                status.set_finished()
+
+        self._symbol.write_async(value).add_done_callback(write_done)
+        return status
+
+    def _value_changed(self, timestamp, value):
+        'ADS callback indicating that the value has changed'
+        self._monitored = True
+        if self._update_value(value, timestamp):
+            self._run_metadata_callbacks()
+
+    def _connection_changed(self, connected):
+        'ADS callback indicating that the PLC connection state has changed'
+        if not connected:
+            self._monitored = False
+        self._metadata['connected'] = connected
         self._run_metadata_callbacks()
 
     def subscribe(self, callback, event_type=None, run=True):
@@ -104,6 +214,7 @@ class AdsSignal(Signal):
         self._symbol.callbacks.remove(self._value_changed)
         self._symbol.stop()
         self._subscribed = False
+        self._monitored = False
 
     def unsubscribe_all(self):
         super().unsubscribe_all()
@@ -122,6 +233,90 @@ class AdsSignal(Signal):
             self._symbol.callbacks.remove(self._value_changed)
         except ValueError:
             ...
+        try:
+            self._symbol.connection_callbacks.remove(self._connection_changed)
+        except ValueError:
+            ...
         self._symbol.stop()
         self._symbol = None
         return super().destroy()
+
+
+def read_signals(signals):
+    '''
+    Read many AdsSignals with one ADS sum-read per PLC
+
+    Each signal is updated with its value and the time of the response, as
+    with `AdsSignal.get`.
+
+    Returns
+    -------
+    values : dict
+        {signal: value}
+    '''
+    by_plc = {}
+    for signal in signals:
+        by_plc.setdefault(signal.plc, []).append(signal)
+
+    def read(plc, signals):
+        values = plc.read_variables(
+            [signal._symbol.variable for signal in signals],
+            use_numpy=[signal._symbol.use_numpy for signal in signals])
+        return time.time(), values
+
+    # PLCs are read in parallel, each on its own thread
+    futures = [(signals, plc.submit(read, plc, signals))
+               for plc, signals in by_plc.items()]
+    values = {}
+    for signals, future in futures:
+        timestamp, plc_values = future.result()
+        for signal, value in zip(signals, plc_values):
+            signal._value_read(value, timestamp)
+            values[signal] = value
+    return values
+
+
+@contextlib.contextmanager
+def batched_read(signals):
+    '''
+    Read `signals` at once; in the context, `get` returns the values read
+
+    Signals already read by an enclosing `batched_read` are not read again.
+    '''
+    signals = [signal for signal in signals if not signal._batch_read]
+    read_signals(signals)
+    for signal in signals:
+        signal._batch_read = True
+    try:
+        yield
+    finally:
+        for signal in signals:
+            signal._batch_read = False
+
+
+class BatchedReadMixin:
+    '''
+    Device mixin reading all of its AdsSignals with ADS sum commands
+
+    `read` and `read_configuration` read the AdsSignals among the read or
+    configuration attributes (including those of sub-devices) with a single
+    round-trip per PLC, instead of one per signal.
+
+    Example::
+
+        class Motor(BatchedReadMixin, Device):
+            position = Cpt(AdsSignal, 'Main.M1.fPosition')
+            velocity = Cpt(AdsSignal, 'Main.M1.fVelocity')
+    '''
+
+    def _ads_signals(self, attrs):
+        return [signal for signal in (getattr(self, attr) for attr in attrs)
+                if isinstance(signal, AdsSignal)]
+
+    def read(self):
+        with batched_read(self._ads_signals(self.read_attrs)):
+            return super().read()
+
+    def read_configuration(self):
+        with batched_read(self._ads_signals(self.configuration_attrs)):
+            return super().read_configuration()
@@ -0,0 +1,258 @@
+import collections
+import json
+import logging
+import os
+import struct
+import tempfile
+
+
+logger = logging.getLogger(__name__)
+
+# TwinCAT encodes symbol names and comments with the Windows code page
+SYMBOL_ENCODING = 'windows-1252'
+
+
+class SymbolEntry(collections.namedtuple(
+        'SymbolEntry',
+        'name iGroup iOffs size dataType flags type_name comment '
+        'entryLength nameLength typeLength commentLength')):
+    '''
+    A parsed AdsSymbolEntry
+
+    Field names match `pyads.structs.SAdsSymbolEntry`, so either can be used
+    where symbol information is expected.
+    '''
+    __slots__ = ()
+
+    @property
+    def symbol_type(self):
+        'The type name, as in `pyads.structs.SAdsSymbolEntry`'
+        return self.type_name
+
+
+# entryLength, iGroup, iOffs, size, dataType, flags, nameLength, typeLength,
+# commentLength
+_SYMBOL_ENTRY_HEADER = struct.Struct('<6I3H')
+
+
+def _get_string(view, offset, length):
+    return str(view[offset:offset + length], SYMBOL_ENCODING, 'replace')
+
+
+def parse_symbol_entry(buffer, offset=0):
+    '''
+    Parse a single AdsSymbolEntry from `buffer` at `offset`
+
+    Returns
+    -------
+    entry : SymbolEntry or None
+        None if the entry is empty (i.e., the end of the table)
+    entry_length : int
+        Number of bytes used by the entry
+    '''
+    (entry_length, group, offs, size, data_type, flags, name_length,
+     type_length, comment_length) = _SYMBOL_ENTRY_HEADER.unpack_from(
+         buffer, offset)
+
+    if entry_length == 0:
+        return None, 0
+
+    pos = offset + _SYMBOL_ENTRY_HEADER.size
+    name = _get_string(buffer, pos, name_length)
+    pos += name_length + 1
+    type_name = _get_string(buffer, pos, type_length)
+    pos += type_length + 1
+    comment = _get_string(buffer, pos, comment_length)
+    entry = SymbolEntry(name, group, offs, size, data_type, flags, type_name,
+                        comment, entry_length, name_length, type_length,
+                        comment_length)
+    return entry, entry_length
+
+
+def parse_symbol_table(buffer):
+    '''
+    Parse an ADSIGRP_SYM_UPLOAD symbol table in a single pass
+
+    Returns
+    -------
+    entries : list of SymbolEntry
+    '''
+    view = memoryview(buffer).cast('B')
+    end = len(view) - _SYMBOL_ENTRY_HEADER.size
+    offset = 0
+    entries = []
+    while offset <= end:
+        entry, entry_length = parse_symbol_entry(view, offset)
+        if entry is None:
+            break
+        entries.append(entry)
+        offset += entry_length
+
+    return entries
+
+
+DataTypeEntry = collections.namedtuple(
+    'DataTypeEntry',
+    'name type_name comment size offset dataType flags array_info sub_items'
+)
+DataTypeEntry.__doc__ = '''
+A parsed AdsDatatypeEntry
+
+`array_info` is a tuple of (lower_bound, elements) per dimension, and
+`sub_items` a tuple of DataTypeEntry for structure members, with `offset`
+relative to the start of the structure.
+'''
+
+# entryLength, version, hashValue, typeHashValue, size, offs, dataType,
+# flags, nameLength, typeLength, commentLength, arrayDim, subItems
+_DATA_TYPE_ENTRY_HEADER = struct.Struct('<8I5H')
+_ARRAY_INFO = struct.Struct('<iI')
+
+
+def parse_data_type_entry(buffer, offset=0):
+    '''
+    Parse a single AdsDatatypeEntry, including its members, from `buffer`
+
+    Returns
+    -------
+    entry : DataTypeEntry or None
+        None if the entry is empty (i.e., the end of the table)
+    entry_length : int
+        Number of bytes used by the entry
+    '''
+    (entry_length, _, _, _, size, offs, data_type, flags, name_length,
+     type_length, comment_length, array_dim,
+     sub_item_count) = _DATA_TYPE_ENTRY_HEADER.unpack_from(buffer, offset)
+
+    if entry_length == 0:
+        return None, 0
+
+    pos = offset + _DATA_TYPE_ENTRY_HEADER.size
+    name = _get_string(buffer, pos, name_length)
+    pos += name_length + 1
+    type_name = _get_string(buffer, pos, type_length)
+    pos += type_length + 1
+    comment = _get_string(buffer, pos, comment_length)
+    pos += comment_length + 1
+
+    array_info = []
+    for _ in range(array_dim):
+        array_info.append(_ARRAY_INFO.unpack_from(buffer, pos))
+        pos += _ARRAY_INFO.size
+
+    sub_items = []
+    for _ in range(sub_item_count):
+        sub_item, sub_item_length = parse_data_type_entry(buffer, pos)
+        if sub_item is None:
+            break
+        sub_items.append(sub_item)
+        pos += sub_item_length
+
+    entry = DataTypeEntry(name, type_name, comment, size, offs, data_type,
+                          flags, tuple(array_info), tuple(sub_items))
+    return entry, entry_length
+
+
+def parse_data_type_table(buffer):
+    '''
+    Parse an ADSIGRP_SYM_DT_UPLOAD data type table
+
+    Returns
+    -------
+    entries : list of DataTypeEntry
+    '''
+    view = memoryview(buffer).cast('B')
+    end = len(view) - _DATA_TYPE_ENTRY_HEADER.size
+    offset = 0
+    entries = []
+    while offset <= end:
+        entry, entry_length = parse_data_type_entry(view, offset)
+        if entry is None:
+            break
+        entries.append(entry)
+        offset += entry_length
+
+    return entries
+
+
+def get_cache_path():
+    'Directory for cached symbol tables'
+    cache_home = os.environ.get('XDG_CACHE_HOME',
+                                os.path.join('~', '.cache'))
+    return os.environ.get(
+        'ADS_PCDS_CACHE',
+        os.path.join(os.path.expanduser(cache_home), 'ads_pcds'))
+
+
+def _cache_filename(kind, ams_id, port):
+    filename = '{}_{}_{}.cache'.format(kind, ams_id, port)
+    return os.path.join(get_cache_path(), filename)
+
+
+# Tables are cached as uploaded, and parsed again when loaded
+_CACHE_PARSERS = {
+    'symbols': parse_symbol_table,
+    'datatypes': parse_data_type_table,
+}
+_CACHE_MAGIC = b'ads_pcds-cache 1\n'
+
+
+def load_cached(kind, ams_id, port, version):
+    '''
+    Load a cached table for the target at (ams_id, port)
+
+    Returns None if not cached or if the cached `version` differs.
+    '''
+    filename = _cache_filename(kind, ams_id, port)
+    try:
+        with open(filename, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    except OSError as ex:
+        logger.warning('Ignoring unreadable %s cache %s: %s', kind, filename,
+                       ex)
+        return None
+
+    try:
+        if not data.startswith(_CACHE_MAGIC):
+            raise ValueError('Unknown format')
+        header, _, buffer = data[len(_CACHE_MAGIC):].partition(b'\n')
+        header = json.loads(header)
+        if header['size'] != len(buffer):
+            raise ValueError('Truncated')
+    except Exception as ex:
+        logger.warning('Ignoring unreadable %s cache %s: %s', kind, filename,
+                       ex)
+        return None
+
+    if header['version'] != list(version):
+        logger.debug('%s cache %s out of date (%s != %s)', kind, filename,
+                     header['version'], version)
+        return None
+
+    try:
+        return _CACHE_PARSERS[kind](buffer)
+    except Exception as ex:
+        logger.warning('Ignoring unreadable %s cache %s: %s', kind, filename,
+                       ex)
+        return None
+
+
+def save_cached(kind, ams_id, port, version, data):
+    '''
+    Cache the uploaded table `data` for the target at (ams_id, port)
+
+    Any prior one is replaced.
+    '''
+    filename = _cache_filename(kind, ams_id, port)
+    data = bytes(data)
+    header = json.dumps({'version': list(version), 'size': len(data)})
+    try:
+        os.makedirs(os.path.dirname(filename), mode=0o700, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+                'wb', dir=os.path.dirname(filename), delete=False) as f:
+            f.write(_CACHE_MAGIC + header.encode('ascii') + b'\n' + data)
+        os.replace(f.name, filename)
+    except Exception as ex:
+        logger.warning('Unable to write %s cache %s: %s', kind, filename, ex)
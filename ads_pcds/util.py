@@ -1,11 +1,34 @@
+import urllib.parse
+
+
+#: Address options, given as a query string after the symbol name
+ADDRESS_OPTIONS = ('deadband', 'rel_deadband', 'numpy')
+_BOOLEAN_OPTIONS = {'numpy'}
+_TRUE = ('1', 'true', 'yes', 'on')
+_FALSE = ('0', 'false', 'no', 'off')
+
+
+def _parse_boolean(key, value):
+    if value.lower() in _TRUE:
+        return True
+    if value.lower() in _FALSE:
+        return False
+    raise ValueError(f'Invalid value for {key}: {value!r}')
+
+
 def parse_address(addr, *, allow_macros=False):
     '''
-    ads://<host>[:<port>][/@poll_rate]/<symbol>
+    ads://<host>[:<port>][/@poll_rate]/<symbol>[?<option>=<value>[&...]]
 
     host can be:
         ip_address
         ams_id
         ams_id@ip_address
+
+    options can be:
+        deadband: absolute deadband for value updates
+        rel_deadband: deadband relative to the last value
+        numpy: decode numeric arrays to numpy arrays (1 or 0)
     '''
     if addr.startswith('ads:'):
         addr = addr[4:].lstrip('/')
@@ -40,6 +63,21 @@ def parse_address(addr, *, allow_macros=False):
     else:
         poll_rate = None
 
+    symbol, _, query = symbol.partition('?')
+    options = dict.fromkeys(ADDRESS_OPTIONS)
+    for key, value in urllib.parse.parse_qsl(query):
+        if key not in options:
+            raise ValueError(f'Unknown address option: {key!r}')
+        if key in _BOOLEAN_OPTIONS:
+            options[key] = _parse_boolean(key, value)
+            continue
+        try:
+            options[key] = float(value)
+        except ValueError:
+            if not (allow_macros and '${' in value):
+                raise
+            options[key] = value
+
     try:
         port = int(port)
     except ValueError:
@@ -61,11 +99,20 @@ def parse_address(addr, *, allow_macros=False):
             'port': port,
             'poll_rate': poll_rate,
             'symbol': symbol,
+            **options,
             }
 
 
-def make_address(ip_address, ams_id, port, symbol, *, poll_rate=None):
+def make_address(ip_address, ams_id, port, symbol, *, poll_rate=None,
+                 **options):
     poll_info = '' if poll_rate is None else f'/@{poll_rate}'
+    query = urllib.parse.urlencode(
+        [(key, int(options[key]) if key in _BOOLEAN_OPTIONS
+          else options[key])
+         for key in ADDRESS_OPTIONS
+         # Boolean options are off by default
+         if options.get(key) is not None and options[key] is not False])
+    query_info = f'?{query}' if query else ''
 
     if ip_address and (ip_address + '.1.1' == ams_id):
         host = ip_address
@@ -77,4 +124,4 @@ def make_address(ip_address, ams_id, port, symbol, *, poll_rate=None):
         host = ams_id
 
     port_info = f':{port}' if port not in ('851', 851, None) else ''
-    return f'ads://{host}{port_info}{poll_info}/{symbol}'
+    return f'ads://{host}{port_info}{poll_info}/{symbol}{query_info}'
@@ -1,4 +1,7 @@
 import logging
+import os
+import threading
+import time
 
 from qtpy import QtCore, QtWidgets
 
@@ -7,10 +10,203 @@ from pydm.data_plugins.plugin import PyDMPlugin, PyDMConnection, BaseParameterEd
 
 from ads_pcds import (get_connection, parse_address, Symbol,
                       make_address)
-from ads_pcds.ads import enumerate_plc_symbols
+from ads_pcds.ads import SymbolIndex
+from ads_pcds.util import ADDRESS_OPTIONS
 
 logger = logging.getLogger(__name__)
 
+#: Maximum rate [Hz] at which each channel updates its widgets
+MAX_DISPLAY_RATE = float(os.environ.get('PYDM_ADS_MAX_DISPLAY_RATE', 20.0))
+#: Time [ms] during which new channels are collected to be opened together
+STARTUP_WINDOW = int(os.environ.get('PYDM_ADS_STARTUP_WINDOW', 100))
+#: Rows added to the symbol browser at a time, as it is scrolled
+BROWSER_FETCH_SIZE = 1000
+#: Delay [ms] after typing before the symbol browser filter is applied
+BROWSER_FILTER_DELAY = 150
+
+
+class DisplayUpdater(QtCore.QObject):
+    '''
+    Forwards pending channel values to PyDM at a maximum rate
+
+    A single timer in the GUI thread is shared by all connections.  Values
+    arriving from ADS threads are only stored; each flush sends the latest
+    pending value of each connection.  The timer only runs while values
+    are pending.
+    '''
+    _instance = None
+    # Emitted from ADS threads; queued to the GUI thread that owns the timer
+    _start_timer = QtCore.Signal()
+
+    def __init__(self, max_rate=MAX_DISPLAY_RATE, parent=None):
+        super().__init__(parent)
+        self._lock = threading.Lock()
+        self._pending = set()
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self.flush)
+        self.set_max_rate(max_rate)
+        self._start_timer.connect(self.timer.start)
+
+    @classmethod
+    def instance(cls):
+        'The shared instance; create it from the GUI thread'
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def set_max_rate(self, max_rate):
+        'Set the maximum update rate [Hz]'
+        self.timer.setInterval(max(1, int(1000. / max_rate)))
+
+    def add_pending(self, connection):
+        'Mark `connection` as having a value to flush (thread-safe)'
+        with self._lock:
+            start = not self._pending
+            self._pending.add(connection)
+        if start:
+            self._start_timer.emit()
+
+    def discard(self, connection):
+        'Drop any pending update of `connection`, e.g., when closed'
+        with self._lock:
+            self._pending.discard(connection)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, set()
+            if not pending:
+                # Restarted by the next add_pending
+                self.timer.stop()
+                return
+
+        for connection in pending:
+            if connection.closed:
+                continue
+            try:
+                connection.flush()
+            except Exception:
+                logger.exception('Failed to update channel %s',
+                                 connection.symbol_name)
+
+
+class _StartupWindow:
+    'Channels created within one startup window, awaiting first values'
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.waiting = set()
+        self.count = 0
+        self.failed = 0
+
+
+class ChannelStartup(QtCore.QObject):
+    '''
+    Opens the channels of a display together, per PLC
+
+    Channels are created one at a time as the widgets of a display are.
+    Those created within STARTUP_WINDOW of each other are started in bulk
+    with `Plc.start_symbols`, so that their first values come from a single
+    sum-read.  The time until every channel of a window has its first
+    value, or failed, is logged.
+    '''
+    _instance = None
+
+    def __init__(self, window=STARTUP_WINDOW, parent=None):
+        super().__init__(parent)
+        self._lock = threading.Lock()
+        # Connections to start, by Plc
+        self._pending = {}
+        self._window = None
+        # Windows of connections without a first value
+        self._windows = {}
+        #: Time [sec] from the first channel of the last startup window
+        #: until all of its channels had a value
+        self.time_to_first_value = None
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(window)
+        self.timer.timeout.connect(self.start_pending)
+
+    @classmethod
+    def instance(cls):
+        'The shared instance; create it from the GUI thread'
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def add(self, connection):
+        'Start `connection` with the others of its window; in the GUI thread'
+        if connection.symbol._subscribed:
+            return
+        if self._window is None:
+            self._window = _StartupWindow()
+        with self._lock:
+            self._window.waiting.add(connection)
+            self._window.count += 1
+            self._windows[connection] = self._window
+        self._pending.setdefault(connection.plc, []).append(connection)
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def start_pending(self):
+        pending, self._pending = self._pending, {}
+        with self._lock:
+            window, self._window = self._window, None
+        if window is not None and not window.waiting:
+            # Each of its connections was discarded before the window closed
+            self._finish(window)
+        for plc, connections in pending.items():
+            if not connections:
+                continue
+            logger.debug('Starting %d channels of %s', len(connections), plc)
+            by_symbol = {connection.symbol: connection
+                         for connection in connections}
+            future = plc.start_symbols(list(by_symbol))
+            future.add_done_callback(
+                lambda future, by_symbol=by_symbol: self._started(
+                    future, by_symbol))
+
+    def _started(self, future, by_symbol):
+        try:
+            errors = future.result()
+        except Exception as ex:
+            logger.error('Failed to start %d channels: %s', len(by_symbol),
+                         ex)
+            errors = by_symbol
+        for symbol in errors:
+            self._done(by_symbol[symbol], failed=True)
+
+    def _done(self, connection, *, failed=False):
+        with self._lock:
+            window = self._windows.pop(connection, None)
+            if window is None:
+                return
+            window.waiting.discard(connection)
+            window.failed += failed
+            if window.waiting or window is self._window:
+                # Finished once complete and closed, by whichever is last
+                return
+        self._finish(window)
+
+    def _finish(self, window):
+        'Log the time until each channel of `window` had a value or failed'
+        elapsed = time.monotonic() - window.started_at
+        if window.failed < window.count:
+            self.time_to_first_value = elapsed
+        logger.info('Time to first value of %d channels: %.3f sec '
+                    '(%d failed)', window.count, elapsed, window.failed)
+
+    def first_value(self, connection):
+        'Note the first value of `connection` (thread-safe)'
+        self._done(connection)
+
+    def discard(self, connection):
+        'Forget a connection closed before it was started or had a value'
+        connections = self._pending.get(connection.plc, [])
+        if connection in connections:
+            connections.remove(connection)
+        self._done(connection, failed=True)
+
 
 class SymbolForPydm(Symbol):
     def __init__(self, *args, **kwargs):
@@ -24,11 +220,15 @@ class SymbolForPydm(Symbol):
             'WRITE_ACCESS': True,
             # 'TIMESTAMP': time.time(),
         })
-        self.pydm_connection.send_new_value(self.data)
+        self.pydm_connection.queue_new_value(dict(self.data))
+
+    def connection_changed(self, connected):
+        self.data['CONNECTION'] = connected
+        self.pydm_connection.queue_new_value({'CONNECTION': connected})
 
     def set_connection(self, pydm_connection):
+        'Set the PyDM connection; it starts the symbol'
         self.pydm_connection = pydm_connection
-        self.start()
 
 
 class Connection(PyDMConnection):
@@ -45,10 +245,47 @@ class Connection(PyDMConnection):
         self.plc = get_connection(ip_address=self.ip_address,
                                   ams_id=self.ams_id, port=self.port)
 
+        self._pending = None
+        self._pending_lock = threading.Lock()
+        self._has_value = False
+        self.closed = False
+        #: Values superseded before they could be displayed
+        self.dropped = 0
+        self.updater = DisplayUpdater.instance()
+
         self.symbol_name = self.address['symbol']
-        self.symbol = self.plc.get_symbol(self.symbol_name, self.poll_rate,
-                                          cls=SymbolForPydm)
+        self.symbol = self.plc.get_symbol(
+            self.symbol_name, self.poll_rate, cls=SymbolForPydm,
+            # Waveform widgets take numpy arrays as-is; opt in with ?numpy=1
+            use_numpy=self.address['numpy'],
+            deadband=self.address['deadband'],
+            rel_deadband=self.address['rel_deadband'])
         self.symbol.set_connection(self)
+        self.startup = ChannelStartup.instance()
+        self.startup.add(self)
+
+    def queue_new_value(self, payload):
+        'Queue a value for the next display update, replacing any pending'
+        with self._pending_lock:
+            if self._pending is None:
+                self._pending = payload
+            else:
+                if 'VALUE' in self._pending and 'VALUE' in payload:
+                    # Connection state changes alone supersede no value
+                    self.dropped += 1
+                self._pending.update(payload)
+        self.updater.add_pending(self)
+        if not self._has_value and 'VALUE' in payload:
+            self._has_value = True
+            self.startup.first_value(self)
+
+    def flush(self):
+        'Send the pending value, if any; called in the GUI thread'
+        with self._pending_lock:
+            payload, self._pending = self._pending, None
+
+        if payload is not None:
+            self.send_new_value(payload)
 
     def send_new_value(self, payload):
         self.data.update(payload)
@@ -56,47 +293,187 @@ class Connection(PyDMConnection):
 
     def receive_from_channel(self, payload):
         value = payload['VALUE']
-        self.symbol.write(value)
+        # Do not block the GUI; superseded values are never sent
+        future = self.symbol.write_async(value)
+        future.add_done_callback(self._write_done)
+
+    def _write_done(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error('Failed to write to %s: %s', self.symbol_name,
+                         future.exception())
 
     def close(self):
         print('connection closed', self.symbol_name)
-        self.plc.clear_symbol(self.symbol_name)
+        self.closed = True
+        self.updater.discard(self)
+        self.startup.discard(self)
+        self.plc.clear_symbol(self.symbol)
         super().close()
 
 
+class SymbolTableModel(QtCore.QAbstractTableModel):
+    '''
+    Table model over a `SymbolIndex`
+
+    Rows matching the filter are exposed incrementally, `BROWSER_FETCH_SIZE`
+    at a time, as the view requests them.
+    '''
+    headers = ('Name', 'Type', 'Comment')
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.symbol_index = SymbolIndex([])
+        self.filter_text = ''
+        self._rows = range(0)
+        self._fetched = 0
+
+    def set_symbol_index(self, symbol_index):
+        'Show the symbols of `symbol_index`, keeping the current filter'
+        self.symbol_index = symbol_index
+        self.set_filter(self.filter_text)
+
+    def set_filter(self, text):
+        'Only show symbols matching all words of `text` in name or type'
+        self.beginResetModel()
+        self.filter_text = text
+        self._rows = self.symbol_index.search(text)
+        self._fetched = min(len(self._rows), BROWSER_FETCH_SIZE)
+        self.endResetModel()
+
+    @property
+    def match_count(self):
+        'Number of symbols matching the filter'
+        return len(self._rows)
+
+    def entry(self, row):
+        'The upload.SymbolEntry of `row`'
+        return self.symbol_index.entries[self._rows[row]]
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else self._fetched
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and self._fetched < len(self._rows)
+
+    def fetchMore(self, parent):
+        count = min(len(self._rows) - self._fetched, BROWSER_FETCH_SIZE)
+        if parent.isValid() or count <= 0:
+            return
+        self.beginInsertRows(QtCore.QModelIndex(), self._fetched,
+                             self._fetched + count - 1)
+        self._fetched += count
+        self.endInsertRows()
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or role not in (QtCore.Qt.DisplayRole,
+                                               QtCore.Qt.ToolTipRole):
+            return None
+        entry = self.entry(index.row())
+        return (entry.name, entry.type_name, entry.comment)[index.column()]
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if (role == QtCore.Qt.DisplayRole and
+                orientation == QtCore.Qt.Horizontal):
+            return self.headers[section]
+        return None
+
+
 class AdsBrowser(QtWidgets.QDialog):
     symbol_selected = QtCore.Signal(dict)
+    # Emitted from the PLC thread, delivered in the GUI thread
+    _symbols_loaded = QtCore.Signal(object)
+    _load_failed = QtCore.Signal(str)
 
     def __init__(self, ip_address, ams_id, port, *, parent=None):
         super().__init__(parent=parent)
         self.plc = get_connection(ip_address, ams_id, port)
-        self.plc.ads.open()
+        self.plc.open()
+
+        self.model = SymbolTableModel(self)
+        self.filter_edit = QtWidgets.QLineEdit()
+        self.filter_edit.setPlaceholderText('Filter by name or type')
+        self.filter_edit.setClearButtonEnabled(True)
+        self.status_label = QtWidgets.QLabel()
+
+        self.symbol_table = QtWidgets.QTableView()
+        self.symbol_table.setModel(self.model)
+        self.symbol_table.setSelectionBehavior(
+            QtWidgets.QAbstractItemView.SelectRows)
+        self.symbol_table.horizontalHeader().setStretchLastSection(True)
+        self.symbol_table.doubleClicked.connect(self._row_activated)
+
+        # Filter once typing pauses, not on every key
+        self._filter_timer = QtCore.QTimer(self)
+        self._filter_timer.setSingleShot(True)
+        self._filter_timer.setInterval(BROWSER_FILTER_DELAY)
+        self._filter_timer.timeout.connect(self._apply_filter)
+        self.filter_edit.textChanged.connect(
+            lambda text: self._filter_timer.start())
 
-        self.symbol_table = QtWidgets.QTableWidget()
-        self.symbol_table.setColumnCount(3)
         self.layout = QtWidgets.QVBoxLayout()
+        self.layout.addWidget(self.filter_edit)
         self.layout.addWidget(self.symbol_table)
+        self.layout.addWidget(self.status_label)
         self.setLayout(self.layout)
 
+        self._symbols_loaded.connect(self._set_symbols)
+        self._load_failed.connect(self._show_error)
         self.update_symbols()
 
     def closeEvent(self, ev):
         super().closeEvent(ev)
-        self.plc.ads.close()
+        # The connection may be shared, e.g., through the proxy
+        self.plc.add_to_queue(self.plc.close_if_unused)
 
     def update_symbols(self):
-        self.symbols = enumerate_plc_symbols(self.plc.ads)
+        'Upload the symbol table and build its index on the PLC thread'
+        self.status_label.setText('Loading symbols...')
+        future = self.plc.submit(
+            lambda: SymbolIndex(self.plc.load_symbol_table()))
+        future.add_done_callback(self._upload_done)
 
-        self.symbol_table.clear()
-        self.symbol_table.setRowCount(len(self.symbols))
-        table = self.symbol_table
-        table.setHorizontalHeaderLabels(['Name', 'Type', 'Comment'])
-        table.setSizeAdjustPolicy(
-            QtWidgets.QAbstractScrollArea.AdjustToContents)
-        for row, (symbol_name, info) in enumerate(self.symbols.items()):
-            table.setItem(row, 0, QtWidgets.QTableWidgetItem(symbol_name))
-            table.setItem(row, 1, QtWidgets.QTableWidgetItem(info['type']))
-            table.setItem(row, 2, QtWidgets.QTableWidgetItem(info['comment']))
+    def _upload_done(self, future):
+        try:
+            try:
+                symbol_index = future.result()
+            except Exception as ex:
+                logger.exception('Failed to upload the symbol table')
+                self._load_failed.emit(str(ex))
+            else:
+                self._symbols_loaded.emit(symbol_index)
+        except RuntimeError:
+            # The browser was closed and deleted in the meantime
+            ...
+
+    def _set_symbols(self, symbol_index):
+        self.model.set_symbol_index(symbol_index)
+        self.symbol_table.resizeColumnsToContents()
+        self._update_status()
+
+    def _show_error(self, message):
+        self.status_label.setText(f'Failed to load symbols: {message}')
+
+    def _apply_filter(self):
+        self.model.set_filter(self.filter_edit.text())
+        self._update_status()
+
+    def _update_status(self):
+        total = len(self.model.symbol_index)
+        if self.model.filter_text.strip():
+            self.status_label.setText(
+                f'{self.model.match_count} of {total} symbols')
+        else:
+            self.status_label.setText(f'{total} symbols')
+
+    def _row_activated(self, index):
+        entry = self.model.entry(index.row())
+        self.symbol_selected.emit({'name': entry.name,
+                                   'type': entry.type_name,
+                                   'comment': entry.comment,
+                                   'entry': entry})
 
 
 class AdsParameterEditor(BaseParameterEditor):
@@ -156,9 +533,17 @@ class AdsParameterEditor(BaseParameterEditor):
         port = self.port_widget.text() or None
         symbol = self.symbol_widget.text() or None
         poll_rate = self.poll_rate_widget.text() or None
+        try:
+            # Options without widgets of their own, e.g., deadbands
+            info = self.address_info
+        except Exception:
+            options = {}
+        else:
+            options = {key: info[key] for key in ADDRESS_OPTIONS}
         try:
             address = make_address(ip_address, ams_id, port=port,
-                                   symbol=symbol, poll_rate=poll_rate)
+                                   symbol=symbol, poll_rate=poll_rate,
+                                   **options)
         except Exception:
             logger.exception('Unable to make address')
             return
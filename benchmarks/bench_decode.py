@@ -0,0 +1,116 @@
+'''
+Notifications decoded per second, before and after per-symbol decoders
+
+No PLC is required; notifications are built in memory.  From the repository
+root::
+
+    PYTHONPATH=. python benchmarks/bench_decode.py
+
+Note that the legacy implementation did not decode arrays at all (it returned
+a bytearray), so the array case compares against a list of the elements as
+`Symbol.read` returns it.
+'''
+import argparse
+import ctypes
+import struct
+import time
+
+import pyads
+from pyads import constants, structs
+
+from ads_pcds.ads import get_decoder, notification_data
+
+
+def legacy_unpack_notification(notification, plc_datatype):
+    'unpack_notification as it was prior to per-symbol decoders'
+    contents = notification.contents
+    data_size = contents.cbSampleSize
+    data = (ctypes.c_ubyte * data_size).from_address(
+        ctypes.addressof(contents) +
+        structs.SAdsNotificationHeader.data.offset)
+
+    datatype_map = {
+        constants.PLCTYPE_BOOL: "<?",
+        constants.PLCTYPE_BYTE: "<c",
+        constants.PLCTYPE_DINT: "<i",
+        constants.PLCTYPE_DWORD: "<I",
+        constants.PLCTYPE_INT: "<h",
+        constants.PLCTYPE_LREAL: "<d",
+        constants.PLCTYPE_REAL: "<f",
+        constants.PLCTYPE_SINT: "<b",
+        constants.PLCTYPE_UDINT: "<L",
+        constants.PLCTYPE_UINT: "<H",
+        constants.PLCTYPE_USINT: "<B",
+        constants.PLCTYPE_WORD: "<H",
+    }
+
+    if plc_datatype == constants.PLCTYPE_STRING:
+        value = bytearray(data).split(b"\0", 1)[0].decode("utf-8")
+    elif issubclass(plc_datatype, ctypes.Structure):
+        value = plc_datatype()
+        fit_size = min(data_size, ctypes.sizeof(value))
+        ctypes.memmove(ctypes.addressof(value), ctypes.addressof(data),
+                       fit_size)
+    elif issubclass(plc_datatype, ctypes.Array):
+        # previously `bytearray(data)`; decode as Symbol.read did for arrays
+        value = list(plc_datatype.from_buffer_copy(bytearray(data)))
+    elif plc_datatype not in datatype_map:
+        value = bytearray(data)
+    else:
+        value, = struct.unpack(datatype_map[plc_datatype], bytearray(data))
+
+    timestamp = pyads.filetimes.filetime_to_dt(contents.nTimeStamp)
+    return timestamp, value
+
+
+def make_notification(payload):
+    'Build an in-memory notification with the given payload'
+    offset = structs.SAdsNotificationHeader.data.offset
+    buffer = ctypes.create_string_buffer(offset + max(len(payload), 1))
+    header = structs.SAdsNotificationHeader.from_buffer(buffer)
+    header.hNotification = 1
+    header.nTimeStamp = 132000000000000000
+    header.cbSampleSize = len(payload)
+    ctypes.memmove(ctypes.addressof(buffer) + offset, payload, len(payload))
+    # keep the buffer alive alongside the pointer
+    return buffer, ctypes.pointer(header)
+
+
+def rate(func, count):
+    t0 = time.perf_counter()
+    for _ in range(count):
+        func()
+    return count / (time.perf_counter() - t0)
+
+
+CASES = [
+    ('DINT', constants.PLCTYPE_DINT, struct.pack('<i', 42)),
+    ('LREAL', constants.PLCTYPE_LREAL, struct.pack('<d', 1.5)),
+    ('STRING(80)', constants.PLCTYPE_STRING, b'hello'.ljust(81, b'\0')),
+    ('ARRAY[1..1000] OF REAL', constants.PLCTYPE_REAL * 1000,
+     struct.pack('<1000f', *range(1000))),
+]
+
+
+def main(count):
+    print(f'{"type":<24} {"before":>12} {"after":>12} {"speedup":>8}')
+    for name, data_type, payload in CASES:
+        _buffer, notification = make_notification(payload)
+        decode = get_decoder(data_type, len(payload))
+
+        def after():
+            timestamp, data = notification_data(notification)
+            return timestamp, decode(data)
+
+        before = rate(
+            lambda: legacy_unpack_notification(notification, data_type),
+            count)
+        after = rate(after, count)
+        print(f'{name:<24} {before:10.0f}/s {after:10.0f}/s '
+              f'{after / before:7.2f}x')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--count', type=int, default=100000)
+    main(parser.parse_args().count)
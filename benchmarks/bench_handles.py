@@ -0,0 +1,63 @@
+'''
+Compare reads per second by name and by cached handle
+
+No PLC is required; `ads_pcds.fake.FakeConnection` serves all requests,
+with a simulated round-trip time.  From the repository root::
+
+    PYTHONPATH=. python benchmarks/bench_handles.py --reads 2000
+
+Reads by name acquire and release a handle around each read, as
+`pyads.Connection.read_by_name` does.
+'''
+import argparse
+import ctypes
+import time
+
+from pyads import constants
+
+from ads_pcds.ads import (ADST_Type, Plc, get_symbol_handle,
+                          release_symbol_handle)
+from ads_pcds.fake import FakeConnection, FakeVariable
+
+
+def rate(func, count):
+    t0 = time.perf_counter()
+    for _ in range(count):
+        func()
+    return count / (time.perf_counter() - t0)
+
+
+def main(reads, latency=0.0005):
+    conn = FakeConnection(latency=latency)
+    conn.add_variable(FakeVariable('Main.iValue', ADST_Type.INT32, 42))
+
+    def read_by_name():
+        handle = get_symbol_handle(conn, 'Main.iValue')
+        try:
+            return conn.read(constants.ADSIGRP_SYM_VALBYHND, handle,
+                             ctypes.c_int32)
+        finally:
+            release_symbol_handle(conn, handle)
+
+    plc = Plc('127.0.0.1', conn._adr.netid, conn._adr.port, connection=conn)
+    try:
+        symbol = plc.get_symbol('Main.iValue', None)
+        symbol.read()   # acquire the handle outside of the timing
+
+        by_name = rate(read_by_name, reads)
+        by_handle = rate(symbol.read, reads)
+    finally:
+        plc.stop()
+
+    print(f'reads by name:   {by_name:10.1f} / sec')
+    print(f'reads by handle: {by_handle:10.1f} / sec')
+    print(f'speedup:         {by_handle / by_name:10.2f}x')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--reads', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.0005,
+                        help='Simulated ADS round-trip time [sec]')
+    args = parser.parse_args()
+    main(args.reads, latency=args.latency)
@@ -0,0 +1,348 @@
+'''
+Benchmark suite against an in-process fake PLC
+
+No PLC or AMS router is required; `ads_pcds.fake.FakeConnection` serves all
+requests.  Results are written as JSON, for tracking regressions.  From the
+repository root::
+
+    PYTHONPATH=. python benchmarks/bench_suite.py --output results.json
+    PYTHONPATH=. python benchmarks/bench_suite.py --quick
+
+Measured:
+
+* enumeration: symbol table upload and parsing, without and with the cache
+* symbol_filter: building the symbol browser search index, and searching it
+* startup: time until N subscribed symbols have all received a value,
+  started one by one or in bulk with `Plc.start_symbols`
+* poll_throughput: values delivered per second, per poll rate group
+* notification_latency: from a value change to the consumer callback
+* memory: bytes per symbol for Symbol, AdsSignal and, if PyDM is
+  installed, SymbolForPydm
+'''
+import argparse
+import gc
+import itertools
+import json
+import os
+import platform
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from ads_pcds import ads
+from ads_pcds.ads import ADST_Type, Symbol
+from ads_pcds.fake import FakeConnection, FakeVariable
+
+
+_AMS_IDS = (f'127.0.0.{idx}.1.1' for idx in itertools.count(1))
+
+
+def make_connection(num_symbols, *, array_size=100, latency=0.0):
+    '''
+    A fake PLC with `num_symbols` symbols
+
+    Nine in ten are scalars, the rest arrays of `array_size` doubles.
+    '''
+    conn = FakeConnection(next(_AMS_IDS), latency=latency)
+    for idx in range(num_symbols):
+        if idx % 10 == 9:
+            conn.add_variable(FakeVariable(
+                f'MAIN.aArray{idx}', ADST_Type.REAL64,
+                [float(idx)] * array_size, array_size=array_size,
+                type_name=f'ARRAY [1..{array_size}] OF LREAL'))
+        else:
+            conn.add_variable(FakeVariable(
+                f'MAIN.fValue{idx}', ADST_Type.REAL64, float(idx),
+                comment=f'Value number {idx}'))
+    return conn
+
+
+def make_plc(conn):
+    return ads.get_connection('127.0.0.1', conn._adr.netid, conn._adr.port,
+                              connection=conn)
+
+
+def stop_plc(plc):
+    plc.stop()
+    ads._PLCS.pop((plc.ip_address, plc.ams_id, plc.port), None)
+
+
+def percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {}
+
+    def pick(q):
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    return {
+        'count': len(values),
+        'mean': statistics.mean(values),
+        'p50': pick(0.5),
+        'p90': pick(0.9),
+        'p99': pick(0.99),
+        'max': values[-1],
+    }
+
+
+class _CountingSymbol(Symbol):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.updates = 0
+        self.first_update = threading.Event()
+
+    def value_updated(self, timestamp, value):
+        self.updates += 1
+        self.first_update.set()
+
+
+class _DeliveryCountingSymbol(_CountingSymbol):
+    'Counts every value delivered, including unchanged ones'
+
+    def _update(self, timestamp, value):
+        self.updates += 1
+        self.first_update.set()
+
+
+def bench_enumeration(num_symbols):
+    conn = make_connection(num_symbols)
+    conn.open()
+    results = {'symbols': num_symbols}
+    with tempfile.TemporaryDirectory() as cache_path:
+        os.environ['ADS_PCDS_CACHE'] = cache_path
+        try:
+            t0 = time.perf_counter()
+            ads.enumerate_plc_symbols(conn, use_cache=False)
+            results['uncached_sec'] = time.perf_counter() - t0
+
+            # Fill the cache, then time loading from it
+            ads.upload_symbol_table(conn)
+            t0 = time.perf_counter()
+            ads.enumerate_plc_symbols(conn)
+            results['cached_sec'] = time.perf_counter() - t0
+        finally:
+            del os.environ['ADS_PCDS_CACHE']
+    return results
+
+
+def bench_symbol_filter(num_symbols, queries=('fvalue1', 'array', 'lreal 99',
+                                                'no such symbol')):
+    conn = make_connection(num_symbols)
+    conn.open()
+    entries = ads.upload_symbol_table(conn, use_cache=False)
+    t0 = time.perf_counter()
+    index = ads.SymbolIndex(entries)
+    results = {'symbols': num_symbols,
+               'build_sec': time.perf_counter() - t0,
+               'search_sec': {}}
+    for query in queries:
+        t0 = time.perf_counter()
+        rows = index.search(query)
+        results['search_sec'][query] = {
+            'sec': time.perf_counter() - t0,
+            'matches': len(rows),
+        }
+    return results
+
+
+def bench_startup(num_symbols, poll_rate, *, latency, bulk=False,
+                  timeout=60.0):
+    conn = make_connection(num_symbols, latency=latency)
+    plc = make_plc(conn)
+    try:
+        requests_before = conn.requests
+        t0 = time.perf_counter()
+        symbols = [plc.get_symbol(var.name, poll_rate, cls=_CountingSymbol)
+                   for var in conn.variables.values()]
+        if bulk:
+            plc.start_symbols(symbols)
+        else:
+            for symbol in symbols:
+                symbol.start()
+        created = time.perf_counter()
+
+        deadline = time.monotonic() + timeout
+        for symbol in symbols:
+            if not symbol.first_update.wait(deadline - time.monotonic()):
+                break
+        done = time.perf_counter()
+        received = sum(symbol.first_update.is_set() for symbol in symbols)
+        return {
+            'symbols': num_symbols,
+            'poll_rate': poll_rate,
+            'bulk': bulk,
+            'latency_sec': latency,
+            'create_sec': created - t0,
+            'first_values_sec': done - t0,
+            'received': received,
+            'ads_requests': conn.requests - requests_before,
+        }
+    finally:
+        stop_plc(plc)
+
+
+def bench_poll_throughput(symbols_per_rate, rates, duration):
+    conn = make_connection(symbols_per_rate * len(rates))
+    plc = make_plc(conn)
+    try:
+        names = iter(conn.variables.values())
+        groups = {}
+        for rate in rates:
+            groups[rate] = [
+                plc.get_symbol(next(names).name, rate,
+                               cls=_DeliveryCountingSymbol)
+                for _ in range(symbols_per_rate)
+            ]
+
+        for symbols in groups.values():
+            for symbol in symbols:
+                symbol.start()
+
+        time.sleep(max(rates))
+        before = {rate: sum(symbol.updates for symbol in symbols)
+                  for rate, symbols in groups.items()}
+        t0 = time.perf_counter()
+        time.sleep(duration)
+        elapsed = time.perf_counter() - t0
+
+        results = {}
+        for rate, symbols in groups.items():
+            values = sum(symbol.updates for symbol in symbols) - before[rate]
+            group = plc.poll_groups[rate]
+            results[str(rate)] = {
+                'symbols': symbols_per_rate,
+                'values_per_sec': values / elapsed,
+                'expected_per_sec': symbols_per_rate / rate,
+                'cycle_sec': group.last_duration,
+                'overruns': group.overruns,
+            }
+        return results
+    finally:
+        stop_plc(plc)
+
+
+def bench_notification_latency(num_symbols, updates):
+    conn = make_connection(num_symbols)
+    plc = make_plc(conn)
+    latencies = []
+    changed_at = {}
+
+    class LatencySymbol(Symbol):
+        def value_updated(self, timestamp, value):
+            t0 = changed_at.get(self.symbol)
+            if t0 is not None:
+                latencies.append(time.perf_counter() - t0)
+
+    try:
+        variables = [var for var in conn.variables.values()
+                     if var.array_size == 1]
+        symbols = [plc.get_symbol(var.name, None, cls=LatencySymbol)
+                   for var in variables]
+        for symbol in symbols:
+            symbol.start()
+        plc.submit(lambda: None).result()
+
+        for idx in range(updates):
+            var = variables[idx % len(variables)]
+            changed_at[var.name] = time.perf_counter()
+            var.set_value(float(idx + 1e6))
+
+        return {
+            'symbols': len(symbols),
+            'updates': updates,
+            'latency_sec': percentiles(latencies),
+        }
+    finally:
+        stop_plc(plc)
+
+
+def _measure_memory(create, count):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        objects = [create(idx) for idx in range(count)]
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del objects
+    return (after - before) / count
+
+
+def bench_memory(count):
+    conn = make_connection(count)
+    plc = make_plc(conn)
+    names = [var.name for var in conn.variables.values()]
+    results = {}
+    try:
+        results['Symbol'] = _measure_memory(
+            lambda idx: plc.get_symbol(names[idx], None), count)
+        plc.symbols.clear()
+        plc.variables.clear()
+
+        from ads_pcds import AdsSignal
+        results['AdsSignal'] = _measure_memory(
+            lambda idx: AdsSignal(names[idx], ip_address=plc.ip_address,
+                                  ams_id=plc.ams_id, port=plc.port,
+                                  name=f'sig{idx}'),
+            count)
+        plc.symbols.clear()
+        plc.variables.clear()
+
+        try:
+            from ads_plugin import SymbolForPydm
+        except ImportError as ex:
+            results['SymbolForPydm'] = f'skipped: {ex}'
+        else:
+            results['SymbolForPydm'] = _measure_memory(
+                lambda idx: plc.get_symbol(names[idx], None,
+                                           cls=SymbolForPydm),
+                count)
+    finally:
+        stop_plc(plc)
+    return {'count': count, 'bytes_per_symbol': results}
+
+
+def main(output=None, quick=False, latency=0.0005):
+    sizes = (1000, ) if quick else (1000, 10000)
+    results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.time(),
+        'enumeration': [bench_enumeration(size) for size in sizes],
+        'symbol_filter': bench_symbol_filter(10000 if quick else 100000),
+        'startup': [
+            bench_startup(size, poll_rate, latency=latency, bulk=bulk)
+            for size in sizes
+            for poll_rate in (None, 1.0)
+            for bulk in (False, True)
+        ],
+        'poll_throughput': bench_poll_throughput(
+            100 if quick else 500, rates=(0.01, 0.1, 1.0),
+            duration=2.0 if quick else 5.0),
+        'notification_latency': bench_notification_latency(
+            100, 2000 if quick else 20000),
+        'memory': bench_memory(1000 if quick else 5000),
+    }
+
+    text = json.dumps(results, indent=2)
+    if output is None:
+        print(text)
+    else:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--output', '-o', help='JSON output filename')
+    parser.add_argument('--quick', action='store_true',
+                        help='Fewer symbols and shorter runs')
+    parser.add_argument('--latency', type=float, default=0.0005,
+                        help='Simulated ADS round-trip time [sec]')
+    args = parser.parse_args()
+    main(output=args.output, quick=args.quick, latency=args.latency)
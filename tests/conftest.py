@@ -0,0 +1,58 @@
+import time
+
+import pytest
+
+from ads_pcds.ads import Plc, Symbol
+from ads_pcds.fake import FakeConnection
+
+
+class RecordingSymbol(Symbol):
+    'A Symbol recording its value updates'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values = []
+
+    def value_updated(self, timestamp, value):
+        self.values.append(value)
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError('Condition not met')
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def wait_for():
+    'Wait for condition() to become true, or raise TimeoutError'
+    return _wait_for
+
+
+@pytest.fixture
+def recording_symbol():
+    return RecordingSymbol
+
+
+@pytest.fixture
+def conn():
+    return FakeConnection()
+
+
+@pytest.fixture
+def plc(conn):
+    'A Plc on `conn`, not shared through `ads.get_connection`'
+    plc = Plc('127.0.0.1', conn._adr.netid, conn._adr.port, connection=conn)
+    plc.open()
+    yield plc
+    plc.stop()
+
+
+@pytest.fixture
+def sync(plc):
+    'Wait until the PLC thread has run all jobs queued so far'
+    def sync():
+        plc.submit(lambda: None).result(timeout=5)
+    return sync
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from ads_pcds.ads import ADST_Type
+from ads_pcds.archive import Archiver, ArchiveReader, _ColumnWriter
+from ads_pcds.fake import FakeVariable
+
+
+@pytest.fixture
+def archiver(tmp_path):
+    archiver = Archiver(str(tmp_path), flush_period=0.05)
+    yield archiver
+    archiver.stop()
+
+
+def read(plc, path, symbol, **kwargs):
+    return ArchiveReader(str(path)).read(plc.ams_id, plc.port, symbol,
+                                         **kwargs)
+
+
+def test_record_and_read(conn, plc, sync, tmp_path, archiver):
+    var = conn.add_variable(FakeVariable('MAIN.fValue', ADST_Type.REAL64))
+    conn.add_variable(FakeVariable('MAIN.sName', ADST_Type.STRING, 'x',
+                                   size=16))
+    archiver.add(plc, 'MAIN.fValue')
+    archiver.add(plc, 'MAIN.sName')
+    sync()
+    for value in range(1, 5):
+        var.set_value(float(value))
+    conn.variables['main.sname'].set_value('µm')
+    archiver.stop()
+
+    times, values = read(plc, tmp_path, 'MAIN.fValue')
+    assert list(values) == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert np.all(np.diff(times) >= 0)
+    _, values = read(plc, tmp_path, 'MAIN.fValue', start=times[2],
+                     stop=times[4])
+    assert len(values) == 2
+    assert list(read(plc, tmp_path, 'MAIN.sName')[1]) == [
+        b'x', 'µm'.encode('utf-8')]
+
+
+def test_rejects_second_settings(conn, plc, archiver):
+    conn.add_variable(FakeVariable('MAIN.fValue', ADST_Type.REAL64))
+    symbol = archiver.add(plc, 'MAIN.fValue')
+    assert archiver.add(plc, 'MAIN.fValue') is symbol
+    with pytest.raises(ValueError):
+        archiver.add(plc, 'main.fvalue', 0.1)
+
+
+def test_timestamps_never_decrease(tmp_path):
+    dtype = np.dtype('<f8')
+    writer = _ColumnWriter(str(tmp_path), 'MAIN.f', dtype, chunk_rows=3)
+    writer.append([1.0, 3.0, 2.0], [1.0, 2.0, 3.0])
+    writer.close()
+    # Resumed, with the clock set back
+    writer = _ColumnWriter(str(tmp_path), 'MAIN.f', dtype, chunk_rows=3)
+    writer.append([0.5, 4.0], [4.0, 5.0])
+    writer.close()
+
+    times = np.concatenate([
+        np.fromfile(str(tmp_path / f'{chunk:06d}.time'), '<f8')
+        for chunk in (0, 1)])
+    assert list(times) == [1.0, 3.0, 3.0, 3.0, 4.0]
+
+
+def test_invalidated_type_resolved(conn, plc, sync, tmp_path, archiver):
+    var = conn.add_variable(FakeVariable('MAIN.nValue', ADST_Type.INT32, 1))
+    symbol = archiver.add(plc, 'MAIN.nValue')
+    sync()
+    symbol.variable.data_type = None
+    var.set_value(2)
+    archiver.stop()
+    assert list(read(plc, tmp_path, 'MAIN.nValue')[1]) == [1, 2]
@@ -0,0 +1,91 @@
+import time
+
+import pytest
+
+from ads_pcds.ads import ADST_Type
+from ads_pcds.fake import FakeVariable
+
+
+@pytest.fixture
+def budget(conn, plc):
+    for idx in range(4):
+        conn.add_variable(FakeVariable(f'MAIN.f{idx}', ADST_Type.REAL64,
+                                       float(idx)))
+    budget = plc.budget
+    budget.limit = 2
+    budget.fast_change_rate = 1.0
+    # Only rebalanced by the tests
+    budget.rebalance_period = 1000.0
+    return budget
+
+
+def start(plc, sync, names, **kwargs):
+    symbols = [plc.get_symbol(name, None, **kwargs) for name in names]
+    for symbol in symbols:
+        symbol.start()
+    sync()
+    sync()
+    return symbols
+
+
+def notified(plc):
+    return sorted(variable.name for variable in plc.variables.values()
+                  if variable.notification_handle is not None)
+
+
+def rebalance(plc, sync, changes):
+    'Rebalance with `changes` of each variable over the last 1000 seconds'
+    def run():
+        budget = plc.budget
+        for variable in budget.notified | budget.polled:
+            variable._changes = changes.get(variable.name, 0)
+            variable._polls = 10 ** 6
+        budget._last_rebalance = time.monotonic() - 1000.0
+        budget.rebalance()
+
+    plc.submit(run).result(timeout=5)
+    sync()
+
+
+def test_polled_beyond_limit(conn, plc, sync, budget):
+    start(plc, sync, [f'MAIN.f{idx}' for idx in range(4)])
+    assert notified(plc) == ['MAIN.f0', 'MAIN.f1']
+    assert len(conn.notifications) == 2
+    polled = plc.get_variable('MAIN.f3')
+    assert polled.poll_rate == budget.poll_rate
+    assert budget.polled == {plc.get_variable('MAIN.f2'), polled}
+
+
+def test_release_promotes(plc, sync, budget):
+    symbols = start(plc, sync, [f'MAIN.f{idx}' for idx in range(3)])
+    symbols[0].stop()
+    sync()
+    sync()
+    assert notified(plc) == ['MAIN.f1', 'MAIN.f2']
+    assert not budget.polled
+
+
+def test_rebalance(plc, sync, budget):
+    start(plc, sync, [f'MAIN.f{idx}' for idx in range(4)])
+    # f0 changes most often, f2 least; f1 changes faster than 1 Hz
+    rebalance(plc, sync, {'MAIN.f0': 800, 'MAIN.f1': 5000, 'MAIN.f2': 10,
+                          'MAIN.f3': 300})
+    assert notified(plc) == ['MAIN.f2', 'MAIN.f3']
+
+    # Within the hysteresis: not swapped back
+    rebalance(plc, sync, {'MAIN.f0': 300, 'MAIN.f1': 5000, 'MAIN.f2': 10,
+                          'MAIN.f3': 500})
+    assert notified(plc) == ['MAIN.f2', 'MAIN.f3']
+
+
+def test_latency_sensitive_promoted(plc, sync, budget):
+    start(plc, sync, ['MAIN.f0', 'MAIN.f1', 'MAIN.f2'])
+    assert notified(plc) == ['MAIN.f0', 'MAIN.f1']
+    # Polled before, then wanted latency-sensitive
+    start(plc, sync, ['MAIN.f2'], latency_sensitive=True)
+    assert 'MAIN.f2' in notified(plc)
+    assert len(notified(plc)) == 2
+
+    # Kept through rebalancing, even when changing fast
+    rebalance(plc, sync, {'MAIN.f2': 5000})
+    assert 'MAIN.f2' in notified(plc)
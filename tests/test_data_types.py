@@ -0,0 +1,93 @@
+import ctypes
+import struct
+
+import pytest
+
+from ads_pcds.ads import (ADST_Type, DataTypes, Symbol,
+                          upload_data_type_table)
+from ads_pcds.fake import FakeVariable, pack_data_type_entry
+
+AXIS_RAW = struct.pack('<?7xdI16s3hhi', True, 1.5, 7, b'axis1', 1, 2, 3, 9,
+                       2)
+
+
+@pytest.fixture(autouse=True)
+def cache_path(tmp_path, monkeypatch):
+    monkeypatch.setenv('ADS_PCDS_CACHE', str(tmp_path / 'cache'))
+
+
+@pytest.fixture
+def types(conn):
+    conn.add_data_type(pack_data_type_entry('ST_Inner', 6, sub_items=[
+        pack_data_type_entry('nA', 2, type_name='INT',
+                             ads_type=ADST_Type.INT16),
+        pack_data_type_entry('nB', 4, type_name='E_Mode',
+                             ads_type=ADST_Type.INT32, offset=2),
+    ]))
+    conn.add_data_type(pack_data_type_entry(
+        'E_Mode', 4, type_name='DINT', ads_type=ADST_Type.INT32))
+    conn.add_data_type(pack_data_type_entry('ST_Axis', 48, sub_items=[
+        pack_data_type_entry('bEnable', 1, type_name='BOOL',
+                             ads_type=ADST_Type.BIT),
+        pack_data_type_entry('fPos', 8, type_name='LREAL',
+                             ads_type=ADST_Type.REAL64, offset=8),
+        pack_data_type_entry('nErr', 4, type_name='UDINT',
+                             ads_type=ADST_Type.UINT32, offset=16),
+        pack_data_type_entry('sName', 16, type_name='STRING(15)',
+                             ads_type=ADST_Type.STRING, offset=20),
+        pack_data_type_entry('aVals', 6, type_name='ARRAY [1..3] OF INT',
+                             ads_type=ADST_Type.INT16, offset=36,
+                             array_info=[(1, 3)]),
+        pack_data_type_entry('stInner', 6, type_name='ST_Inner', offset=42),
+    ]))
+    conn.add_data_type(pack_data_type_entry(
+        'ST_Unknown', 12, sub_items=[
+            pack_data_type_entry('nA', 2, type_name='INT',
+                                 ads_type=ADST_Type.INT16),
+            pack_data_type_entry('xB', 6, type_name='FB_Missing', offset=4),
+        ]))
+    conn.open()
+    return DataTypes(upload_data_type_table(conn, use_cache=False))
+
+
+def test_structure_layout(types):
+    axis = types['ST_Axis']
+    assert ctypes.sizeof(axis) == 48
+    value = axis.from_buffer_copy(AXIS_RAW)
+    assert (value.bEnable, value.fPos, value.nErr, value.sName) == (
+        True, 1.5, 7, b'axis1')
+    assert list(value.aVals) == [1, 2, 3]
+    assert (value.stInner.nA, value.stInner.nB) == (9, 2)
+    assert types['st_axis'] is axis
+
+
+def test_unresolved_members_keep_layout(types):
+    unknown = types['ST_Unknown']
+    assert ctypes.sizeof(unknown) == 12
+    assert [name for name, _ in unknown._fields_] == [
+        'nA', '_pad2', 'xB', '_pad10']
+    assert ctypes.sizeof(dict(unknown._fields_)['xB']) == 6
+
+
+def test_derived_type_names(types):
+    assert types['E_Mode'] is ctypes.c_int32
+    assert ctypes.sizeof(types['ARRAY [1..2] OF ST_Axis']) == 96
+    assert types['ARRAY [0..1, 1..3] OF INT']._length_ == 6
+    assert ctypes.sizeof(types['STRING(10)']) == 11
+    assert types.get('FB_Missing') is None
+    assert 'FB_Missing' not in types
+    with pytest.raises(KeyError):
+        types['FB_Missing']
+
+
+def test_read_write_structure(conn, plc, sync, types):
+    conn.add_variable(FakeVariable('MAIN.stAxis', ADST_Type.BIGTYPE,
+                                   AXIS_RAW, size=48, type_name='ST_Axis'))
+    symbol = plc.get_symbol('MAIN.stAxis', None, cls=Symbol)
+    value = symbol.read()
+    assert (value.fPos, value.stInner.nB) == (1.5, 2)
+    value.fPos = 9.25
+    symbol.write(value)
+    assert symbol.read().fPos == 9.25
+    assert bytes(conn.variables['main.staxis'].buffer)[8:16] == \
+        struct.pack('<d', 9.25)
@@ -0,0 +1,73 @@
+import math
+
+import numpy as np
+import pytest
+
+from ads_pcds.ads import ADST_Type, value_changed, _NO_VALUE
+from ads_pcds.fake import FakeVariable
+
+NAN = math.nan
+
+
+@pytest.mark.parametrize('old, new, kwargs, changed', [
+    (_NO_VALUE, 1.0, {}, True),
+    (1.0, 1.0, {}, False),
+    (1.0, 2.0, {}, True),
+    (1.0, 1.4, {'deadband': 0.5}, False),
+    (1.0, 1.6, {'deadband': 0.5}, True),
+    (100.0, 104.0, {'rel_deadband': 0.05}, False),
+    (100.0, 106.0, {'rel_deadband': 0.05}, True),
+    (100.0, 104.0, {'deadband': 5.0, 'rel_deadband': 0.01}, False),
+    (True, False, {'deadband': 5.0}, True),
+    ('a', 'b', {'deadband': 5.0}, True),
+    ([1, 2], [1, 2], {}, False),
+    ([1, 2], [1, 3], {}, True),
+])
+def test_scalar(old, new, kwargs, changed):
+    assert value_changed(old, new, **kwargs) is changed
+
+
+@pytest.mark.parametrize('kwargs', [{}, {'deadband': 0.5},
+                                    {'rel_deadband': 0.1}])
+@pytest.mark.parametrize('old, new, changed', [
+    (NAN, 1.0, True),
+    (1.0, NAN, True),
+    (NAN, NAN, False),
+    ([NAN, 1.0], [NAN, 1.0], False),
+    ([NAN, 1.0], [0.0, 1.0], True),
+])
+def test_nan(old, new, changed, kwargs):
+    assert value_changed(old, new, **kwargs) is changed
+    if isinstance(old, list):
+        assert value_changed(np.array(old), np.array(new),
+                             **kwargs) is changed
+
+
+@pytest.mark.parametrize('dtype', [np.uint8, np.int8, np.uint16])
+def test_integer_array_no_wraparound(dtype):
+    old, new = np.array([5, 3], dtype), np.array([3, 5], dtype)
+    assert not value_changed(old, new, deadband=3)
+    assert value_changed(old, new, deadband=1)
+
+
+def test_array_shape_and_deadband():
+    old = np.array([1.0, 2.0])
+    assert value_changed(old, np.array([1.0, 2.0, 3.0]))
+    assert not value_changed(old, np.array([1.1, 2.1]), deadband=0.2)
+    assert value_changed(old, np.array([1.1, 2.3]), deadband=0.2)
+    assert not value_changed(old, old.copy())
+
+
+def test_symbol_filters_updates(conn, plc, sync, recording_symbol):
+    var = conn.add_variable(FakeVariable('MAIN.fValue', ADST_Type.REAL64,
+                                         1.0))
+    symbol = plc.get_symbol('MAIN.fValue', None, cls=recording_symbol,
+                            deadband=0.5)
+    symbol.start()
+    sync()
+    for value in (1.2, 1.4, 2.0, NAN, NAN, 2.0):
+        var.set_value(value)
+    sync()
+    assert symbol.values[:2] == [1.0, 2.0]
+    assert math.isnan(symbol.values[2])
+    assert symbol.values[3:] == [2.0]
@@ -0,0 +1,58 @@
+from ads_pcds.ads import ADST_Type
+from ads_pcds.fake import FakeVariable
+
+
+def test_one_handle_per_variable(conn, plc, sync, recording_symbol):
+    var = conn.add_variable(FakeVariable('MAIN.nValue', ADST_Type.INT32, 1))
+    notified = plc.get_symbol('MAIN.nValue', None, cls=recording_symbol)
+    notified.start()
+    sync()
+    assert len(conn.handles) == 1
+    assert len(conn.notifications) == 1
+
+    notified.write(2)
+    assert notified.read() == 2
+    var.set_value(3)
+    assert notified.values == [1, 2, 3]
+    assert len(conn.handles) == 1
+
+    plc.clear_symbol(notified)
+    sync()
+    assert not conn.handles
+    assert not conn.notifications
+
+
+def test_reads_by_handle(conn, plc):
+    conn.add_variable(FakeVariable('MAIN.nValue', ADST_Type.INT32, 1))
+    variable = plc.get_variable('MAIN.nValue')
+    variable.read()
+    requests = conn.requests
+    for value in range(5):
+        variable.write(value)
+        assert variable.read() == value
+    assert conn.requests - requests == 10
+
+
+def test_online_change(conn, plc):
+    conn.add_variable(FakeVariable('MAIN.nValue', ADST_Type.INT32, 1))
+    variable = plc.get_variable('MAIN.nValue')
+    assert variable.read() == 1
+    conn.online_change()
+    variable.write(4)
+    assert variable.read() == 4
+    assert len(conn.handles) == 1
+
+
+def test_close_if_unused(conn, plc, sync, recording_symbol):
+    conn.add_variable(FakeVariable('MAIN.nValue', ADST_Type.INT32, 1))
+    symbol = plc.get_symbol('MAIN.nValue', None, cls=recording_symbol)
+    symbol.start()
+    plc.submit(plc.close_if_unused).result(timeout=5)
+    assert conn.is_open
+
+    plc.clear_symbol(symbol)
+    sync()
+    plc.submit(plc.close_if_unused).result(timeout=5)
+    assert not conn.is_open
+    # Reopened on demand
+    assert plc.get_variable('MAIN.nValue').read() == 1
@@ -0,0 +1,89 @@
+import logging
+import time
+
+from ads_pcds.ads import ADST_Type
+from ads_pcds.fake import FakeVariable
+
+
+class Counter:
+    def __init__(self, duration=0.0):
+        self.duration = duration
+        self.times = []
+
+    def __call__(self):
+        self.times.append(time.monotonic())
+        time.sleep(self.duration)
+
+
+def test_groups_at_own_rates(plc):
+    fast, slow = Counter(), Counter()
+    plc.add_to_poll_thread(0.02, fast)
+    plc.add_to_poll_thread(0.1, slow)
+    time.sleep(0.5)
+    plc.stop_polling(0.02, fast)
+    plc.stop_polling(0.1, slow)
+    assert 20 <= len(fast.times) <= 27
+    assert 4 <= len(slow.times) <= 7
+
+
+def test_no_drift(plc):
+    counter = Counter(duration=0.01)
+    plc.add_to_poll_thread(0.05, counter)
+    time.sleep(1.0)
+    plc.stop_polling(0.05, counter)
+    # Deadlines advance by the rate, not by the rate plus the cycle time
+    assert len(counter.times) >= 19
+
+
+def test_overrun(plc, caplog):
+    counter = Counter(duration=0.12)
+    with caplog.at_level(logging.WARNING, logger='ads_pcds.ads'):
+        plc.add_to_poll_thread(0.05, counter)
+        time.sleep(0.6)
+        plc.stop_polling(0.05, counter)
+    group_overran = any('overran' in record.getMessage()
+                        for record in caplog.records)
+    assert group_overran
+    # Missed cycles are skipped rather than run back to back
+    intervals = [b - a for a, b in zip(counter.times, counter.times[1:])]
+    assert intervals and min(intervals) >= 0.14
+
+
+def test_empty_group_removed(conn, plc, sync, recording_symbol):
+    counter = Counter()
+    plc.add_to_poll_thread(0.02, counter)
+    assert 0.02 in plc.poll_groups
+    plc.stop_polling(0.02, counter)
+    assert 0.02 not in plc.poll_groups
+    time.sleep(0.1)
+    count = len(counter.times)
+    time.sleep(0.1)
+    assert len(counter.times) == count
+
+    conn.add_variable(FakeVariable('MAIN.fValue', ADST_Type.REAL64))
+    symbol = plc.get_symbol('MAIN.fValue', 0.05, cls=recording_symbol)
+    symbol.start()
+    sync()
+    assert 0.05 in plc.poll_groups
+    symbol.stop()
+    sync()
+    assert 0.05 not in plc.poll_groups
+
+
+def test_call_later(plc, wait_for, caplog):
+    calls = []
+
+    def fail():
+        raise RuntimeError('failed')
+
+    with caplog.at_level(logging.ERROR, logger='ads_pcds.ads'):
+        plc.call_later(0.0, fail)
+        start = time.monotonic()
+        plc.call_later(0.1, calls.append, 'later')
+        plc.call_later(0.0, calls.append, 'now')
+        wait_for(lambda: len(calls) == 2)
+    assert calls == ['now', 'later']
+    assert time.monotonic() - start >= 0.1
+    assert 'Deferred call fail' in caplog.text
+    time.sleep(0.1)
+    assert calls == ['now', 'later']
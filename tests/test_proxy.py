@@ -0,0 +1,158 @@
+import itertools
+import logging
+import os
+import time
+
+import pytest
+
+from ads_pcds import ads
+from ads_pcds.ads import ADST_Type, Symbol
+from ads_pcds.fake import FakeConnection, FakeVariable
+from ads_pcds.proxy import ProxyPlc, ProxyServer
+
+
+_AMS_IDS = (f'127.0.1.{idx}.1.1' for idx in itertools.count(1))
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError('Condition not met')
+        time.sleep(0.01)
+
+
+class RecordingSymbol(Symbol):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values = []
+        self.connection_states = []
+
+    def value_updated(self, timestamp, value):
+        self.values.append(value)
+
+    def connection_changed(self, connected):
+        self.connection_states.append(connected)
+
+
+@pytest.fixture
+def fake_plc():
+    conn = FakeConnection(next(_AMS_IDS))
+    conn.add_variable(FakeVariable('MAIN.fValue', ADST_Type.REAL64, 1.0))
+    conn.add_variable(FakeVariable('MAIN.nValue', ADST_Type.INT32, 3))
+    plc = ads.get_connection('127.0.0.1', conn._adr.netid, conn._adr.port,
+                             connection=conn, proxy=False)
+    yield conn, plc
+    plc.stop()
+    ads._PLCS.pop((plc.ip_address, plc.ams_id, plc.port), None)
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = ProxyServer(str(tmp_path / 'proxy.sock'), authkey=b'k' * 32)
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def make_client(fake_plc, server):
+    conn, plc = fake_plc
+    clients = []
+
+    def make_client(authkey=server.authkey):
+        client = ProxyPlc(plc.ip_address, plc.ams_id, plc.port,
+                          path=server.path, authkey=authkey)
+        clients.append(client)
+        return client
+
+    yield make_client
+    for client in clients:
+        client.stop()
+
+
+def test_shared_subscription(fake_plc, make_client):
+    conn, plc = fake_plc
+    client1, client2 = make_client(), make_client()
+    symbol1 = client1.get_symbol('MAIN.fValue', None, cls=RecordingSymbol)
+    symbol2 = client2.get_symbol('MAIN.fValue', None, cls=RecordingSymbol)
+    symbol1.start()
+    symbol2.start()
+    wait_for(lambda: symbol1.values and symbol2.values)
+    assert symbol1.values == symbol2.values == [1.0]
+    assert len(conn.notifications) == 1
+
+    symbol2.write_async(5.0).result(timeout=5)
+    wait_for(lambda: symbol1.values[-1] == symbol2.values[-1] == 5.0)
+
+    client1.clear_symbol(symbol1)
+    client2.clear_symbol(symbol2)
+    wait_for(lambda: not conn.notifications)
+
+
+def test_start_symbols_together(fake_plc, make_client, monkeypatch):
+    conn, plc = fake_plc
+    started = []
+    start_symbols = plc.start_symbols
+
+    def record(symbols):
+        started.append(len(symbols))
+        return start_symbols(symbols)
+
+    monkeypatch.setattr(plc, 'start_symbols', record)
+    client = make_client()
+    symbols = [client.get_symbol(name, None, cls=RecordingSymbol)
+               for name in ('MAIN.fValue', 'MAIN.nValue', 'MAIN.missing')]
+    client.start_symbols(symbols).result(timeout=5)
+    wait_for(lambda: symbols[0].values and symbols[1].values and
+             False in symbols[2].connection_states)
+    assert started == [3]
+    assert symbols[0].values == [1.0] and symbols[1].values == [3]
+
+
+def test_read_and_write(make_client):
+    client = make_client()
+    assert client.get_variable('MAIN.nValue').read() == 3
+    client.get_variable('MAIN.nValue').write(7)
+    assert client.read_many(['MAIN.fValue', 'MAIN.nValue']) == [1.0, 7]
+
+
+def test_subscription_error(make_client, caplog):
+    client = make_client()
+    symbol = client.get_symbol('MAIN.missing', None, cls=RecordingSymbol)
+    with caplog.at_level(logging.ERROR):
+        symbol.start()
+        wait_for(lambda: False in symbol.connection_states)
+    assert 'MAIN.missing' in caplog.text
+    assert not symbol.values
+
+
+def test_rejects_wrong_key(make_client):
+    client = make_client(authkey=b'x' * 32)
+    time.sleep(0.2)
+    assert not client.connected
+    with pytest.raises(ConnectionError):
+        client.call_async('symbol_info', 'MAIN.fValue')
+
+
+def test_reconnect(fake_plc, tmp_path, make_client, server):
+    conn, plc = fake_plc
+    client = make_client()
+    symbol = client.get_symbol('MAIN.nValue', None, cls=RecordingSymbol)
+    symbol.start()
+    wait_for(lambda: symbol.values)
+
+    server.stop()
+    wait_for(lambda: not client.connected)
+    restarted = ProxyServer(server.path, authkey=server.authkey)
+    restarted.start()
+    try:
+        wait_for(lambda: client.connected)
+        conn.variables['main.nvalue'].set_value(11)
+        wait_for(lambda: symbol.values[-1] == 11)
+    finally:
+        restarted.stop()
+
+
+def test_socket_permissions(server):
+    assert os.stat(server.path).st_mode & 0o077 == 0
@@ -0,0 +1,114 @@
+import struct
+import time
+
+from ads_pcds.ads import ADST_Type
+from ads_pcds.fake import FakeVariable
+
+
+def add_value(conn, value=1.0):
+    return conn.add_variable(FakeVariable('MAIN.fValue', ADST_Type.REAL64,
+                                          value))
+
+
+def test_one_notification_per_variable(conn, plc, sync, recording_symbol):
+    var = add_value(conn)
+    symbols = [plc.get_symbol('MAIN.fValue', None, cls=recording_symbol,
+                              deadband=deadband)
+               for deadband in (None, 0.1, 0.2)]
+    for symbol in symbols:
+        symbol.start()
+    sync()
+    assert len(conn.notifications) == 1
+    assert len({id(symbol.variable) for symbol in symbols}) == 1
+
+    var.set_value(2.0)
+    assert [symbol.values for symbol in symbols] == [[1.0, 2.0]] * 3
+
+    plc.clear_symbol(symbols[0])
+    sync()
+    assert len(conn.notifications) == 1
+    for symbol in symbols[1:]:
+        plc.clear_symbol(symbol)
+    sync()
+    assert not conn.notifications
+    assert not conn.handles
+    assert 'main.fvalue' not in plc.variables
+
+
+def test_switch_between_poll_and_notification(conn, plc, sync,
+                                              recording_symbol):
+    add_value(conn)
+    polled = plc.get_symbol('MAIN.fValue', 0.05, cls=recording_symbol)
+    polled.start()
+    sync()
+    variable = polled.variable
+    assert variable.poll_rate == 0.05 and not conn.notifications
+
+    notified = plc.get_symbol('MAIN.fValue', None, cls=recording_symbol)
+    notified.start()
+    sync()
+    assert variable.poll_rate is None and len(conn.notifications) == 1
+
+    notified.stop()
+    sync()
+    assert variable.poll_rate == 0.05 and not conn.notifications
+
+
+def test_polled_consumers_at_own_rate(conn, plc, sync, recording_symbol):
+    var = add_value(conn)
+    fast = plc.get_symbol('MAIN.fValue', 0.02, cls=recording_symbol)
+    slow = plc.get_symbol('MAIN.fValue', 0.5, cls=recording_symbol)
+    fast.start()
+    slow.start()
+    sync()
+    deadline = time.monotonic() + 1.0
+    value = 1.0
+    while time.monotonic() < deadline:
+        value += 1
+        var.set_value(value)
+        time.sleep(0.01)
+    assert len(fast.values) > 15
+    assert 2 <= len(slow.values) <= 4
+
+
+def test_notified_consumers_at_own_rate(conn, plc, sync, wait_for,
+                                        recording_symbol):
+    var = add_value(conn)
+    fast = plc.get_symbol('MAIN.fValue', None, cls=recording_symbol)
+    slow = plc.get_symbol('MAIN.fValue', 0.2, cls=recording_symbol)
+    fast.start()
+    slow.start()
+    sync()
+    wait_for(lambda: slow.values)
+    for value in range(2, 12):
+        var.set_value(float(value))
+    assert fast.values == [float(value) for value in range(1, 12)]
+    assert slow.values == [1.0]
+    # The latest value follows once the slow consumer's period has passed
+    wait_for(lambda: slow.values == [1.0, 11.0])
+    time.sleep(0.3)
+    assert slow.values == [1.0, 11.0]
+
+
+def test_parent_variable_forgotten(conn, plc, sync, recording_symbol):
+    parent = conn.add_variable(FakeVariable(
+        'MAIN.st', ADST_Type.BIGTYPE, struct.pack('<dd', 1.0, 2.0), size=16,
+        type_name='ST_Pair'))
+    for offset, name in enumerate(('fA', 'fB')):
+        conn.add_member(parent, FakeVariable(f'MAIN.st.{name}',
+                                             ADST_Type.REAL64), 8 * offset)
+    symbols = [plc.get_symbol(f'MAIN.st.{name}', None, cls=recording_symbol,
+                              share_parent=True)
+               for name in ('fA', 'fB')]
+    for symbol in symbols:
+        symbol.start()
+    sync()
+    sync()
+    assert 'main.st' in plc.variables
+
+    for symbol in symbols:
+        plc.clear_symbol(symbol)
+    sync()
+    sync()
+    assert not plc.variables
+    assert not conn.notifications
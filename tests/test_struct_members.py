@@ -0,0 +1,88 @@
+import struct
+
+import pytest
+
+from ads_pcds.ads import ADST_Type
+from ads_pcds.fake import FakeVariable
+
+MEMBERS = ('bBrake', 'fPos', 'nErr')
+
+
+def pack_axis(brake, pos, err):
+    return struct.pack('<?7xdI4x', brake, pos, err)
+
+
+@pytest.fixture
+def axis(conn):
+    parent = conn.add_variable(FakeVariable(
+        'Main.M1', ADST_Type.BIGTYPE, pack_axis(True, 1.5, 7), size=24,
+        type_name='ST_Axis'))
+    for name, ads_type, offset in zip(
+            MEMBERS, (ADST_Type.BIT, ADST_Type.REAL64, ADST_Type.UINT32),
+            (0, 8, 16)):
+        conn.add_member(parent, FakeVariable(f'Main.M1.{name}', ads_type),
+                        offset)
+    return parent
+
+
+def notified_names(conn):
+    return sorted(var.name for var, _, _ in conn.notifications.values())
+
+
+def settle(sync):
+    # Subscriptions of siblings move to the parent in follow-up jobs
+    for _ in range(3):
+        sync()
+
+
+def start_members(plc, sync, recording_symbol, names=MEMBERS):
+    symbols = [plc.get_symbol(f'Main.M1.{name}', None, cls=recording_symbol,
+                              share_parent=True)
+               for name in names]
+    for symbol in symbols:
+        symbol.start()
+    settle(sync)
+    return symbols
+
+
+def test_members_share_parent(conn, plc, sync, axis, recording_symbol):
+    brake, pos, err = start_members(plc, sync, recording_symbol)
+    assert notified_names(conn) == ['Main.M1']
+    assert (brake.values[-1], pos.values[-1], err.values[-1]) == (
+        True, 1.5, 7)
+
+
+def test_only_changed_members_dispatched(conn, plc, sync, axis,
+                                         recording_symbol):
+    brake, pos, err = start_members(plc, sync, recording_symbol)
+    counts = [len(symbol.values) for symbol in (brake, pos, err)]
+    conn.variables['main.m1.fpos'].set_value(2.5)
+    axis.set_raw(pack_axis(True, 2.5, 9))
+    assert [len(symbol.values) - count for symbol, count in
+            zip((brake, pos, err), counts)] == [0, 1, 1]
+    assert pos.values[-1] == 2.5
+    assert err.values[-1] == 9
+
+
+def test_single_member_not_shared(conn, plc, sync, axis, recording_symbol):
+    pos, = start_members(plc, sync, recording_symbol, names=['fPos'])
+    assert notified_names(conn) == ['Main.M1.fPos']
+    assert pos.values == [1.5]
+
+
+def test_last_member_unshared(conn, plc, sync, axis, recording_symbol):
+    brake, pos, err = start_members(plc, sync, recording_symbol)
+    brake.stop()
+    settle(sync)
+    assert notified_names(conn) == ['Main.M1']
+
+    err.stop()
+    settle(sync)
+    assert notified_names(conn) == ['Main.M1.fPos']
+    assert 'main.m1' not in plc.variables
+    conn.variables['main.m1.fpos'].set_value(3.5)
+    assert pos.values[-1] == 3.5
+
+    pos.stop()
+    settle(sync)
+    assert not conn.notifications
@@ -0,0 +1,29 @@
+import pyads
+
+from ads_pcds.ads import ADST_Type
+from ads_pcds.fake import FakeVariable
+
+
+def test_batched_info(conn, plc, sync):
+    for idx in range(5):
+        conn.add_variable(FakeVariable(f'MAIN.n{idx}', ADST_Type.INT32, idx))
+    variables = [plc.get_variable(f'MAIN.n{idx}') for idx in range(5)]
+    sync()
+    requests = conn.requests
+    assert [var.read() for var in variables] == list(range(5))
+    # Information came in one sum command; only handles and reads remain
+    assert conn.requests - requests == 10
+
+
+def test_failed_batch_still_runs_jobs(conn, plc, sync, monkeypatch):
+    conn.add_variable(FakeVariable('MAIN.n', ADST_Type.INT32, 3))
+    sync()
+
+    def fail(symbol_names=()):
+        raise pyads.ADSError(1861)
+
+    monkeypatch.setattr(plc, 'resolve_symbol_info', fail)
+    variable = plc.get_variable('MAIN.n')
+    assert plc.submit(lambda: 42).result(timeout=5) == 42
+    monkeypatch.undo()
+    assert variable.read() == 3
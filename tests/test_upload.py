@@ -0,0 +1,114 @@
+import ctypes
+import os
+
+import pytest
+from pyads import constants, structs
+
+from ads_pcds import upload
+from ads_pcds.ads import (ADST_Type, upload_data_type_table,
+                          upload_symbol_table)
+from ads_pcds.fake import FakeVariable, pack_data_type_entry
+
+
+@pytest.fixture(autouse=True)
+def cache_path(tmp_path, monkeypatch):
+    path = tmp_path / 'cache'
+    monkeypatch.setenv('ADS_PCDS_CACHE', str(path))
+    return path
+
+
+@pytest.fixture
+def table(conn):
+    conn.add_variable(FakeVariable('MAIN.fValue', ADST_Type.REAL64,
+                                   comment='Position [µm]'))
+    conn.add_variable(FakeVariable('GVL.aValues', ADST_Type.INT16,
+                                   [0] * 4, array_size=4))
+    conn.add_variable(FakeVariable('MAIN.sName', ADST_Type.STRING, '',
+                                   size=81, type_name='STRING(80)'))
+    conn.open()
+    return conn
+
+
+def count_uploads(conn, monkeypatch):
+    uploads = []
+    read = conn._read
+
+    def counting_read(group, offset, size):
+        if group in (constants.ADSIGRP_SYM_UPLOAD,
+                     constants.ADSIGRP_SYM_DT_UPLOAD):
+            uploads.append(group)
+        return read(group, offset, size)
+
+    monkeypatch.setattr(conn, '_read', counting_read)
+    return uploads
+
+
+def test_parse_matches_pyads(table):
+    raw = table.variables['main.fvalue'].pack_info()
+    entry, length = upload.parse_symbol_entry(raw)
+    buffer = bytearray(raw).ljust(ctypes.sizeof(structs.SAdsSymbolEntry),
+                                  b'\0')
+    expected = structs.SAdsSymbolEntry.from_buffer(buffer)
+    assert length == expected.entryLength
+    for attr in ('name', 'iGroup', 'iOffs', 'size', 'dataType', 'flags',
+                 'comment', 'entryLength', 'nameLength', 'typeLength',
+                 'commentLength', 'symbol_type'):
+        assert getattr(entry, attr) == getattr(expected, attr), attr
+
+
+def test_parse_table(table):
+    entries = upload.parse_symbol_table(table._symbol_table())
+    assert [entry.name for entry in entries] == [
+        'MAIN.fValue', 'GVL.aValues', 'MAIN.sName']
+    assert [entry.type_name for entry in entries] == [
+        'REAL64', 'INT16', 'STRING(80)']
+    assert entries[0].comment == 'Position [µm]'
+    assert entries[1].size == 8
+    # Trailing padding or an empty entry ends the table
+    padded = table._symbol_table() + bytes(64)
+    assert upload.parse_symbol_table(padded) == entries
+
+
+def test_cached(table, cache_path, monkeypatch):
+    uploads = count_uploads(table, monkeypatch)
+    entries = upload_symbol_table(table)
+    assert upload_symbol_table(table) == entries
+    assert len(uploads) == 1
+    assert os.stat(cache_path).st_mode & 0o077 == 0
+
+    # Uploaded again once the symbol version changes
+    table.online_change()
+    assert upload_symbol_table(table) == entries
+    assert len(uploads) == 2
+    assert upload_symbol_table(table, use_cache=False) == entries
+    assert len(uploads) == 3
+
+
+def test_unreadable_cache_ignored(table, cache_path, monkeypatch):
+    entries = upload_symbol_table(table)
+    filename, = cache_path.iterdir()
+    filename.write_bytes(filename.read_bytes()[:-10])
+    uploads = count_uploads(table, monkeypatch)
+    assert upload_symbol_table(table) == entries
+    assert len(uploads) == 1
+
+    filename.write_bytes(b'\x80\x04garbage')
+    assert upload_symbol_table(table) == entries
+    assert len(uploads) == 2
+
+
+def test_data_types_cached(table, monkeypatch):
+    table.add_data_type(pack_data_type_entry(
+        'ST_Pair', 16, sub_items=[
+            pack_data_type_entry('fA', 8, type_name='LREAL',
+                                 ads_type=ADST_Type.REAL64),
+            pack_data_type_entry('fB', 8, type_name='LREAL',
+                                 ads_type=ADST_Type.REAL64, offset=8),
+        ]))
+    uploads = count_uploads(table, monkeypatch)
+    entries = upload_data_type_table(table)
+    assert upload_data_type_table(table) == entries
+    assert len(uploads) == 1
+    pair, = entries
+    assert [(item.name, item.offset) for item in pair.sub_items] == [
+        ('fA', 0), ('fB', 8)]
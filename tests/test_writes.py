@@ -0,0 +1,86 @@
+import threading
+
+import pyads
+import pytest
+from pyads import constants
+
+from ads_pcds.ads import ADST_Type
+from ads_pcds.fake import FakeVariable
+
+
+@pytest.fixture
+def sum_writes(conn, monkeypatch):
+    'The number of entries of each ADS sum write sent'
+    sum_writes = []
+    read_write_raw = conn.read_write_raw
+
+    def counting(index_group, index_offset, read_size, data):
+        if index_group == constants.ADSIGRP_SUMUP_WRITE:
+            sum_writes.append(index_offset)
+        return read_write_raw(index_group, index_offset, read_size, data)
+
+    monkeypatch.setattr(conn, 'read_write_raw', counting)
+    return sum_writes
+
+
+@pytest.fixture
+def blocked(plc):
+    'Hold the PLC thread until the test sets the event'
+    event = threading.Event()
+    plc.submit(event.wait, 5)
+    yield event
+    event.set()
+
+
+def test_writes_coalesced(conn, plc, sum_writes, blocked):
+    conn.add_variable(FakeVariable('MAIN.nValue', ADST_Type.INT32))
+    conn.add_variable(FakeVariable('MAIN.fValue', ADST_Type.REAL64))
+    value = plc.get_variable('MAIN.nValue')
+    futures = [value.write_async(idx) for idx in range(20)]
+    futures.append(plc.get_variable('MAIN.fValue').write_async(2.5))
+    blocked.set()
+    # Superseded writes complete with the one replacing them
+    for future in futures:
+        assert future.result(timeout=5) is None
+    assert sum_writes == [2]
+    assert plc.read_many(['MAIN.nValue', 'MAIN.fValue']) == [19, 2.5]
+
+
+def test_cancelled_write(conn, plc, blocked):
+    conn.add_variable(FakeVariable('MAIN.nValue', ADST_Type.INT32))
+    variable = plc.get_variable('MAIN.nValue')
+    first = variable.write_async(1)
+    second = variable.write_async(2)
+    assert first.cancel()
+    blocked.set()
+    assert second.result(timeout=5) is None
+    assert first.cancelled()
+    assert variable.read() == 2
+
+
+def test_failed_write(conn, plc, sum_writes):
+    future = plc.get_variable('MAIN.nMissing').write_async(1)
+    with pytest.raises(pyads.ADSError):
+        future.result(timeout=5)
+    # Nothing else to write: no empty sum command
+    assert sum_writes == []
+
+
+def test_failed_write_among_others(conn, plc, sum_writes, blocked):
+    conn.add_variable(FakeVariable('MAIN.nValue', ADST_Type.INT32))
+    good = plc.get_variable('MAIN.nValue').write_async(3)
+    bad = plc.get_variable('MAIN.nMissing').write_async(1)
+    blocked.set()
+    assert good.result(timeout=5) is None
+    assert isinstance(bad.exception(timeout=5), pyads.ADSError)
+    assert sum_writes == [1]
+
+
+def test_write_reopens_port(conn, plc, sync):
+    conn.add_variable(FakeVariable('MAIN.nValue', ADST_Type.INT32))
+    variable = plc.get_variable('MAIN.nValue')
+    variable.read()
+    plc.submit(conn.close).result(timeout=5)
+    assert variable.write_async(5).result(timeout=5) is None
+    assert conn.is_open
+    assert variable.read() == 5